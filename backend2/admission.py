@@ -0,0 +1,223 @@
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from index_advisor import normalize_sql, table_aliases
+
+QUERY_CLASSES = ("cheap", "medium", "heavy")
+
+# Row estimate for sources without statistics (CTEs, subquery results, views).
+UNKNOWN_ROWS = 1000
+
+_LOOP_RE = re.compile(r"^(SCAN|SEARCH) (\S+)(.*)$")
+_INDEX_RE = re.compile(r"\bINDEX (\w+)")
+_TERMS_RE = re.compile(r"\((.*)\)\s*$")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, query_class: str, reason: str):
+        self.query_class = query_class
+        self.reason = reason
+        super().__init__(f"Too many {query_class} queries in flight ({reason}); retry shortly.")
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"error": "overloaded", "query_class": self.query_class, "reason": self.reason, "message": str(self)}
+
+
+def load_index_stats(conn: sqlite3.Connection) -> Dict[str, List[int]]:
+    """sqlite_stat1 rows per index: [table rows, avg rows per 1-column key prefix, per 2-column prefix, ...]."""
+    try:
+        rows = conn.execute("SELECT idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL;").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    stats = {}
+    for index, stat in rows:
+        numbers = [int(part) for part in str(stat).split() if part.isdigit()]
+        if numbers:
+            stats[index] = numbers
+    return stats
+
+
+class CostEstimator:
+    """Estimates rows visited by a statement from EXPLAIN QUERY PLAN, catalog row counts and sqlite_stat1."""
+
+    def __init__(self, cheap_max_rows: int = 20000, heavy_min_rows: int = 2000000, max_entries: int = 2048):
+        self.cheap_max_rows = cheap_max_rows
+        self.heavy_min_rows = heavy_min_rows
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, object], Dict[str, object]]" = OrderedDict()
+        self._index_stats: Tuple[object, Dict[str, List[int]]] = (None, {})
+        self._lock = threading.Lock()
+
+    def classify(self, conn: sqlite3.Connection, sql: str, snapshot) -> Dict[str, object]:
+        key = (normalize_sql(sql), snapshot.version)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+            index_stats = self._index_stats
+
+        if index_stats[0] != snapshot.version:
+            index_stats = (snapshot.version, load_index_stats(conn))
+            with self._lock:
+                self._index_stats = index_stats
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        except sqlite3.Error:
+            # The statement will fail on execution with a proper error; don't hold it in a queue.
+            return {"class": "cheap", "estimated_rows": 0, "plan": []}
+
+        estimated, recursive = self._estimate(plan, snapshot, table_aliases(sql), index_stats[1])
+        if estimated <= self.cheap_max_rows and not recursive:
+            query_class = "cheap"
+        elif estimated < self.heavy_min_rows:
+            query_class = "medium"
+        else:
+            query_class = "heavy"
+        result = {"class": query_class, "estimated_rows": int(estimated), "plan": [row[3] for row in plan]}
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    def _loop_rows(self, detail: str, snapshot, aliases: Dict[str, str], index_stats: Dict[str, List[int]]) -> float:
+        verb, name, rest = _LOOP_RE.match(detail).groups()
+        if name == "CONSTANT":
+            return 1.0
+        info = snapshot.table(aliases.get(name.lower(), name))
+        table_rows = float(info.row_count) if info is not None and info.row_count is not None else UNKNOWN_ROWS
+        if verb == "SCAN":
+            return table_rows
+
+        terms_match = _TERMS_RE.search(rest)
+        terms = terms_match.group(1) if terms_match else ""
+        equalities = terms.count("=?") - terms.count("<=?") - terms.count(">=?")
+        ranged = "<" in terms or ">" in terms
+        if "PRIMARY KEY" in rest and equalities:
+            rows = 1.0
+        else:
+            index_match = _INDEX_RE.search(rest)
+            stat = index_stats.get(index_match.group(1)) if index_match else None
+            if stat:
+                rows = float(stat[min(equalities, len(stat) - 1)])
+            else:
+                rows = table_rows / (10.0 ** equalities)
+        if ranged:
+            # SQLite's own guess for a range constraint without STAT4 is a quarter of the rows.
+            rows /= 4.0
+        return max(rows, 1.0)
+
+    def _estimate(
+        self, plan: List[tuple], snapshot, aliases: Dict[str, str], index_stats: Dict[str, List[int]]
+    ) -> Tuple[float, bool]:
+        children: Dict[int, List[tuple]] = {}
+        for row in plan:
+            children.setdefault(row[1], []).append(row)
+        recursive = any(row[3].startswith("RECURSIVE STEP") for row in plan)
+
+        def subtree(parent: int, outer_rows: float) -> float:
+            cost, loop_rows = 0.0, outer_rows
+            for node in children.get(parent, []):
+                detail = node[3]
+                if _LOOP_RE.match(detail):
+                    # Nested loops: each level runs once per row produced by the levels above it.
+                    rows = self._loop_rows(detail, snapshot, aliases, index_stats)
+                    cost += loop_rows * rows
+                    loop_rows *= rows
+                elif detail.startswith("CORRELATED"):
+                    cost += subtree(node[0], loop_rows)
+                elif detail.startswith("USE TEMP B-TREE"):
+                    cost += loop_rows
+                else:
+                    cost += subtree(node[0], 1.0)
+            return cost
+
+        return subtree(0, 1.0), recursive
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "cached_plans": len(self._cache),
+            "cheap_max_rows": self.cheap_max_rows,
+            "heavy_min_rows": self.heavy_min_rows,
+        }
+
+
+class _ClassGate:
+    def __init__(self, name: str, concurrency: int, max_queue: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the serving event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_time_total_ms": round(self.wait_total * 1000, 3),
+            "wait_time_avg_ms": round(self.wait_total * 1000 / self.admitted, 3) if self.admitted else 0.0,
+            "wait_time_max_ms": round(self.wait_max * 1000, 3),
+        }
+
+
+class AdmissionController:
+    """Separate concurrency limits and queues per query class, so heavy scans cannot take every worker."""
+
+    def __init__(self, concurrency: Dict[str, int], max_queue: int = 32, queue_timeout: float = 30.0):
+        self.queue_timeout = queue_timeout
+        self._gates = {name: _ClassGate(name, concurrency.get(name, 1), max_queue) for name in QUERY_CLASSES}
+
+    @asynccontextmanager
+    async def slot(self, query_class: str):
+        gate = self._gates[query_class]
+        if gate.max_queue and gate.semaphore.locked() and gate.queued >= gate.max_queue:
+            gate.rejected += 1
+            raise AdmissionRejected(query_class, "queue full")
+
+        started = time.perf_counter()
+        gate.queued += 1
+        try:
+            await asyncio.wait_for(gate.semaphore.acquire(), timeout=self.queue_timeout or None)
+        except TimeoutError:
+            gate.rejected += 1
+            raise AdmissionRejected(query_class, f"waited {self.queue_timeout:g}s in queue")
+        finally:
+            gate.queued -= 1
+
+        waited = time.perf_counter() - started
+        gate.admitted += 1
+        gate.wait_total += waited
+        gate.wait_max = max(gate.wait_max, waited)
+        gate.active += 1
+        try:
+            yield waited
+        finally:
+            gate.active -= 1
+            gate.semaphore.release()
+
+    def stats(self) -> Dict[str, object]:
+        return {name: gate.stats() for name, gate in self._gates.items()}
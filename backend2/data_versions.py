@@ -0,0 +1,76 @@
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Tuple
+
+VERSION_TABLE = "table_versions"
+INGEST_FILES_TABLE = "ingest_files"
+
+# Bookkeeping tables are not part of the data model and are hidden from the LLM schema.
+INTERNAL_TABLES = (VERSION_TABLE, INGEST_FILES_TABLE)
+
+VERSION_DDL = f"""
+CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    rows_changed INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS {INGEST_FILES_TABLE} (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    platform_number INTEGER,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    rows_loaded INTEGER NOT NULL DEFAULT 0,
+    ingested_at REAL NOT NULL
+);
+"""
+
+
+def ensure_version_tables(conn: sqlite3.Connection) -> None:
+    for statement in VERSION_DDL.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def bump_versions(conn: sqlite3.Connection, changes: Dict[str, int]) -> None:
+    """Increment the version of every table in `changes` (table -> rows changed) inside the caller's transaction."""
+    if not changes:
+        return
+    ensure_version_tables(conn)
+    now = time.time()
+    conn.executemany(
+        f"INSERT INTO {VERSION_TABLE} (table_name, version, rows_changed, updated_at) VALUES (?, 1, ?, ?) "
+        "ON CONFLICT(table_name) DO UPDATE SET version = version + 1, "
+        "rows_changed = rows_changed + excluded.rows_changed, updated_at = excluded.updated_at;",
+        [(table, rows, now) for table, rows in changes.items()],
+    )
+
+
+def set_versions(conn: sqlite3.Connection, versions: Dict[str, int]) -> None:
+    ensure_version_tables(conn)
+    now = time.time()
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {VERSION_TABLE} (table_name, version, rows_changed, updated_at) VALUES (?, ?, 0, ?);",
+        [(table, version, now) for table, version in versions.items()],
+    )
+
+
+def read_versions(conn: sqlite3.Connection) -> Dict[str, int]:
+    try:
+        rows = conn.execute(f"SELECT table_name, version FROM {VERSION_TABLE};").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {row[0]: int(row[1]) for row in rows}
+
+
+def referenced_tables(sql: str, table_names: Iterable[str]) -> List[str]:
+    words = {word.lower() for word in re.findall(r"[A-Za-z_][A-Za-z0-9_]*", sql or "")}
+    return sorted(name for name in table_names if name.lower() in words)
+
+
+def versions_for(versions: Dict[str, int], tables: Iterable[str], fallback: object = 0) -> Tuple[Tuple[str, object], ...]:
+    # Tables nobody versions (e.g. created ad hoc) fall back to a coarser stamp such as PRAGMA data_version.
+    return tuple((table, versions.get(table, fallback)) for table in tables)
@@ -0,0 +1,236 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class SQLitePool:
+    """Bounded pool of read-only SQLite connections plus a single writer connection."""
+
+    def __init__(
+        self,
+        db_path: str,
+        max_size: int = 8,
+        acquire_timeout: float = 10.0,
+        busy_timeout: float = 5.0,
+        enable_wal: bool = True,
+    ):
+        self.db_path = os.path.abspath(db_path)
+        self.max_size = max(1, max_size)
+        self.acquire_timeout = acquire_timeout
+        self.busy_timeout = busy_timeout
+
+        self._idle: List[sqlite3.Connection] = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.Lock()
+
+        self._probe: Optional[sqlite3.Connection] = None
+        self._probe_lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._health_failures = 0
+        self._writes = 0
+
+        self.journal_mode = self._init_journal_mode(enable_wal)
+
+    def _init_journal_mode(self, enable_wal: bool) -> str:
+        # Switching to WAL is persistent in the file and lets readers proceed while the writer commits.
+        if enable_wal:
+            try:
+                with self.writer() as conn:
+                    row = conn.execute("PRAGMA journal_mode=WAL;").fetchone()
+                    return str(row[0]).lower() if row else "unknown"
+            except sqlite3.Error:
+                pass
+        try:
+            conn = self._connect_read()
+            try:
+                row = conn.execute("PRAGMA journal_mode;").fetchone()
+                return str(row[0]).lower() if row else "unknown"
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return "unknown"
+
+    def _connect_read(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only=ON;")
+        return conn
+
+    def _connect_write(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=rw",
+            uri=True,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1;").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> sqlite3.Connection:
+        deadline = time.monotonic() + self.acquire_timeout
+        waited = 0.0
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    if self._is_healthy(conn):
+                        self._hits += 1
+                        self._record_wait(waited)
+                        return conn
+                    self._health_failures += 1
+                    self._open -= 1
+                    try:
+                        conn.close()
+                    except sqlite3.Error:
+                        pass
+                    continue
+                if self._open < self.max_size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._record_wait(waited)
+                    raise PoolTimeout(
+                        f"Timed out after {self.acquire_timeout:.1f}s waiting for a database connection"
+                    )
+                started = time.monotonic()
+                self._cond.wait(remaining)
+                waited += time.monotonic() - started
+
+        try:
+            conn = self._connect_read()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._misses += 1
+            self._record_wait(waited)
+        return conn
+
+    def _record_wait(self, waited: float) -> None:
+        if waited <= 0:
+            return
+        self._waits += 1
+        self._wait_time_total += waited
+        self._wait_time_max = max(self._wait_time_max, waited)
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+        with self._cond:
+            if self._closed:
+                self._open -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            # Broken connections are caught by the health check on the next acquire.
+            self.release(conn)
+
+    @contextmanager
+    def writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect_write()
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+                self._writes += 1
+            except BaseException:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
+                raise
+
+    def data_version(self) -> int:
+        # PRAGMA data_version is per connection and changes whenever any *other* connection
+        # (our writer included) commits, so a long-lived probe connection tracks content changes.
+        with self._probe_lock:
+            if self._probe is None:
+                self._probe = self._connect_read()
+            return int(self._probe.execute("PRAGMA data_version;").fetchone()[0])
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn = self._idle.pop()
+                self._open -= 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._cond.notify_all()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._probe_lock:
+            if self._probe is not None:
+                self._probe.close()
+                self._probe = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            requests_total = self._hits + self._misses
+            return {
+                "db_path": self.db_path,
+                "journal_mode": self.journal_mode,
+                "max_size": self.max_size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / requests_total, 4) if requests_total else 0.0,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+                "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._waits, 3) if self._waits else 0.0,
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+                "health_check_failures": self._health_failures,
+                "writes": self._writes,
+            }
@@ -0,0 +1,374 @@
+import argparse
+import math
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from data_versions import bump_versions
+
+PROFILE_SUMMARY_TABLE = "prof_summary"
+PROFILE_GRID_TABLE = "prof_grid"
+DERIVED_TABLES = (PROFILE_SUMMARY_TABLE, PROFILE_GRID_TABLE)
+
+# The cube is stored at this resolution; coarser grids are integer multiples rolled up at query time.
+GRID_CELL_DEGREES = 0.5
+# Pressure bands in dbar (lower bound inclusive); the last band is open-ended.
+DEPTH_BANDS = ((0, 10), (10, 50), (50, 100), (100, 200), (200, 500), (500, 1000), (1000, 2000), (2000, None))
+
+PROFILE_SUMMARY_DDL = f"""
+CREATE TABLE IF NOT EXISTS {PROFILE_SUMMARY_TABLE} (
+    PLATFORM_NUMBER INTEGER NOT NULL,
+    CYCLE_NUMBER REAL NOT NULL,
+    JULD TEXT,
+    LATITUDE REAL,
+    LONGITUDE REAL,
+    N_LEVELS INTEGER,
+    PRES_MIN REAL,
+    PRES_MAX REAL,
+    PRES_MEAN REAL,
+    TEMP_MIN REAL,
+    TEMP_MAX REAL,
+    TEMP_MEAN REAL,
+    PSAL_MIN REAL,
+    PSAL_MAX REAL,
+    PSAL_MEAN REAL,
+    SURFACE_PRES REAL,
+    SURFACE_TEMP REAL,
+    SURFACE_PSAL REAL,
+    BOTTOM_PRES REAL,
+    BOTTOM_TEMP REAL,
+    BOTTOM_PSAL REAL,
+    PRIMARY KEY (PLATFORM_NUMBER, CYCLE_NUMBER)
+);
+CREATE INDEX IF NOT EXISTS idx_{PROFILE_SUMMARY_TABLE}_juld ON {PROFILE_SUMMARY_TABLE}(JULD);
+CREATE INDEX IF NOT EXISTS idx_{PROFILE_SUMMARY_TABLE}_lat_lon ON {PROFILE_SUMMARY_TABLE}(LATITUDE, LONGITUDE);
+"""
+
+# Sums, sums of squares, counts, minima and maxima are all additive, so new profiles are folded in
+# with an UPSERT and any coarser cell, band of months or year is a GROUP BY over the cube.
+PROFILE_GRID_DDL = f"""
+CREATE TABLE IF NOT EXISTS {PROFILE_GRID_TABLE} (
+    DEPTH_BAND INTEGER NOT NULL,
+    MONTH TEXT NOT NULL,
+    LAT_BIN INTEGER NOT NULL,
+    LON_BIN INTEGER NOT NULL,
+    N_PROFILES INTEGER NOT NULL,
+    TEMP_N INTEGER NOT NULL,
+    TEMP_SUM REAL NOT NULL,
+    TEMP_SUMSQ REAL NOT NULL,
+    TEMP_MIN REAL,
+    TEMP_MAX REAL,
+    PSAL_N INTEGER NOT NULL,
+    PSAL_SUM REAL NOT NULL,
+    PSAL_SUMSQ REAL NOT NULL,
+    PSAL_MIN REAL,
+    PSAL_MAX REAL,
+    PRIMARY KEY (DEPTH_BAND, MONTH, LAT_BIN, LON_BIN)
+) WITHOUT ROWID;
+"""
+
+_DEPTH_BAND_CASE = "CASE " + " ".join(
+    f"WHEN pres < {upper} THEN {band}" for band, (_, upper) in enumerate(DEPTH_BANDS) if upper is not None
+) + f" ELSE {len(DEPTH_BANDS) - 1} END"
+
+_GRID_SELECT = f"""
+SELECT
+    {_DEPTH_BAND_CASE} AS band,
+    month,
+    MIN(CAST((lat + 90.0) / {GRID_CELL_DEGREES} AS INTEGER), {int(180 / GRID_CELL_DEGREES) - 1}) AS lat_bin,
+    MIN(CAST((lon + 180.0) / {GRID_CELL_DEGREES} AS INTEGER), {int(360 / GRID_CELL_DEGREES) - 1}) AS lon_bin,
+    COUNT(DISTINCT PLATFORM_NUMBER || ':' || CYCLE_NUMBER),
+    COUNT(temp), TOTAL(temp), TOTAL(temp * temp), MIN(temp), MAX(temp),
+    COUNT(psal), TOTAL(psal), TOTAL(psal * psal), MIN(psal), MAX(psal)
+FROM (
+    SELECT
+        PLATFORM_NUMBER, CYCLE_NUMBER,
+        strftime('%Y-%m', JULD) AS month,
+        LATITUDE AS lat,
+        CASE WHEN LONGITUDE >= 180 THEN LONGITUDE - 360 ELSE LONGITUDE END AS lon,
+        COALESCE(PRES_ADJUSTED, PRES) AS pres,
+        COALESCE(TEMP_ADJUSTED, TEMP) AS temp,
+        COALESCE(PSAL_ADJUSTED, PSAL) AS psal
+    FROM prof_rel
+    WHERE PLATFORM_NUMBER IS NOT NULL AND CYCLE_NUMBER IS NOT NULL {{key_filter}}
+)
+WHERE month IS NOT NULL AND pres IS NOT NULL
+    AND lat BETWEEN -90 AND 90 AND lon BETWEEN -180 AND 180
+GROUP BY band, month, lat_bin, lon_bin
+"""
+
+_GRID_FOLD = """
+ON CONFLICT (DEPTH_BAND, MONTH, LAT_BIN, LON_BIN) DO UPDATE SET
+    N_PROFILES = N_PROFILES + excluded.N_PROFILES,
+    TEMP_N = TEMP_N + excluded.TEMP_N,
+    TEMP_SUM = TEMP_SUM + excluded.TEMP_SUM,
+    TEMP_SUMSQ = TEMP_SUMSQ + excluded.TEMP_SUMSQ,
+    TEMP_MIN = MIN(COALESCE(TEMP_MIN, excluded.TEMP_MIN), COALESCE(excluded.TEMP_MIN, TEMP_MIN)),
+    TEMP_MAX = MAX(COALESCE(TEMP_MAX, excluded.TEMP_MAX), COALESCE(excluded.TEMP_MAX, TEMP_MAX)),
+    PSAL_N = PSAL_N + excluded.PSAL_N,
+    PSAL_SUM = PSAL_SUM + excluded.PSAL_SUM,
+    PSAL_SUMSQ = PSAL_SUMSQ + excluded.PSAL_SUMSQ,
+    PSAL_MIN = MIN(COALESCE(PSAL_MIN, excluded.PSAL_MIN), COALESCE(excluded.PSAL_MIN, PSAL_MIN)),
+    PSAL_MAX = MAX(COALESCE(PSAL_MAX, excluded.PSAL_MAX), COALESCE(excluded.PSAL_MAX, PSAL_MAX))
+"""
+
+GRID_VARIABLES = {"temp": "TEMP", "psal": "PSAL"}
+GRID_STATS = ("mean", "std", "min", "max", "count")
+GRID_TIME_BUCKETS = {
+    "month": "MONTH",
+    "year": "substr(MONTH, 1, 4)",
+    "month_of_year": "substr(MONTH, 6, 2)",
+    "all": "'all'",
+}
+_MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+
+# Surface = shallowest level, bottom = deepest level of each profile. Adjusted values where the float
+# has them, raw values otherwise, as in the grid.
+_SUMMARY_SELECT = """
+WITH levels AS (
+    SELECT
+        PLATFORM_NUMBER, CYCLE_NUMBER, JULD, LATITUDE, LONGITUDE,
+        COALESCE(PRES_ADJUSTED, PRES) AS pres,
+        COALESCE(TEMP_ADJUSTED, TEMP) AS temp,
+        COALESCE(PSAL_ADJUSTED, PSAL) AS psal
+    FROM prof_rel
+    WHERE PLATFORM_NUMBER IS NOT NULL AND CYCLE_NUMBER IS NOT NULL {key_filter}
+),
+ranked AS (
+    SELECT
+        *,
+        ROW_NUMBER() OVER (PARTITION BY PLATFORM_NUMBER, CYCLE_NUMBER ORDER BY pres ASC) AS rank_top,
+        ROW_NUMBER() OVER (PARTITION BY PLATFORM_NUMBER, CYCLE_NUMBER ORDER BY pres DESC) AS rank_bottom
+    FROM levels
+    WHERE pres IS NOT NULL
+)
+SELECT
+    PLATFORM_NUMBER,
+    CYCLE_NUMBER,
+    MIN(JULD),
+    AVG(LATITUDE),
+    AVG(LONGITUDE),
+    COUNT(*),
+    MIN(pres), MAX(pres), AVG(pres),
+    MIN(temp), MAX(temp), AVG(temp),
+    MIN(psal), MAX(psal), AVG(psal),
+    MAX(CASE WHEN rank_top = 1 THEN pres END),
+    MAX(CASE WHEN rank_top = 1 THEN temp END),
+    MAX(CASE WHEN rank_top = 1 THEN psal END),
+    MAX(CASE WHEN rank_bottom = 1 THEN pres END),
+    MAX(CASE WHEN rank_bottom = 1 THEN temp END),
+    MAX(CASE WHEN rank_bottom = 1 THEN psal END)
+FROM ranked
+GROUP BY PLATFORM_NUMBER, CYCLE_NUMBER
+"""
+
+
+def _execute_ddl(conn: sqlite3.Connection, ddl: str) -> None:
+    # Statement by statement: executescript() would commit the caller's open transaction.
+    for statement in ddl.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def ensure_profile_summary(conn: sqlite3.Connection) -> None:
+    _execute_ddl(conn, PROFILE_SUMMARY_DDL)
+
+
+def ensure_profile_grid(conn: sqlite3.Connection) -> None:
+    _execute_ddl(conn, PROFILE_GRID_DDL)
+
+
+def _stage_keys(conn: sqlite3.Connection, profile_keys: Iterable[Tuple[int, float]]) -> str:
+    """Load keys into a temp table; returns the prof_rel filter that selects them."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _summary_keys (PLATFORM_NUMBER INTEGER, CYCLE_NUMBER REAL);")
+    conn.execute("DELETE FROM _summary_keys;")
+    conn.executemany("INSERT INTO _summary_keys VALUES (?, ?);", list(profile_keys))
+    return "AND (PLATFORM_NUMBER, CYCLE_NUMBER) IN (SELECT PLATFORM_NUMBER, CYCLE_NUMBER FROM _summary_keys)"
+
+
+def refresh_profile_summary(
+    conn: sqlite3.Connection,
+    profile_keys: Optional[Iterable[Tuple[int, float]]] = None,
+) -> int:
+    """Rebuild prof_summary in full, or only for the given (PLATFORM_NUMBER, CYCLE_NUMBER) keys.
+
+    Runs inside the caller's transaction; returns the number of summary rows written.
+    """
+    ensure_profile_summary(conn)
+    if profile_keys is None:
+        conn.execute(f"DELETE FROM {PROFILE_SUMMARY_TABLE};")
+        cursor = conn.execute(f"INSERT INTO {PROFILE_SUMMARY_TABLE} " + _SUMMARY_SELECT.format(key_filter=""))
+        return cursor.rowcount
+
+    key_filter = _stage_keys(conn, profile_keys)
+    conn.execute(
+        f"DELETE FROM {PROFILE_SUMMARY_TABLE} WHERE (PLATFORM_NUMBER, CYCLE_NUMBER) IN "
+        "(SELECT PLATFORM_NUMBER, CYCLE_NUMBER FROM _summary_keys);"
+    )
+    cursor = conn.execute(
+        f"INSERT INTO {PROFILE_SUMMARY_TABLE} " + _SUMMARY_SELECT.format(key_filter=key_filter)
+    )
+    conn.execute("DELETE FROM _summary_keys;")
+    return cursor.rowcount
+
+
+def refresh_profile_grid(
+    conn: sqlite3.Connection,
+    profile_keys: Optional[Iterable[Tuple[int, float]]] = None,
+) -> int:
+    """Rebuild the prof_grid cube in full, or fold in the given profiles.
+
+    Folding only adds, so `profile_keys` must be profiles the cube has not counted yet (newly
+    appended cycles); anything else needs a full rebuild. Returns the number of cube cells written.
+    """
+    ensure_profile_grid(conn)
+    if profile_keys is None:
+        conn.execute(f"DELETE FROM {PROFILE_GRID_TABLE};")
+        cursor = conn.execute(f"INSERT INTO {PROFILE_GRID_TABLE} " + _GRID_SELECT.format(key_filter=""))
+        return cursor.rowcount
+
+    key_filter = _stage_keys(conn, profile_keys)
+    cursor = conn.execute(
+        f"INSERT INTO {PROFILE_GRID_TABLE} " + _GRID_SELECT.format(key_filter=key_filter) + _GRID_FOLD
+    )
+    conn.execute("DELETE FROM _summary_keys;")
+    return cursor.rowcount
+
+
+def _grid_value(stat: str, n: int, total: float, total_sq: float, low: float, high: float) -> Optional[float]:
+    if stat == "count":
+        return n
+    if not n:
+        return None
+    if stat == "min":
+        return low
+    if stat == "max":
+        return high
+    mean = total / n
+    if stat == "mean":
+        return mean
+    return math.sqrt(max(0.0, total_sq / n - mean * mean))
+
+
+def query_profile_grid(
+    conn: sqlite3.Connection,
+    variable: str = "temp",
+    stat: str = "mean",
+    depth_band: int = 0,
+    resolution: float = GRID_CELL_DEGREES,
+    time_bucket: str = "month",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    max_cells: int = 50000,
+) -> Dict[str, object]:
+    """Roll the prof_grid cube up to `resolution` degrees and `time_bucket`; raises ValueError on bad input.
+
+    `bbox` is (west, south, east, north); west > east crosses the antimeridian. Cells on the bbox
+    edge are widened to whole output cells so they are never partially aggregated.
+    """
+    column = GRID_VARIABLES.get(variable)
+    if column is None:
+        raise ValueError(f"variable must be one of: {', '.join(GRID_VARIABLES)}")
+    if stat not in GRID_STATS:
+        raise ValueError(f"stat must be one of: {', '.join(GRID_STATS)}")
+    if not 0 <= depth_band < len(DEPTH_BANDS):
+        raise ValueError(f"depth_band must be between 0 and {len(DEPTH_BANDS) - 1}")
+    if time_bucket not in GRID_TIME_BUCKETS:
+        raise ValueError(f"time_bucket must be one of: {', '.join(GRID_TIME_BUCKETS)}")
+    factor = round(resolution / GRID_CELL_DEGREES)
+    if factor < 1 or abs(factor * GRID_CELL_DEGREES - resolution) > 1e-9:
+        raise ValueError(f"resolution must be a multiple of {GRID_CELL_DEGREES:g} degrees")
+    for month in (start, end):
+        if month is not None and not _MONTH_RE.match(month):
+            raise ValueError("start and end must be YYYY-MM")
+
+    where, params = ["DEPTH_BAND = ?"], [depth_band]
+    if start:
+        where.append("MONTH >= ?")
+        params.append(start)
+    if end:
+        where.append("MONTH <= ?")
+        params.append(end)
+    if bbox is not None:
+        west, south, east, north = bbox
+
+        def bin_range(low: float, high: float, offset: float, cells: int) -> Tuple[int, int]:
+            first = int(max(0, min(cells - 1, (low + offset) // GRID_CELL_DEGREES)))
+            last = int(max(0, min(cells - 1, (high + offset) // GRID_CELL_DEGREES)))
+            return first // factor * factor, last // factor * factor + factor - 1
+
+        lat_first, lat_last = bin_range(south, north, 90.0, int(180 / GRID_CELL_DEGREES))
+        where.append("LAT_BIN BETWEEN ? AND ?")
+        params += [lat_first, lat_last]
+        if west <= east:
+            lon_first, lon_last = bin_range(west, east, 180.0, int(360 / GRID_CELL_DEGREES))
+            where.append("LON_BIN BETWEEN ? AND ?")
+        else:
+            lon_first, _ = bin_range(west, 180.0, 180.0, int(360 / GRID_CELL_DEGREES))
+            _, lon_last = bin_range(-180.0, east, 180.0, int(360 / GRID_CELL_DEGREES))
+            where.append("(LON_BIN >= ? OR LON_BIN <= ?)")
+        params += [lon_first, lon_last]
+
+    period = GRID_TIME_BUCKETS[time_bucket]
+    rows = conn.execute(
+        f"SELECT {period} AS period, LAT_BIN / ? AS lat_cell, LON_BIN / ? AS lon_cell, "
+        f"SUM({column}_N), TOTAL({column}_SUM), TOTAL({column}_SUMSQ), MIN({column}_MIN), MAX({column}_MAX), "
+        f"SUM(N_PROFILES) FROM {PROFILE_GRID_TABLE} WHERE {' AND '.join(where)} "
+        "GROUP BY period, lat_cell, lon_cell ORDER BY period, lat_cell, lon_cell LIMIT ?;",
+        [factor, factor] + params + [max_cells + 1],
+    ).fetchall()
+
+    cells: List[list] = []
+    for period_value, lat_cell, lon_cell, n, total, total_sq, low, high, profiles in rows[:max_cells]:
+        value = _grid_value(stat, n, total, total_sq, low, high)
+        cells.append([
+            period_value,
+            round(-90.0 + (lat_cell + 0.5) * resolution, 6),
+            round(-180.0 + (lon_cell + 0.5) * resolution, 6),
+            round(value, 4) if isinstance(value, float) else value,
+            n,
+            profiles,
+        ])
+    low, high = DEPTH_BANDS[depth_band]
+    return {
+        "variable": variable,
+        "stat": stat,
+        "resolution": resolution,
+        "depth_band": {"index": depth_band, "min_pres": low, "max_pres": high},
+        "time_bucket": time_bucket,
+        "columns": ["period", "lat", "lon", "value", "observations", "profiles"],
+        "cells": cells,
+        "truncated": len(rows) > max_cells,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild derived summary tables in the ARGO SQLite database.")
+    parser.add_argument(
+        "--db",
+        default=os.environ.get(
+            "ARGO_DB_PATH",
+            os.path.join(os.path.dirname(__file__), "database", "argo_floats_new.db"),
+        ),
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(args.db)
+    try:
+        with conn:
+            written = refresh_profile_summary(conn)
+            cells = refresh_profile_grid(conn)
+            # Results cached against the old versions (/grid, prof_summary queries) go stale with the refresh.
+            bump_versions(conn, {PROFILE_SUMMARY_TABLE: written, PROFILE_GRID_TABLE: cells})
+    finally:
+        conn.close()
+    print(f"{PROFILE_SUMMARY_TABLE}: {written} profiles, {PROFILE_GRID_TABLE}: {cells} cells "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$", re.IGNORECASE)
+_FROM_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIASES = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "outer", "on", "using",
+    "group", "order", "limit", "having", "union", "except", "intersect", "window", "as",
+}
+
+# Indexes wider than this cost more on writes and disk than they save as covering indexes.
+MAX_INDEX_COLUMNS = 6
+
+
+def normalize_sql(sql: str) -> str:
+    text = _STRING_RE.sub("?", sql or "")
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("(?)", text)
+    return _SPACE_RE.sub(" ", text).strip().rstrip(";").strip().lower()
+
+
+def _hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint(sql: str) -> str:
+    return _hash(normalize_sql(sql))
+
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """Alias (lower-cased) -> table name; EXPLAIN QUERY PLAN reports aliased tables by their alias."""
+    aliases = {}
+    for table, alias in _FROM_RE.findall(sql or ""):
+        aliases[table.lower()] = table
+        if alias and alias.lower() not in _NOT_ALIASES:
+            aliases[alias.lower()] = table
+    return aliases
+
+
+def full_scans(plan: List[str], aliases: Optional[Dict[str, str]] = None) -> List[str]:
+    """Tables read by a bare table scan (no index) in EXPLAIN QUERY PLAN details."""
+    tables = []
+    for detail in plan:
+        match = _SCAN_RE.match(detail.strip())
+        if match:
+            name = match.group(1)
+            tables.append((aliases or {}).get(name.lower(), name))
+    return tables
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> List[str]:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+def _column_pattern(column: str) -> str:
+    return rf"(?:\b\w+\.)?\b{re.escape(column)}\b"
+
+
+def _predicate_columns(sql: str, columns: List[str]) -> Tuple[List[str], List[str]]:
+    equality, ranges = [], []
+    for column in columns:
+        col = _column_pattern(column)
+        if re.search(rf"{col}\s*(?:==?|\bIN\b|\bIS\b(?!\s+NOT))", sql, re.IGNORECASE):
+            equality.append(column)
+        elif re.search(rf"{col}\s*(?:<=?|>=?|\bBETWEEN\b|\bLIKE\b)", sql, re.IGNORECASE):
+            ranges.append(column)
+    order = {c: sql.lower().find(c.lower()) for c in equality + ranges}
+    return sorted(equality, key=order.get), sorted(ranges, key=order.get)
+
+
+def _ordering_columns(sql: str, columns: List[str]) -> List[str]:
+    match = re.search(r"\b(?:GROUP|ORDER)\s+BY\b(.*?)(?:\bLIMIT\b|\bHAVING\b|$)", sql, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return []
+    clause = match.group(1)
+    found = [(clause.lower().find(c.lower()), c) for c in columns if re.search(_column_pattern(c), clause, re.IGNORECASE)]
+    return [c for _, c in sorted(found)]
+
+
+def candidate_index(sql: str, table: str, columns: List[str]) -> Optional[List[str]]:
+    """Equality columns, then the first range (or GROUP/ORDER BY) column, then other referenced columns to cover."""
+    equality, ranges = _predicate_columns(sql, columns)
+    key = list(equality)
+    if ranges:
+        key.append(ranges[0])
+    elif not key:
+        key = _ordering_columns(sql, columns)[:1]
+    if not key:
+        return None
+
+    if re.search(r"\bSELECT\s+(?:DISTINCT\s+)?\*", sql, re.IGNORECASE):
+        return key
+    referenced = [c for c in columns if c not in key and re.search(_column_pattern(c), sql, re.IGNORECASE)]
+    if len(key) + len(referenced) <= MAX_INDEX_COLUMNS:
+        return key + referenced
+    return key
+
+
+def index_name(table: str, columns: List[str]) -> str:
+    return "idx_auto_" + "_".join([table] + columns).lower()
+
+
+@dataclass
+class FingerprintStats:
+    fingerprint: str
+    normalized_sql: str
+    sample_sql: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    rows: int = 0
+    last_seen: float = 0.0
+    plan: List[str] = field(default_factory=list)
+    plan_version: object = None
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.count if self.count else 0.0
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            "fingerprint": self.fingerprint,
+            "sql": self.normalized_sql,
+            "sample_sql": self.sample_sql,
+            "count": self.count,
+            "total_seconds": round(self.total_seconds, 4),
+            "mean_seconds": round(self.mean_seconds, 4),
+            "max_seconds": round(self.max_seconds, 4),
+            "rows": self.rows,
+            "plan": self.plan,
+            "full_scans": full_scans(self.plan, table_aliases(self.sample_sql)),
+        }
+
+
+class WorkloadLog:
+    """Per-fingerprint timings and query plans of executed SELECTs, used to recommend indexes."""
+
+    def __init__(self, max_fingerprints: int = 500):
+        self.max_fingerprints = max(1, max_fingerprints)
+        self._stats: Dict[str, FingerprintStats] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.explains = 0
+
+    def record(self, conn: sqlite3.Connection, sql: str, seconds: float, rows: int) -> None:
+        normalized = normalize_sql(sql)
+        if not normalized.startswith(("select", "with")):
+            return
+        key = _hash(normalized)
+        # Plans only change with the schema (new indexes), so EXPLAIN once per fingerprint and schema version.
+        schema_version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+        with self._lock:
+            entry = self._stats.get(key)
+            needs_plan = entry is None or entry.plan_version != schema_version
+        plan = None
+        if needs_plan:
+            try:
+                plan = explain(conn, sql)
+                self.explains += 1
+            except sqlite3.Error:
+                plan = []
+
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    cheapest = min(self._stats.values(), key=lambda s: s.total_seconds)
+                    del self._stats[cheapest.fingerprint]
+                entry = FingerprintStats(fingerprint=key, normalized_sql=normalized, sample_sql=sql.strip())
+                self._stats[key] = entry
+            if plan is not None:
+                entry.plan = plan
+                entry.plan_version = schema_version
+            entry.count += 1
+            entry.total_seconds += seconds
+            entry.max_seconds = max(entry.max_seconds, seconds)
+            entry.rows += rows
+            entry.last_seen = time.time()
+            self.recorded += 1
+
+    def top(self, limit: int = 20, order_by: str = "total_seconds") -> List[Dict[str, object]]:
+        with self._lock:
+            entries = list(self._stats.values())
+        key = {
+            "total_seconds": lambda s: s.total_seconds,
+            "mean_seconds": lambda s: s.mean_seconds,
+            "max_seconds": lambda s: s.max_seconds,
+            "count": lambda s: s.count,
+        }.get(order_by, lambda s: s.total_seconds)
+        return [entry.describe() for entry in sorted(entries, key=key, reverse=True)[:limit]]
+
+    def recommend(self, snapshot, min_total_seconds: float = 0.0, limit: int = 10) -> List[Dict[str, object]]:
+        """Rank candidate indexes by the time spent in full-scanning statements they would serve.
+
+        The estimate is an upper bound: it assumes the indexed plan's cost is negligible next to the scan.
+        """
+        with self._lock:
+            entries = [s for s in self._stats.values() if s.total_seconds >= min_total_seconds]
+
+        candidates: Dict[Tuple[str, Tuple[str, ...]], Dict[str, object]] = {}
+        for entry in entries:
+            for table in set(full_scans(entry.plan, table_aliases(entry.sample_sql))):
+                info = snapshot.table(table)
+                if info is None:
+                    continue
+                columns = candidate_index(entry.sample_sql, table, info.column_names)
+                if not columns or self._already_indexed(info, columns):
+                    continue
+                candidate = candidates.setdefault(
+                    (table, tuple(columns)),
+                    {
+                        "table": table,
+                        "columns": columns,
+                        "name": index_name(table, columns),
+                        "table_rows": info.row_count,
+                        "estimated_savings_seconds": 0.0,
+                        "fingerprints": [],
+                    },
+                )
+                candidate["estimated_savings_seconds"] += entry.total_seconds
+                candidate["fingerprints"].append(entry.fingerprint)
+
+        ranked = self._merge_prefixes(list(candidates.values()))
+        ranked.sort(key=lambda c: c["estimated_savings_seconds"], reverse=True)
+        for candidate in ranked:
+            candidate["estimated_savings_seconds"] = round(candidate["estimated_savings_seconds"], 4)
+            candidate["sql"] = (
+                f"CREATE INDEX IF NOT EXISTS {candidate['name']} ON {candidate['table']}"
+                f"({', '.join(candidate['columns'])});"
+            )
+        return ranked[:limit]
+
+    @staticmethod
+    def _already_indexed(info, columns: List[str]) -> bool:
+        wanted = [c.lower() for c in columns]
+        for indexed in info.indexes.values():
+            have = [c.lower() for c in indexed if c]
+            if have[: len(wanted)] == wanted:
+                return True
+        return False
+
+    @staticmethod
+    def _merge_prefixes(candidates: List[Dict[str, object]]) -> List[Dict[str, object]]:
+        # An index on (a, b, c) also serves lookups on (a) and (a, b); fold those into the wider one.
+        candidates.sort(key=lambda c: len(c["columns"]), reverse=True)
+        kept: List[Dict[str, object]] = []
+        for candidate in candidates:
+            wider = next(
+                (
+                    k for k in kept
+                    if k["table"] == candidate["table"]
+                    and k["columns"][: len(candidate["columns"])] == candidate["columns"]
+                ),
+                None,
+            )
+            if wider is None:
+                kept.append(candidate)
+                continue
+            wider["estimated_savings_seconds"] += candidate["estimated_savings_seconds"]
+            wider["fingerprints"].extend(candidate["fingerprints"])
+        return kept
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "fingerprints": len(self._stats),
+                "max_fingerprints": self.max_fingerprints,
+                "recorded": self.recorded,
+                "explains": self.explains,
+            }
+
+
+def apply_indexes(conn: sqlite3.Connection, recommendations: List[Dict[str, object]]) -> List[str]:
+    """Create the recommended indexes inside the caller's write transaction; returns their names."""
+    created = []
+    for recommendation in recommendations:
+        conn.execute(recommendation["sql"])
+        conn.execute(f"ANALYZE {recommendation['name']};")
+        created.append(recommendation["name"])
+    return created
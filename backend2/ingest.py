@@ -0,0 +1,843 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing, contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import netCDF4
+except Exception:
+    netCDF4 = None
+
+from data_versions import (
+    INGEST_FILES_TABLE,
+    bump_versions,
+    ensure_version_tables,
+    read_versions,
+    set_versions,
+)
+from derived_tables import (
+    DERIVED_TABLES,
+    PROFILE_GRID_TABLE,
+    PROFILE_SUMMARY_TABLE,
+    refresh_profile_grid,
+    refresh_profile_summary,
+)
+
+# Column layout of the relational ARGO tables (kept in sync with the schema in main4.py).
+TABLE_COLUMNS: Dict[str, List[Tuple[str, str]]] = {
+    "meta_rel": [
+        ("PLATFORM_NUMBER", "INTEGER"),
+        ("FLOAT_SERIAL_NO", "INTEGER"),
+        ("PLATFORM_TYPE", "TEXT"),
+        ("PLATFORM_FAMILY", "TEXT"),
+        ("PLATFORM_MAKER", "TEXT"),
+        ("DATA_CENTRE", "TEXT"),
+        ("PROJECT_NAME", "TEXT"),
+        ("PI_NAME", "TEXT"),
+        ("DEPLOYMENT_PLATFORM", "TEXT"),
+        ("LAUNCH_DATE", "TEXT"),
+        ("LAUNCH_LATITUDE", "REAL"),
+        ("LAUNCH_LONGITUDE", "REAL"),
+        ("SENSOR", "TEXT"),
+        ("PARAMETER", "TEXT"),
+        ("file_name", "TEXT"),
+    ],
+    "traj_rel": [
+        ("PLATFORM_NUMBER", "INTEGER"),
+        ("FLOAT_SERIAL_NO", "REAL"),
+        ("PLATFORM_TYPE", "TEXT"),
+        ("DATA_CENTRE", "TEXT"),
+        ("PROJECT_NAME", "TEXT"),
+        ("PI_NAME", "TEXT"),
+        ("POSITIONING_SYSTEM", "TEXT"),
+        ("DATA_STATE_INDICATOR", "TEXT"),
+        ("JULD", "TEXT"),
+        ("JULD_EPOCH", "REAL"),
+        ("LATITUDE", "REAL"),
+        ("LONGITUDE", "REAL"),
+        ("POSITION_QC", "REAL"),
+        ("POSITION_ACCURACY", "REAL"),
+        ("CYCLE_NUMBER", "REAL"),
+        ("DATA_MODE", "TEXT"),
+        ("file_name", "TEXT"),
+    ],
+    "prof_rel": [
+        ("float_id", "INTEGER"),
+        ("file_name", "TEXT"),
+        ("PLATFORM_NUMBER", "INTEGER"),
+        ("CYCLE_NUMBER", "REAL"),
+        ("JULD", "TEXT"),
+        ("JULD_EPOCH", "REAL"),
+        ("LATITUDE", "REAL"),
+        ("LONGITUDE", "REAL"),
+        ("PRES", "REAL"),
+        ("TEMP", "REAL"),
+        ("PSAL", "REAL"),
+        ("PRES_QC", "INTEGER"),
+        ("TEMP_QC", "INTEGER"),
+        ("PSAL_QC", "INTEGER"),
+        ("PRES_ADJUSTED", "REAL"),
+        ("TEMP_ADJUSTED", "REAL"),
+        ("PSAL_ADJUSTED", "REAL"),
+        ("PRES_ADJUSTED_QC", "REAL"),
+        ("TEMP_ADJUSTED_QC", "REAL"),
+        ("PSAL_ADJUSTED_QC", "REAL"),
+        ("DATA_MODE", "TEXT"),
+        ("PLATFORM_TYPE", "TEXT"),
+    ],
+    "tech_rel": [
+        ("N_TECH_PARAM", "INTEGER"),
+        ("DATE_CREATION", "TEXT"),
+        ("DATE_UPDATE", "TEXT"),
+        ("PLATFORM_NUMBER", "INTEGER"),
+        ("DATA_CENTRE", "TEXT"),
+        ("DATA_TYPE", "TEXT"),
+        ("FORMAT_VERSION", "REAL"),
+        ("HANDBOOK_VERSION", "REAL"),
+        ("TECHNICAL_PARAMETER_NAME", "TEXT"),
+        ("TECHNICAL_PARAMETER_VALUE", "TEXT"),
+        ("CYCLE_NUMBER", "REAL"),
+        ("file_name", "TEXT"),
+    ],
+}
+
+# Created after the bulk load so inserts do not pay for index maintenance.
+POST_LOAD_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_meta_rel_platform ON meta_rel(PLATFORM_NUMBER);",
+    "CREATE INDEX IF NOT EXISTS idx_traj_rel_platform_cycle ON traj_rel(PLATFORM_NUMBER, CYCLE_NUMBER);",
+    "CREATE INDEX IF NOT EXISTS idx_prof_rel_platform_cycle ON prof_rel(PLATFORM_NUMBER, CYCLE_NUMBER);",
+    "CREATE INDEX IF NOT EXISTS idx_tech_rel_platform ON tech_rel(PLATFORM_NUMBER);",
+    "CREATE INDEX IF NOT EXISTS idx_traj_rel_platform_juld_epoch ON traj_rel(PLATFORM_NUMBER, JULD_EPOCH);",
+    "CREATE INDEX IF NOT EXISTS idx_traj_rel_juld_epoch ON traj_rel(JULD_EPOCH);",
+    "CREATE INDEX IF NOT EXISTS idx_prof_rel_platform_juld_epoch ON prof_rel(PLATFORM_NUMBER, JULD_EPOCH);",
+    "CREATE INDEX IF NOT EXISTS idx_prof_rel_juld_epoch ON prof_rel(JULD_EPOCH);",
+]
+
+# JULD is kept as text for display; JULD_EPOCH (seconds since 1970-01-01 UTC) is what time filters should use.
+TIME_COLUMN = "JULD_EPOCH"
+TIME_TABLES = ("traj_rel", "prof_rel")
+
+FILE_KINDS = {
+    "_meta.nc": "meta",
+    "_tech.nc": "tech",
+    "_Dtraj.nc": "traj",
+    "_Rtraj.nc": "traj",
+    "_prof.nc": "prof",
+}
+
+ARGO_EPOCH = np.datetime64("1950-01-01T00:00:00", "s")
+# Seconds from the ARGO reference date (1950-01-01) to the Unix epoch.
+ARGO_EPOCH_OFFSET_SECONDS = 631152000
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    for table, columns in TABLE_COLUMNS.items():
+        cols = ", ".join(f"{name} {col_type}" for name, col_type in columns)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({cols});")
+
+
+def create_indexes(conn: sqlite3.Connection) -> None:
+    for statement in POST_LOAD_INDEXES:
+        conn.execute(statement)
+
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (table,)).fetchone() is not None
+
+
+def ensure_time_columns(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Add and backfill JULD_EPOCH on databases built before it existed; returns rows backfilled per table."""
+    backfilled = {}
+    for table in TIME_TABLES:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table});").fetchall()}
+        if TIME_COLUMN in columns:
+            continue
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {TIME_COLUMN} REAL;")
+        cursor = conn.execute(
+            f"UPDATE {table} SET {TIME_COLUMN} = ROUND((julianday(JULD) - 2440587.5) * 86400.0) "
+            "WHERE JULD IS NOT NULL;"
+        )
+        backfilled[table] = cursor.rowcount
+    return backfilled
+
+
+def discover_files(data_dir: str) -> Dict[str, Dict[str, str]]:
+    """Map platform number -> {kind: path}; delayed-mode trajectories win over real-time ones."""
+    floats: Dict[str, Dict[str, str]] = {}
+    for root, _, files in os.walk(data_dir):
+        for name in sorted(files):
+            for suffix, kind in FILE_KINDS.items():
+                if not name.endswith(suffix):
+                    continue
+                platform = name[: -len(suffix)]
+                entry = floats.setdefault(platform, {})
+                if kind == "traj" and entry.get("traj", "").endswith("_Dtraj.nc"):
+                    break
+                entry[kind] = os.path.join(root, name)
+                break
+    return dict(sorted(floats.items()))
+
+
+# --- NetCDF decoding helpers -------------------------------------------------
+
+
+def _has(ds, name: str) -> bool:
+    return name in ds.variables
+
+
+def _text_scalar(ds, name: str) -> Optional[str]:
+    if not _has(ds, name):
+        return None
+    raw = np.ma.filled(ds.variables[name][:], b" ")
+    if raw.dtype.kind == "S" and raw.ndim >= 1:
+        value = netCDF4.chartostring(raw)
+        value = value.item() if hasattr(value, "item") else value
+    else:
+        value = raw.item() if hasattr(raw, "item") else raw
+    if isinstance(value, bytes):
+        value = value.decode("ascii", errors="ignore")
+    text = str(value).strip()
+    return text or None
+
+
+def _text_rows(ds, name: str, n: int) -> np.ndarray:
+    """Per-row strings from a (N, STRINGx) char variable."""
+    out = np.full(n, None, dtype=object)
+    if not _has(ds, name):
+        return out
+    raw = np.ma.filled(ds.variables[name][:], b" ")
+    if raw.ndim == 2:
+        values = netCDF4.chartostring(raw)
+    else:
+        values = np.char.decode(raw.astype("S1"), "ascii", errors="ignore")
+    for i, value in enumerate(values[:n]):
+        text = str(value).strip()
+        out[i] = text or None
+    return out
+
+
+def _char_codes(ds, name: str, shape: Tuple[int, ...]) -> np.ndarray:
+    """Single-character flags (QC, DATA_MODE) as an object array of str/None."""
+    out = np.full(shape, None, dtype=object)
+    if not _has(ds, name):
+        return out
+    raw = np.ma.filled(ds.variables[name][:], b" ").astype("S1")
+    decoded = np.char.strip(np.char.decode(raw, "ascii", errors="ignore"))
+    out[...] = np.where(decoded == "", None, decoded).reshape(shape)
+    return out
+
+
+def _qc_numbers(codes: np.ndarray) -> np.ndarray:
+    out = np.full(codes.shape, None, dtype=object)
+    flat_in, flat_out = codes.reshape(-1), out.reshape(-1)
+    for i, code in enumerate(flat_in):
+        if code is not None and code.isdigit():
+            flat_out[i] = int(code)
+    return out
+
+
+def _floats(ds, name: str, shape: Tuple[int, ...]) -> np.ndarray:
+    if not _has(ds, name):
+        return np.full(shape, np.nan)
+    data = np.ma.filled(np.ma.asarray(ds.variables[name][:], dtype=float), np.nan)
+    return data.reshape(shape)
+
+
+def _to_objects(values: np.ndarray) -> np.ndarray:
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out
+
+
+def _juld_text(days: np.ndarray) -> np.ndarray:
+    out = np.full(days.shape, None, dtype=object)
+    valid = ~np.isnan(days)
+    if valid.any():
+        stamps = ARGO_EPOCH + np.round(days[valid] * 86400).astype("timedelta64[s]")
+        out[valid] = np.char.replace(np.datetime_as_string(stamps, unit="s"), "T", " ")
+    return out
+
+
+def _juld_epoch(days: np.ndarray) -> np.ndarray:
+    return _to_objects(np.round(days * 86400) - ARGO_EPOCH_OFFSET_SECONDS)
+
+
+def _argo_date_text(value: Optional[str]) -> Optional[str]:
+    # ARGO metadata dates are YYYYMMDDHHMISS strings.
+    if not value or len(value) < 8 or not value[:8].isdigit():
+        return value
+    padded = value.ljust(14, "0")
+    return f"{padded[0:4]}-{padded[4:6]}-{padded[6:8]} {padded[8:10]}:{padded[10:12]}:{padded[12:14]}"
+
+
+def _as_int(value: Optional[str]):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _as_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _open(path: str):
+    ds = netCDF4.Dataset(path, "r")
+    ds.set_auto_chartostring(False)
+    return ds
+
+
+# --- Row generators ----------------------------------------------------------
+
+
+def iter_meta_rows(path: str) -> Iterator[tuple]:
+    with _open(path) as ds:
+        platform = _as_int(_text_scalar(ds, "PLATFORM_NUMBER"))
+        n_sensor = len(ds.dimensions["N_SENSOR"]) if "N_SENSOR" in ds.dimensions else 0
+        n_param = len(ds.dimensions["N_PARAM"]) if "N_PARAM" in ds.dimensions else 0
+        sensors = _text_rows(ds, "SENSOR", n_sensor)
+        params = _text_rows(ds, "PARAMETER", n_param)
+        common = (
+            platform,
+            _as_int(_text_scalar(ds, "FLOAT_SERIAL_NO")),
+            _text_scalar(ds, "PLATFORM_TYPE"),
+            _text_scalar(ds, "PLATFORM_FAMILY"),
+            _text_scalar(ds, "PLATFORM_MAKER"),
+            _text_scalar(ds, "DATA_CENTRE"),
+            _text_scalar(ds, "PROJECT_NAME"),
+            _text_scalar(ds, "PI_NAME"),
+            _text_scalar(ds, "DEPLOYMENT_PLATFORM"),
+            _argo_date_text(_text_scalar(ds, "LAUNCH_DATE")),
+            _to_objects(_floats(ds, "LAUNCH_LATITUDE", (1,)))[0],
+            _to_objects(_floats(ds, "LAUNCH_LONGITUDE", (1,)))[0],
+        )
+        file_name = os.path.basename(path)
+        # One row per sensor/parameter slot, matching the existing meta_rel layout.
+        for i in range(max(1, n_sensor, n_param)):
+            sensor = sensors[i] if i < n_sensor else None
+            param = params[i] if i < n_param else None
+            yield common + (sensor, param, file_name)
+
+
+def iter_tech_rows(path: str) -> Iterator[tuple]:
+    with _open(path) as ds:
+        n = len(ds.dimensions["N_TECH_PARAM"]) if "N_TECH_PARAM" in ds.dimensions else 0
+        if n == 0:
+            return
+        names = _text_rows(ds, "TECHNICAL_PARAMETER_NAME", n)
+        values = _text_rows(ds, "TECHNICAL_PARAMETER_VALUE", n)
+        cycles = _to_objects(_floats(ds, "CYCLE_NUMBER", (n,)))
+        common = (
+            _argo_date_text(_text_scalar(ds, "DATE_CREATION")),
+            _argo_date_text(_text_scalar(ds, "DATE_UPDATE")),
+            _as_int(_text_scalar(ds, "PLATFORM_NUMBER")),
+            _text_scalar(ds, "DATA_CENTRE"),
+            _text_scalar(ds, "DATA_TYPE"),
+            _as_float(_text_scalar(ds, "FORMAT_VERSION")),
+            _as_float(_text_scalar(ds, "HANDBOOK_VERSION")),
+        )
+        file_name = os.path.basename(path)
+        for i in range(n):
+            yield (i,) + common + (names[i], values[i], cycles[i], file_name)
+
+
+def iter_traj_rows(path: str) -> Iterator[tuple]:
+    with _open(path) as ds:
+        n = len(ds.dimensions["N_MEASUREMENT"]) if "N_MEASUREMENT" in ds.dimensions else 0
+        if n == 0:
+            return
+        juld_days = _floats(ds, "JULD", (n,))
+        juld = _juld_text(juld_days)
+        juld_epoch = _juld_epoch(juld_days)
+        lat = _to_objects(_floats(ds, "LATITUDE", (n,)))
+        lon = _to_objects(_floats(ds, "LONGITUDE", (n,)))
+        position_qc = _qc_numbers(_char_codes(ds, "POSITION_QC", (n,)))
+        accuracy_codes = _char_codes(ds, "POSITION_ACCURACY", (n,))
+        accuracy = _qc_numbers(accuracy_codes)
+        cycles = _to_objects(_floats(ds, "CYCLE_NUMBER", (n,)))
+
+        # DATA_MODE is stored per cycle; map it onto measurements through CYCLE_NUMBER_INDEX.
+        data_mode = np.full(n, None, dtype=object)
+        if _has(ds, "DATA_MODE") and _has(ds, "CYCLE_NUMBER_INDEX") and "N_CYCLE" in ds.dimensions:
+            n_cycle = len(ds.dimensions["N_CYCLE"])
+            modes = _char_codes(ds, "DATA_MODE", (n_cycle,))
+            cycle_index = _floats(ds, "CYCLE_NUMBER_INDEX", (n_cycle,))
+            lookup = {int(c): m for c, m in zip(cycle_index, modes) if not np.isnan(c)}
+            for i, cycle in enumerate(cycles):
+                if cycle is not None:
+                    data_mode[i] = lookup.get(int(cycle))
+
+        common = (
+            _as_int(_text_scalar(ds, "PLATFORM_NUMBER")),
+            _as_float(_text_scalar(ds, "FLOAT_SERIAL_NO")),
+            _text_scalar(ds, "PLATFORM_TYPE"),
+            _text_scalar(ds, "DATA_CENTRE"),
+            _text_scalar(ds, "PROJECT_NAME"),
+            _text_scalar(ds, "PI_NAME"),
+            _text_scalar(ds, "POSITIONING_SYSTEM"),
+            _text_scalar(ds, "DATA_STATE_INDICATOR"),
+        )
+        file_name = os.path.basename(path)
+        for i in range(n):
+            if juld[i] is None and lat[i] is None:
+                continue
+            yield common + (
+                juld[i], juld_epoch[i], lat[i], lon[i], position_qc[i], accuracy[i], cycles[i], data_mode[i], file_name
+            )
+
+
+def iter_prof_rows(path: str) -> Iterator[tuple]:
+    with _open(path) as ds:
+        n_prof = len(ds.dimensions["N_PROF"])
+        n_levels = len(ds.dimensions["N_LEVELS"])
+        shape = (n_prof, n_levels)
+
+        platforms = _text_rows(ds, "PLATFORM_NUMBER", n_prof)
+        platform_types = _text_rows(ds, "PLATFORM_TYPE", n_prof)
+        data_modes = _char_codes(ds, "DATA_MODE", (n_prof,))
+        cycles = _to_objects(_floats(ds, "CYCLE_NUMBER", (n_prof,)))
+        juld_days = _floats(ds, "JULD", (n_prof,))
+        juld = _juld_text(juld_days)
+        juld_epoch = _juld_epoch(juld_days)
+        lat = _to_objects(_floats(ds, "LATITUDE", (n_prof,)))
+        lon = _to_objects(_floats(ds, "LONGITUDE", (n_prof,)))
+
+        pres = _floats(ds, "PRES", shape)
+        levels = {
+            name: _to_objects(_floats(ds, name, shape))
+            for name in ("PRES", "TEMP", "PSAL", "PRES_ADJUSTED", "TEMP_ADJUSTED", "PSAL_ADJUSTED")
+        }
+        qc = {
+            name: _qc_numbers(_char_codes(ds, name, shape))
+            for name in ("PRES_QC", "TEMP_QC", "PSAL_QC", "PRES_ADJUSTED_QC", "TEMP_ADJUSTED_QC", "PSAL_ADJUSTED_QC")
+        }
+        file_name = os.path.basename(path)
+
+        for p in range(n_prof):
+            platform = _as_int(platforms[p])
+            head = (platform, file_name, platform, cycles[p], juld[p], juld_epoch[p], lat[p], lon[p])
+            tail = (data_modes[p], platform_types[p])
+            # Fill levels below the deepest measurement carry no pressure; skip them.
+            for level in np.flatnonzero(~np.isnan(pres[p])):
+                yield head + (
+                    levels["PRES"][p, level],
+                    levels["TEMP"][p, level],
+                    levels["PSAL"][p, level],
+                    qc["PRES_QC"][p, level],
+                    qc["TEMP_QC"][p, level],
+                    qc["PSAL_QC"][p, level],
+                    levels["PRES_ADJUSTED"][p, level],
+                    levels["TEMP_ADJUSTED"][p, level],
+                    levels["PSAL_ADJUSTED"][p, level],
+                    qc["PRES_ADJUSTED_QC"][p, level],
+                    qc["TEMP_ADJUSTED_QC"][p, level],
+                    qc["PSAL_ADJUSTED_QC"][p, level],
+                ) + tail
+
+
+ROW_READERS = {
+    "meta": ("meta_rel", iter_meta_rows),
+    "tech": ("tech_rel", iter_tech_rows),
+    "traj": ("traj_rel", iter_traj_rows),
+    "prof": ("prof_rel", iter_prof_rows),
+}
+
+
+# --- Loader ------------------------------------------------------------------
+
+
+class BulkLoader:
+    """Batched executemany inserts inside large transactions, with rows/second reporting.
+
+    commit_rows=0 leaves transaction boundaries to the caller. Commits only happen between files,
+    so a file loaded through `file_transaction` is never left half in the database.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        batch_rows: int = 20000,
+        commit_rows: int = 500000,
+        progress_seconds: float = 5.0,
+        out=sys.stderr,
+    ):
+        self.conn = conn
+        self.batch_rows = batch_rows
+        self.commit_rows = commit_rows
+        self.progress_seconds = progress_seconds
+        self.out = out
+        self.rows_by_table: Dict[str, int] = {table: 0 for table in TABLE_COLUMNS}
+        self._uncommitted = 0
+        self._started = time.perf_counter()
+        self._last_report = self._started
+        self._statements = {
+            table: f"INSERT INTO {table} ({', '.join(c for c, _ in cols)}) VALUES ({', '.join('?' * len(cols))});"
+            for table, cols in TABLE_COLUMNS.items()
+        }
+        self.files_done = 0
+        self.files_total = 0
+        self._in_file = False
+
+    @property
+    def total_rows(self) -> int:
+        return sum(self.rows_by_table.values())
+
+    def begin(self) -> None:
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN;")
+
+    def load(self, table: str, rows: Iterable[tuple]) -> int:
+        statement = self._statements[table]
+        batch: List[tuple] = []
+        loaded = 0
+        self.begin()
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_rows:
+                loaded += self._write(table, statement, batch)
+                batch = []
+        if batch:
+            loaded += self._write(table, statement, batch)
+        return loaded
+
+    def _write(self, table: str, statement: str, batch: Sequence[tuple]) -> int:
+        self.conn.executemany(statement, batch)
+        count = len(batch)
+        self.rows_by_table[table] += count
+        self._uncommitted += count
+        self._commit_if_due()
+        self.report()
+        return count
+
+    def _commit_if_due(self) -> None:
+        if self.commit_rows and not self._in_file and self._uncommitted >= self.commit_rows:
+            self.conn.execute("COMMIT;")
+            self._uncommitted = 0
+            self.begin()
+
+    @contextmanager
+    def file_transaction(self):
+        """Everything written inside lands together; on an error it is rolled back and the error re-raised."""
+        rows_by_table, uncommitted = dict(self.rows_by_table), self._uncommitted
+        self.begin()
+        self.conn.execute("SAVEPOINT ingest_file;")
+        self._in_file = True
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK TO ingest_file;")
+            self.conn.execute("RELEASE ingest_file;")
+            self.rows_by_table, self._uncommitted = rows_by_table, uncommitted
+            raise
+        finally:
+            self._in_file = False
+        self.conn.execute("RELEASE ingest_file;")
+        self._commit_if_due()
+
+    def commit(self) -> None:
+        if self.conn.in_transaction:
+            self.conn.execute("COMMIT;")
+        self._uncommitted = 0
+
+    def report(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self._last_report < self.progress_seconds:
+            return
+        self._last_report = now
+        elapsed = max(now - self._started, 1e-9)
+        per_table = ", ".join(f"{t}={n}" for t, n in self.rows_by_table.items())
+        print(
+            f"[ingest] {self.total_rows} rows ({self.total_rows / elapsed:,.0f} rows/s), "
+            f"files {self.files_done}/{self.files_total}, {per_table}",
+            file=self.out,
+            flush=True,
+        )
+
+
+def _configure_bulk_connection(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA journal_mode=OFF;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA cache_size=-262144;")
+
+
+def _publish(build_path: str, db_path: str) -> None:
+    if not os.path.exists(db_path):
+        for stale in (f"{db_path}-wal", f"{db_path}-shm"):
+            if os.path.exists(stale):
+                os.remove(stale)
+        os.replace(build_path, db_path)
+        return
+    # Copy pages into the live database through SQLite so open readers and its WAL stay consistent.
+    # Both are closed before the build file is removed; Windows will not delete a file that is still open.
+    with closing(sqlite3.connect(build_path)) as source, closing(sqlite3.connect(db_path, timeout=60)) as target:
+        source.backup(target)
+    os.remove(build_path)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _record_file(
+    conn: sqlite3.Connection, rel_path: str, kind: str, platform, sha256: str, st: os.stat_result, rows: int
+) -> None:
+    conn.execute(
+        f"INSERT OR REPLACE INTO {INGEST_FILES_TABLE} "
+        "(path, kind, platform_number, sha256, size, mtime_ns, rows_loaded, ingested_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+        (rel_path, kind, platform, sha256, st.st_size, st.st_mtime_ns, rows, time.time()),
+    )
+
+
+def _column_position(table: str, column: str) -> int:
+    return [name for name, _ in TABLE_COLUMNS[table]].index(column)
+
+
+def _read_target_versions(db_path: str) -> Dict[str, int]:
+    if not os.path.exists(db_path):
+        return {}
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        return read_versions(conn)
+
+
+def build_database(
+    data_dir: str,
+    db_path: str,
+    batch_rows: int = 20000,
+    commit_rows: int = 500000,
+    progress_seconds: float = 5.0,
+    out=sys.stderr,
+) -> Dict[str, int]:
+    if netCDF4 is None:
+        raise RuntimeError("netCDF4 is required for ingestion: pip install netCDF4")
+
+    floats = discover_files(data_dir)
+    build_path = f"{db_path}.building"
+    if os.path.exists(build_path):
+        os.remove(build_path)
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(build_path, isolation_level=None)
+    try:
+        _configure_bulk_connection(conn)
+        create_tables(conn)
+        ensure_version_tables(conn)
+        loader = BulkLoader(conn, batch_rows, commit_rows, progress_seconds, out)
+        loader.files_total = sum(len(files) for files in floats.values())
+
+        for platform, files in floats.items():
+            for kind in ("meta", "tech", "traj", "prof"):
+                path = files.get(kind)
+                if not path:
+                    continue
+                table, reader = ROW_READERS[kind]
+                try:
+                    with loader.file_transaction():
+                        loaded = loader.load(table, reader(path))
+                        _record_file(
+                            conn, os.path.relpath(path, data_dir), kind, _as_int(platform),
+                            _file_sha256(path), os.stat(path), loaded,
+                        )
+                except (OSError, KeyError, ValueError) as exc:
+                    print(f"[ingest] skipped {path} (rolled back): {exc}", file=out, flush=True)
+                loader.files_done += 1
+        loader.commit()
+
+        print("[ingest] creating indexes and derived tables", file=out, flush=True)
+        create_indexes(conn)
+        loader.begin()
+        refresh_profile_summary(conn)
+        refresh_profile_grid(conn)
+        # Versions continue from the database being replaced so cached results keyed on them go stale.
+        previous = _read_target_versions(db_path)
+        tables = list(TABLE_COLUMNS) + list(DERIVED_TABLES)
+        set_versions(conn, {t: previous.get(t, 0) + 1 for t in tables})
+        loader.commit()
+        conn.execute("ANALYZE;")
+        loader.report(force=True)
+        stats = dict(loader.rows_by_table)
+    finally:
+        conn.close()
+
+    _publish(build_path, db_path)
+    return stats
+
+
+# Rows of an already-ingested (PLATFORM_NUMBER, CYCLE_NUMBER) are never rewritten by a delta run.
+DELTA_KEY_TABLES = ("prof_rel", "traj_rel", "tech_rel")
+
+
+def _existing_cycles(conn: sqlite3.Connection, table: str, platform) -> set:
+    cursor = conn.execute(f"SELECT DISTINCT CYCLE_NUMBER FROM {table} WHERE PLATFORM_NUMBER = ?;", (platform,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _load_file_delta(
+    conn: sqlite3.Connection, loader: BulkLoader, kind: str, path: str, platform
+) -> Tuple[Dict[str, int], set]:
+    table, reader = ROW_READERS[kind]
+    if table not in DELTA_KEY_TABLES:
+        # Float metadata is one small file per float; replace it wholesale.
+        deleted = conn.execute(f"DELETE FROM {table} WHERE PLATFORM_NUMBER = ?;", (platform,)).rowcount
+        loaded = loader.load(table, reader(path))
+        return ({table: loaded + deleted} if loaded or deleted else {}), set()
+
+    existing = _existing_cycles(conn, table, platform)
+    platform_pos = _column_position(table, "PLATFORM_NUMBER")
+    cycle_pos = _column_position(table, "CYCLE_NUMBER")
+    new_keys: set = set()
+
+    def new_rows() -> Iterator[tuple]:
+        for row in reader(path):
+            if row[cycle_pos] in existing:
+                continue
+            new_keys.add((row[platform_pos], row[cycle_pos]))
+            yield row
+
+    loaded = loader.load(table, new_rows())
+    return ({table: loaded} if loaded else {}), new_keys
+
+
+def update_database(
+    data_dir: str,
+    db_path: str,
+    batch_rows: int = 20000,
+    progress_seconds: float = 5.0,
+    busy_timeout: float = 30.0,
+    out=sys.stderr,
+) -> Dict[str, int]:
+    """Append only new cycles from new or changed files, one short write transaction per file.
+
+    Files whose size/mtime match the ingest_files record are skipped without reading them;
+    otherwise the SHA-256 decides. Each committed file bumps the versions of the tables it
+    touched and folds just the new profiles into prof_summary and prof_grid.
+    """
+    if netCDF4 is None:
+        raise RuntimeError("netCDF4 is required for ingestion: pip install netCDF4")
+
+    floats = discover_files(data_dir)
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=busy_timeout)
+    stats = {"files_scanned": 0, "files_unchanged": 0, "files_loaded": 0, "files_failed": 0}
+    try:
+        # WAL keeps readers on their snapshot while each file's transaction commits.
+        conn.execute("PRAGMA journal_mode=WAL;")
+        create_tables(conn)
+        conn.execute("BEGIN IMMEDIATE;")
+        migrated = ensure_time_columns(conn)
+        if not _table_exists(conn, PROFILE_GRID_TABLE):
+            # The cube can only be folded into once it holds every existing profile.
+            migrated[PROFILE_GRID_TABLE] = refresh_profile_grid(conn)
+        bump_versions(conn, migrated)
+        conn.execute("COMMIT;")
+        create_indexes(conn)
+        ensure_version_tables(conn)
+        loader = BulkLoader(conn, batch_rows, 0, progress_seconds, out)
+        loader.files_total = sum(len(files) for files in floats.values())
+
+        for platform, files in floats.items():
+            platform_number = _as_int(platform)
+            for kind in ("meta", "tech", "traj", "prof"):
+                path = files.get(kind)
+                if not path:
+                    continue
+                stats["files_scanned"] += 1
+                loader.files_done += 1
+                rel_path = os.path.relpath(path, data_dir)
+                st = os.stat(path)
+                record = conn.execute(
+                    f"SELECT sha256, size, mtime_ns FROM {INGEST_FILES_TABLE} WHERE path = ?;", (rel_path,)
+                ).fetchone()
+                if record and record[1] == st.st_size and record[2] == st.st_mtime_ns:
+                    stats["files_unchanged"] += 1
+                    continue
+                sha256 = _file_sha256(path)
+                if record and record[0] == sha256:
+                    conn.execute(
+                        f"UPDATE {INGEST_FILES_TABLE} SET size = ?, mtime_ns = ? WHERE path = ?;",
+                        (st.st_size, st.st_mtime_ns, rel_path),
+                    )
+                    stats["files_unchanged"] += 1
+                    continue
+
+                conn.execute("BEGIN IMMEDIATE;")
+                try:
+                    with loader.file_transaction():
+                        changes, new_keys = _load_file_delta(conn, loader, kind, path, platform_number)
+                        profile_keys = [key for key in new_keys if kind == "prof" and key[1] is not None]
+                        if profile_keys:
+                            changes[PROFILE_SUMMARY_TABLE] = refresh_profile_summary(conn, profile_keys)
+                            changes[PROFILE_GRID_TABLE] = refresh_profile_grid(conn, profile_keys)
+                        _record_file(conn, rel_path, kind, platform_number, sha256, st, sum(
+                            n for t, n in changes.items() if t not in DERIVED_TABLES
+                        ))
+                        bump_versions(conn, changes)
+                    conn.execute("COMMIT;")
+                    stats["files_loaded"] += 1
+                except (OSError, KeyError, ValueError, sqlite3.Error) as exc:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK;")
+                    stats["files_failed"] += 1
+                    print(f"[ingest] skipped {path}: {exc}", file=out, flush=True)
+
+        conn.execute("PRAGMA optimize;")
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE);")
+        loader.report(force=True)
+        stats.update(loader.rows_by_table)
+    finally:
+        conn.close()
+    return stats
+
+
+def main() -> None:
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(
+        description="Build or incrementally update the ARGO SQLite database from raw float NetCDF files."
+    )
+    parser.add_argument("--data-dir", default=os.environ.get("ARGO_DATA_DIR", os.path.join(base_dir, "ARGO_DATA")))
+    parser.add_argument(
+        "--db",
+        default=os.environ.get("ARGO_DB_PATH", os.path.join(base_dir, "database", "argo_floats_new.db")),
+    )
+    parser.add_argument("--batch-rows", type=int, default=20000)
+    parser.add_argument("--commit-rows", type=int, default=500000)
+    parser.add_argument("--progress-seconds", type=float, default=5.0)
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Rebuild from scratch even if the database exists (default: append new cycles only).",
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.full or not os.path.exists(args.db):
+        stats = build_database(args.data_dir, args.db, args.batch_rows, args.commit_rows, args.progress_seconds)
+    else:
+        stats = update_database(args.data_dir, args.db, args.batch_rows, args.progress_seconds)
+        print(
+            f"[ingest] files: {stats['files_loaded']} loaded, {stats['files_unchanged']} unchanged, "
+            f"{stats['files_failed']} failed of {stats['files_scanned']}"
+        )
+    elapsed = time.perf_counter() - started
+    total = sum(stats.get(table, 0) for table in TABLE_COLUMNS)
+    print(f"[ingest] done: {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s) -> {args.db}")
+
+
+if __name__ == "__main__":
+    main()
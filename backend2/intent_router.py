@@ -0,0 +1,77 @@
+import re
+import threading
+from typing import Dict, Tuple
+
+# Words that only make sense against the data: variables, aggregates, identifiers, places and times.
+_DATA_PATTERNS = [
+    r"\b(?:temp(?:erature)?s?|salinity|psal|pres(?:sure)?|depths?|dbar|psu)\b",
+    r"\b(?:profiles?|trajector(?:y|ies)|cycles?|platforms?|positions?|measurements?|observations?|readings?)\b",
+    r"\b(?:average|mean|median|max(?:imum)?|min(?:imum)?|sum|count|how many|number of|total|trend)\b",
+    r"\b(?:list|show|plot|give me|find|get|fetch|compare|top \d+)\b",
+    r"\b(?:latitude|longitude|nearest|closest|near|region|between|since|during)\b",
+    r"\b(?:last|this|past|previous) (?:week|month|year|season|\d+ (?:days|weeks|months|years))\b",
+    r"\b(?:19|20)\d{2}(?:-\d{2})?\b",
+    r"\b(?:january|february|march|april|may|june|july|august|september|october|november|december)\b",
+    r"\b\d{7}\b",
+    r"-?\d+(?:\.\d+)?\s*°?\s*[nsew]\b",
+    r"\b(?:arabian sea|bay of bengal|indian ocean|equator(?:ial)?|southern ocean|pacific|atlantic)\b",
+]
+
+# Phrasings of concept questions, greetings and questions about the assistant itself.
+_GENERAL_PATTERNS = [
+    r"^\s*(?:what|who|why)\s+(?:is|are|was|were)\s+(?:an?\s+|the\s+)?\w+\s*\??\s*$",
+    r"\b(?:explain|define|definition|meaning|history|purpose|difference between|in simple terms)\b",
+    r"\b(?:tell me about|how does|how do|why do|why does|what does)\b",
+    r"\b(?:this project|about you|who are you|what can you do|help me understand)\b",
+    r"^\s*(?:hi|hello|hey|thanks|thank you)\b",
+]
+
+_DATA_RES = [re.compile(p, re.IGNORECASE) for p in _DATA_PATTERNS]
+_GENERAL_RES = [re.compile(p, re.IGNORECASE) for p in _GENERAL_PATTERNS]
+
+
+class IntentRouter:
+    """Keyword-scored routing of a prompt to SQL, a general answer, or one combined LLM call when unsure."""
+
+    def __init__(self, min_data_score: int = 2):
+        self.min_data_score = min_data_score
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self.answered = 0
+        self.answered_without_llm = 0
+
+    def classify(self, prompt: str) -> Tuple[str, Dict[str, int]]:
+        text = prompt or ""
+        data = sum(1 for pattern in _DATA_RES if pattern.search(text))
+        general = sum(1 for pattern in _GENERAL_RES if pattern.search(text))
+        if general and not data:
+            intent = "general"
+        elif data >= self.min_data_score and not general:
+            intent = "sql"
+        else:
+            intent = "ambiguous"
+        return intent, {"data": data, "general": general}
+
+    def record(self, route: str) -> None:
+        """Count how a request was finally served (e.g. local_general, llm_sql, llm_general, direct)."""
+        with self._lock:
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def record_llm_usage(self, calls: int) -> None:
+        """Count one answered request and whether it needed the model at all (translation, answer or summary)."""
+        with self._lock:
+            self.answered += 1
+            if not calls:
+                self.answered_without_llm += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counts = dict(self._counts)
+            answered, without_llm = self.answered, self.answered_without_llm
+        return {
+            "routes": counts,
+            "total": sum(counts.values()),
+            "answered": answered,
+            "answered_without_llm": without_llm,
+            "without_llm_share": round(without_llm / answered, 4) if answered else 0.0,
+        }
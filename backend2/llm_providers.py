@@ -0,0 +1,353 @@
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+# Statuses worth trying again (elsewhere); any other 4xx means the request itself is wrong.
+RETRYABLE_STATUS = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+
+class ProviderUnavailable(Exception):
+    """No provider could complete the request within the retry and time budget."""
+
+    def __init__(self, message: str, errors: Optional[List[str]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+@dataclass
+class Provider:
+    name: str
+    api_key: str
+    model: str
+    base_url: str
+
+
+class LatencyTracker:
+    """Recent successful latencies of one provider."""
+
+    def __init__(self, window: int = 200):
+        self._samples: "deque[float]" = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; after `cooldown` one trial request is let through."""
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._trial_in_flight)
+
+    def allow(self) -> bool:
+        """Like `available`, but claims the half-open trial slot."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Gives back a half-open trial slot without a verdict (the request was cancelled)."""
+        self._trial_in_flight = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self._trial_in_flight or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self.trips += 1
+        self._trial_in_flight = False
+
+
+@dataclass
+class _ProviderState:
+    provider: Provider
+    latency: LatencyTracker
+    breaker: CircuitBreaker
+    counts: Dict[str, int] = field(default_factory=lambda: {
+        "requests": 0, "successes": 0, "failures": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0, "skipped_open": 0,
+    })
+
+
+class ProviderManager:
+    """OpenAI-compatible chat completions across providers, with hedging, circuit breakers and bounded retries.
+
+    A request goes to the first provider whose breaker is closed. If it has not answered after that
+    provider's recent latency quantile (clamped to [hedge_min_delay, hedge_max_delay]), a second copy
+    goes to the next available provider (or the same one when it is the only one) and the first answer
+    wins. Failed rounds are retried up to `max_retries` times with full-jitter backoff, and the whole
+    call is bounded by `deadline` seconds.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        providers: List[Provider],
+        hedge: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.5,
+        hedge_max_delay: float = 10.0,
+        min_samples: int = 10,
+        max_retries: int = 2,
+        retry_base: float = 0.25,
+        retry_max: float = 4.0,
+        attempt_timeout: float = 20.0,
+        deadline: float = 45.0,
+        breaker_failures: int = 5,
+        breaker_cooldown: float = 30.0,
+    ):
+        self.client = client
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.min_samples = min_samples
+        self.max_retries = max(0, max_retries)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self._states = [
+            _ProviderState(p, LatencyTracker(), CircuitBreaker(breaker_failures, breaker_cooldown)) for p in providers
+        ]
+        self.calls = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    @property
+    def providers(self) -> List[Provider]:
+        return [state.provider for state in self._states]
+
+    def _available(self) -> List[_ProviderState]:
+        available = []
+        for state in self._states:
+            if state.breaker.available():
+                available.append(state)
+            else:
+                state.counts["skipped_open"] += 1
+        return available
+
+    def _hedge_delay(self, state: _ProviderState) -> float:
+        if len(state.latency) < max(1, self.min_samples):
+            return self.hedge_max_delay
+        observed = state.latency.quantile(self.hedge_quantile)
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, observed))
+
+    def _record_failure(self, state: _ProviderState, exc: BaseException, trial: bool) -> None:
+        state.counts["failures"] += 1
+        if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code not in RETRYABLE_STATUS:
+            # The provider answered and rejected the request itself (bad payload, context too long).
+            if trial:
+                state.breaker.release()
+            return
+        state.breaker.failure()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0.0, min(self.retry_max, self.retry_base * 2 ** attempt))
+
+    async def _post(self, state: _ProviderState, body: dict, timeout: float) -> dict:
+        provider = state.provider
+        trial = state.breaker.state == "half_open"
+        if not state.breaker.allow():
+            raise ProviderUnavailable(f"{provider.name}: circuit open")
+        state.counts["requests"] += 1
+        started = time.monotonic()
+        try:
+            response = await self.client.post(
+                provider.base_url,
+                json={**body, "model": provider.model},
+                headers={"Authorization": f"Bearer {provider.api_key}"},
+                timeout=httpx.Timeout(timeout, connect=min(timeout, self.client.timeout.connect or timeout)),
+            )
+            response.raise_for_status()
+            data = response.json()
+        except asyncio.CancelledError:
+            # A hedge that lost the race says nothing about the provider's health.
+            if trial:
+                state.breaker.release()
+            raise
+        except (httpx.HTTPError, json.JSONDecodeError) as exc:
+            self._record_failure(state, exc, trial)
+            raise
+        state.latency.record(time.monotonic() - started)
+        state.counts["successes"] += 1
+        state.breaker.success()
+        return data
+
+    async def _round(self, candidates: List[_ProviderState], body: dict, remaining: float) -> dict:
+        """One primary request, plus one hedge if it is slow or a failover if it fails; the first success wins."""
+        primary = candidates[0]
+        backup = candidates[1] if len(candidates) > 1 else primary
+        timeout = min(self.attempt_timeout, remaining)
+        first = asyncio.ensure_future(self._post(primary, body, timeout))
+        tasks = {first: primary}
+        pending = {first}
+        errors: List[BaseException] = []
+        second_sent = hedged = False
+        try:
+            while pending:
+                wait = self._hedge_delay(primary) if self.hedge and not second_sent else None
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first and hedged:
+                            tasks[task].counts["hedge_wins"] += 1
+                        return task.result()
+                    errors.append(task.exception())
+                slow = not done
+                failed_over = not pending and backup is not primary
+                if not second_sent and (slow or failed_over):
+                    second_sent, hedged = True, slow
+                    backup.counts["hedges" if slow else "failovers"] += 1
+                    task = asyncio.ensure_future(self._post(backup, body, timeout))
+                    tasks[task] = backup
+                    pending.add(task)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        raise errors[-1]
+
+    async def complete(self, body: dict) -> dict:
+        """Chat completion response (parsed JSON) from the first provider that answers."""
+        self.calls += 1
+        started = time.monotonic()
+        errors: List[str] = []
+        for attempt in range(self.max_retries + 1):
+            remaining = self.deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            candidates = self._available()
+            if not candidates:
+                errors.append("all providers unavailable (circuit open)")
+            else:
+                try:
+                    return await asyncio.wait_for(self._round(candidates, body, remaining), timeout=remaining)
+                except httpx.HTTPStatusError as exc:
+                    errors.append(f"{exc.request.url.host}: HTTP {exc.response.status_code}")
+                    if exc.response.status_code not in RETRYABLE_STATUS:
+                        break
+                except (httpx.HTTPError, json.JSONDecodeError, TimeoutError, ProviderUnavailable) as exc:
+                    errors.append(f"{type(exc).__name__}: {exc}")
+            if attempt < self.max_retries:
+                self.retries += 1
+                delay = self._backoff(attempt)
+                if time.monotonic() - started + delay >= self.deadline:
+                    break
+                await asyncio.sleep(delay)
+        self.exhausted += 1
+        raise ProviderUnavailable("LLM request failed: " + "; ".join(errors[-3:]), errors)
+
+    async def stream(self, body: dict) -> AsyncIterator[str]:
+        """Streamed completion deltas; providers are tried in order until one starts answering."""
+        self.calls += 1
+        errors: List[str] = []
+        for state in self._available():
+            provider = state.provider
+            trial = state.breaker.state == "half_open"
+            if not state.breaker.allow():
+                continue
+            if errors:
+                state.counts["failovers"] += 1
+            state.counts["requests"] += 1
+            started = time.monotonic()
+            emitted = settled = False
+            try:
+                async with self.client.stream(
+                    "POST",
+                    provider.base_url,
+                    json={**body, "model": provider.model, "stream": True},
+                    headers={"Authorization": f"Bearer {provider.api_key}"},
+                    timeout=httpx.Timeout(self.attempt_timeout, connect=self.client.timeout.connect),
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        delta = (json.loads(data).get("choices") or [{}])[0].get("delta", {}).get("content")
+                        if delta:
+                            if not emitted:
+                                state.latency.record(time.monotonic() - started)
+                                emitted = True
+                            yield delta
+            except (httpx.HTTPError, json.JSONDecodeError, KeyError, IndexError, AttributeError) as exc:
+                settled = True
+                self._record_failure(state, exc, trial)
+                errors.append(f"{provider.name}: {type(exc).__name__}")
+                if emitted:
+                    # Half an answer cannot be spliced onto another provider's.
+                    raise
+                continue
+            else:
+                settled = True
+                state.counts["successes"] += 1
+                state.breaker.success()
+                return
+            finally:
+                # Closed or cancelled mid-stream (client went away): no verdict, give the trial slot back.
+                if trial and not settled:
+                    state.breaker.release()
+        self.exhausted += 1
+        raise ProviderUnavailable("LLM stream failed: " + "; ".join(errors), errors)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "exhausted": self.exhausted,
+            "providers": {
+                state.provider.name: {
+                    "model": state.provider.model,
+                    "breaker": state.breaker.state,
+                    "breaker_trips": state.breaker.trips,
+                    "p50_seconds": _rounded(state.latency.quantile(0.5)),
+                    "p95_seconds": _rounded(state.latency.quantile(0.95)),
+                    "hedge_delay_seconds": round(self._hedge_delay(state), 3),
+                    **state.counts,
+                }
+                for state in self._states
+            },
+        }
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
@@ -1,20 +1,59 @@
 import os
+import asyncio
+import contextvars
 import sqlite3
 import json
-import urllib.error
+import random
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import asynccontextmanager
 from typing import List
-import requests
+import httpx
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
+from admission import AdmissionController, AdmissionRejected, CostEstimator
+from data_versions import INTERNAL_TABLES, bump_versions, read_versions, referenced_tables, versions_for
+from db_pool import PoolTimeout, SQLitePool
+from derived_tables import (
+    DEPTH_BANDS,
+    GRID_CELL_DEGREES,
+    PROFILE_GRID_TABLE,
+    PROFILE_SUMMARY_TABLE,
+    query_profile_grid,
+    refresh_profile_grid,
+    refresh_profile_summary,
+)
+from index_advisor import WorkloadLog, apply_indexes
+from intent_router import IntentRouter
+from llm_providers import Provider, ProviderManager, ProviderUnavailable
+from nl_templates import TemplateContext, default_registry
+from profile_analytics import PROFILE_TABLE, derive, load_profiles
+from query_guard import CancelToken, QueryCancelled, QueryTooExpensive, StatementBudget
+from schema_catalog import CatalogSnapshot, SchemaCatalog
+from schema_selector import SchemaSelector
+from semantic_cache import SemanticCache
+from single_flight import SingleFlight
+from spatial_index import FloatPositionIndex
+from trajectory_tiles import TrajectoryIndex
+from translation_cache import TranslationCache
+from result_cache import ResultCache
+
 try:
     from dotenv import load_dotenv
 except Exception:
     load_dotenv = None
 
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
 if load_dotenv is not None:
     load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 
@@ -30,6 +69,29 @@ app.add_middleware(
 
 class QueryRequest(BaseModel):
     query: str
+    format: str = "markdown"
+
+
+class IndexApplyRequest(BaseModel):
+    names: List[str] = []
+    limit: int = 1
+
+
+class SemanticVerdictRequest(BaseModel):
+    correct: bool
+
+
+class ProfileRef(BaseModel):
+    platform_number: int
+    cycle_number: int
+
+
+class ProfileBatchRequest(BaseModel):
+    profiles: List[ProfileRef]
+    include_levels: bool = False
+
+
+RESULT_FORMATS = ("markdown", "columnar", "both")
 
 
 ARGO_DB_PATH = os.environ.get(
@@ -47,6 +109,255 @@ GROK_MODEL = os.environ.get("GROK_MODEL", "grok-2-latest")
 GROK_BASE_URL = os.environ.get("GROK_BASE_URL", "https://api.x.ai/v1/chat/completions")
 
 LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "auto").strip().lower()
+# With both keys set, the other provider takes over while the preferred one is failing.
+LLM_FAILOVER_ENABLED = os.environ.get("LLM_FAILOVER_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+# A slow call is duplicated after the provider's recent p95 latency (clamped); the first answer wins.
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+LLM_HEDGE_MAX_DELAY_SECONDS = float(os.environ.get("LLM_HEDGE_MAX_DELAY_SECONDS", "10"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.environ.get("LLM_RETRY_BASE_SECONDS", "0.25"))
+LLM_RETRY_MAX_SECONDS = float(os.environ.get("LLM_RETRY_MAX_SECONDS", "4"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.environ.get("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "10"))
+SQLITE_ENABLE_WAL = os.environ.get("SQLITE_ENABLE_WAL", "1").strip().lower() not in ("0", "false", "no")
+
+# Per-stage budgets (seconds)
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", "45"))
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.environ.get("LLM_ATTEMPT_TIMEOUT_SECONDS", "20"))
+SQL_TIMEOUT_SECONDS = float(os.environ.get("SQL_TIMEOUT_SECONDS", "30"))
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "120"))
+THREAD_POOL_WORKERS = int(os.environ.get("THREAD_POOL_WORKERS", "8"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "20"))
+NEAREST_FLOAT_COUNT = int(os.environ.get("NEAREST_FLOAT_COUNT", "5"))
+
+TRANSLATION_CACHE_ENABLED = os.environ.get("TRANSLATION_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+TRANSLATION_CACHE_PATH = os.environ.get(
+    "TRANSLATION_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "cache", "nl_sql_cache.db"),
+)
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.environ.get("TRANSLATION_CACHE_MAX_ENTRIES", "5000"))
+TRANSLATION_CACHE_TTL_SECONDS = float(os.environ.get("TRANSLATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Paraphrases of translated prompts reuse their SQL; a sampled share of those hits is re-translated and compared.
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+SEMANTIC_CACHE_AUDIT_RATE = float(os.environ.get("SEMANTIC_CACHE_AUDIT_RATE", "0"))
+
+# Send the model only the tables and columns a prompt refers to, with value ranges, samples and join hints.
+SCHEMA_PRUNING_ENABLED = os.environ.get("SCHEMA_PRUNING_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+SCHEMA_SAMPLE_VALUES = os.environ.get("SCHEMA_SAMPLE_VALUES", "1").strip().lower() not in ("0", "false", "no")
+SCHEMA_SAMPLE_MAX_ROWS = int(os.environ.get("SCHEMA_SAMPLE_MAX_ROWS", "200000"))
+
+REFINE_MODE = os.environ.get("REFINE_MODE", "digest").strip().lower()
+# "combined": clear concept questions skip NL-to-SQL, and the translation call may answer directly. "off": one call each.
+ROUTER_MODE = os.environ.get("ROUTER_MODE", "combined").strip().lower()
+REFINE_SAMPLE_ROWS = int(os.environ.get("REFINE_SAMPLE_ROWS", "5"))
+REFINE_MAX_TOKENS = int(os.environ.get("REFINE_MAX_TOKENS", "300"))
+STREAM_BATCH_ROWS = int(os.environ.get("STREAM_BATCH_ROWS", "50"))
+STREAM_QUEUE_BATCHES = int(os.environ.get("STREAM_QUEUE_BATCHES", "8"))
+
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", "600"))
+
+# Per-statement budgets enforced inside SQLite (0 disables a budget).
+SQL_STATEMENT_TIMEOUT_SECONDS = float(os.environ.get("SQL_STATEMENT_TIMEOUT_SECONDS", "20"))
+SQL_MAX_VM_STEPS = int(os.environ.get("SQL_MAX_VM_STEPS", "1000000000"))
+SQL_PROGRESS_INTERVAL = int(os.environ.get("SQL_PROGRESS_INTERVAL", "10000"))
+DISCONNECT_POLL_SECONDS = float(os.environ.get("DISCONNECT_POLL_SECONDS", "0.5"))
+
+# Admission control: statements are classed by estimated rows visited, each class with its own limit and queue.
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+ADMISSION_CHEAP_MAX_ROWS = int(os.environ.get("ADMISSION_CHEAP_MAX_ROWS", "20000"))
+ADMISSION_HEAVY_MIN_ROWS = int(os.environ.get("ADMISSION_HEAVY_MIN_ROWS", "2000000"))
+ADMISSION_MEDIUM_CONCURRENCY = int(os.environ.get("ADMISSION_MEDIUM_CONCURRENCY", "3"))
+ADMISSION_HEAVY_CONCURRENCY = int(os.environ.get("ADMISSION_HEAVY_CONCURRENCY", "1"))
+# What the medium and heavy classes leave of the shared executor, so cheap queries never wait behind them for a thread.
+ADMISSION_CHEAP_CONCURRENCY = int(os.environ.get(
+    "ADMISSION_CHEAP_CONCURRENCY",
+    str(max(1, THREAD_POOL_WORKERS - ADMISSION_MEDIUM_CONCURRENCY - ADMISSION_HEAVY_CONCURRENCY)),
+))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SECONDS", "30"))
+
+NL_TEMPLATES_ENABLED = os.environ.get("NL_TEMPLATES_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+# Template answers describe themselves, so by default their summary is written locally instead of by the model.
+NL_TEMPLATES_LOCAL_SUMMARY = os.environ.get("NL_TEMPLATES_LOCAL_SUMMARY", "1").strip().lower() not in ("0", "false", "no")
+
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+INDEX_ADVISOR_ENABLED = os.environ.get("INDEX_ADVISOR_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+INDEX_ADVISOR_MAX_FINGERPRINTS = int(os.environ.get("INDEX_ADVISOR_MAX_FINGERPRINTS", "500"))
+
+PROFILE_BATCH_MAX = int(os.environ.get("PROFILE_BATCH_MAX", "500"))
+
+TRAJECTORY_TOLERANCE_PX = float(os.environ.get("TRAJECTORY_TOLERANCE_PX", "1.0"))
+TRAJECTORY_MAX_ZOOM = int(os.environ.get("TRAJECTORY_MAX_ZOOM", "14"))
+TRAJECTORY_MAX_POINTS = int(os.environ.get("TRAJECTORY_MAX_POINTS", "1000"))
+TRAJECTORY_TILE_MAX_POINTS = int(os.environ.get("TRAJECTORY_TILE_MAX_POINTS", "4000"))
+
+GRID_MAX_CELLS = int(os.environ.get("GRID_MAX_CELLS", "50000"))
+
+LLM_ERRORS = (httpx.HTTPError, TimeoutError, KeyError, IndexError, json.JSONDecodeError, ProviderUnavailable)
+
+db_pool: SQLitePool = None
+schema_catalog = SchemaCatalog(ARGO_DB_PATH, exclude_tables=INTERNAL_TABLES)
+schema_selector = SchemaSelector(sample_values=SCHEMA_SAMPLE_VALUES, sample_max_rows=SCHEMA_SAMPLE_MAX_ROWS)
+float_position_index = FloatPositionIndex()
+trajectory_index = TrajectoryIndex(tolerance_px=TRAJECTORY_TOLERANCE_PX, max_zoom=TRAJECTORY_MAX_ZOOM)
+result_cache = ResultCache(max_bytes=RESULT_CACHE_MAX_BYTES, ttl_seconds=RESULT_CACHE_TTL_SECONDS)
+cost_estimator = CostEstimator(cheap_max_rows=ADMISSION_CHEAP_MAX_ROWS, heavy_min_rows=ADMISSION_HEAVY_MIN_ROWS)
+admission = AdmissionController(
+    {
+        "cheap": ADMISSION_CHEAP_CONCURRENCY,
+        "medium": ADMISSION_MEDIUM_CONCURRENCY,
+        "heavy": ADMISSION_HEAVY_CONCURRENCY,
+    },
+    max_queue=ADMISSION_MAX_QUEUE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+query_flights = SingleFlight()
+intent_router = IntentRouter()
+nl_templates = default_registry()
+workload_log = WorkloadLog(max_fingerprints=INDEX_ADVISOR_MAX_FINGERPRINTS) if INDEX_ADVISOR_ENABLED else None
+db_executor: ThreadPoolExecutor = None
+llm_client: httpx.AsyncClient = None
+llm_providers: ProviderManager = None
+translation_cache: TranslationCache = None
+semantic_cache = (
+    SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES)
+    if SEMANTIC_CACHE_ENABLED
+    else None
+)
+_semantic_audits = set()
+
+
+def _get_db_pool() -> SQLitePool:
+    global db_pool
+    if db_pool is None:
+        if not os.path.exists(ARGO_DB_PATH):
+            raise HTTPException(
+                status_code=500,
+                detail=f"Database file not found at ARGO_DB_PATH={ARGO_DB_PATH}",
+            )
+        db_pool = SQLitePool(
+            ARGO_DB_PATH,
+            max_size=DB_POOL_SIZE,
+            acquire_timeout=DB_POOL_TIMEOUT_SECONDS,
+            enable_wal=SQLITE_ENABLE_WAL,
+        )
+    return db_pool
+
+
+# The request's cancel token; worker threads see it because _run_db runs them in a copy of the context.
+_cancel_token: contextvars.ContextVar = contextvars.ContextVar("cancel_token", default=None)
+# Model calls made while answering the current request, as a one-element list so callees can bump it.
+_llm_calls: contextvars.ContextVar = contextvars.ContextVar("llm_calls", default=None)
+
+
+def _count_llm_call() -> None:
+    calls = _llm_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+
+def _statement_budget() -> StatementBudget:
+    return StatementBudget(
+        max_seconds=SQL_STATEMENT_TIMEOUT_SECONDS,
+        max_steps=SQL_MAX_VM_STEPS,
+        token=_cancel_token.get(),
+        interval=SQL_PROGRESS_INTERVAL,
+    )
+
+
+def _cancel_current(reason: str) -> None:
+    token = _cancel_token.get()
+    if token is not None:
+        token.cancel(reason)
+
+
+async def _run_db(func, *args, timeout: float = SQL_TIMEOUT_SECONDS):
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(db_executor, context.run, func, *args), timeout=timeout)
+    except TimeoutError:
+        # Stop the statement too; otherwise the worker thread keeps running after we give up on it.
+        _cancel_current("stage_timeout")
+        raise HTTPException(status_code=504, detail=f"Database stage timed out after {timeout:g} seconds.")
+    except asyncio.CancelledError:
+        _cancel_current("cancelled")
+        raise
+
+
+@app.on_event("startup")
+async def startup_event():
+    global db_executor, llm_client, llm_providers, translation_cache
+    db_executor = ThreadPoolExecutor(max_workers=THREAD_POOL_WORKERS, thread_name_prefix="sqlite")
+    llm_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            keepalive_expiry=60.0,
+        ),
+        headers={"Content-Type": "application/json", "User-Agent": "BlueQuery/1.0"},
+    )
+    llm_providers = ProviderManager(
+        llm_client,
+        _configured_llm_providers(),
+        hedge=LLM_HEDGE_ENABLED,
+        hedge_min_delay=LLM_HEDGE_MIN_DELAY_SECONDS,
+        hedge_max_delay=LLM_HEDGE_MAX_DELAY_SECONDS,
+        max_retries=LLM_MAX_RETRIES,
+        retry_base=LLM_RETRY_BASE_SECONDS,
+        retry_max=LLM_RETRY_MAX_SECONDS,
+        attempt_timeout=LLM_ATTEMPT_TIMEOUT_SECONDS,
+        deadline=LLM_TIMEOUT_SECONDS,
+        breaker_failures=LLM_BREAKER_FAILURES,
+        breaker_cooldown=LLM_BREAKER_COOLDOWN_SECONDS,
+    )
+    if TRANSLATION_CACHE_ENABLED:
+        translation_cache = await _run_db(
+            TranslationCache,
+            TRANSLATION_CACHE_PATH,
+            TRANSLATION_CACHE_MAX_ENTRIES,
+            TRANSLATION_CACHE_TTL_SECONDS,
+            timeout=None,
+        )
+        if semantic_cache is not None and not semantic_cache.size:
+            await _run_db(semantic_cache.load, translation_cache.items(), timeout=None)
+    if os.path.exists(ARGO_DB_PATH):
+        await _run_db(_load_schema_snapshot, timeout=None)
+
+
+def _load_schema_snapshot() -> CatalogSnapshot:
+    with _get_db_pool().connection() as conn:
+        return schema_catalog.get(conn)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    global db_pool, db_executor, llm_client, llm_providers, translation_cache
+    if llm_client is not None:
+        await llm_client.aclose()
+        llm_client = None
+        llm_providers = None
+    if translation_cache is not None:
+        translation_cache.close()
+        translation_cache = None
+    if db_executor is not None:
+        db_executor.shutdown(wait=False)
+        db_executor = None
+    if db_pool is not None:
+        db_pool.close()
+        db_pool = None
+    schema_catalog.close()
 
 
 def _is_sql_query(text: str) -> bool:
@@ -65,6 +376,11 @@ def _is_sql_query(text: str) -> bool:
     return normalized.startswith(sql_starts)
 
 
+def _is_read_only_sql(text: str) -> bool:
+    normalized = text.strip().lower()
+    return normalized.startswith(("select ", "with ", "pragma ", "explain "))
+
+
 def _escape_markdown_cell(value: object) -> str:
     if value is None:
         return "NULL"
@@ -84,6 +400,42 @@ def _format_markdown_table(columns: List[str], rows: List[sqlite3.Row]) -> str:
     return "\n".join([header, divider, *body])
 
 
+def _sqlite_value_type(value: object) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool) or isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "real"
+    if isinstance(value, (bytes, bytearray)):
+        return "blob"
+    return "text"
+
+
+def _format_columnar(columns: List[str], rows: List[sqlite3.Row]) -> dict:
+    data = [[] for _ in columns]
+    types = ["null"] * len(columns)
+    for row in rows:
+        for i, col in enumerate(columns):
+            value = row[col]
+            kind = _sqlite_value_type(value)
+            if kind == "blob":
+                value = bytes(value).hex()
+            if kind != "null":
+                if types[i] == "null":
+                    types[i] = kind
+                elif types[i] != kind:
+                    types[i] = "real" if {types[i], kind} == {"integer", "real"} else "mixed"
+            data[i].append(value)
+    return {
+        "columns": columns,
+        "types": types,
+        "data": data,
+        "row_count": len(rows),
+        "capped": len(rows) == MAX_ROWS,
+    }
+
+
 def _ensure_sectioned_markdown(text: str, default_title: str = "Answer") -> str:
     cleaned = (text or "").strip()
     if not cleaned:
@@ -93,11 +445,12 @@ def _ensure_sectioned_markdown(text: str, default_title: str = "Answer") -> str:
     return f"## {default_title}\n\n{cleaned}"
 
 
-def _format_sql_response_local(sql_query: str, sql_output: str) -> str:
-    summary = "Query executed successfully."
-    rows_match = re.search(r"Rows returned:\s*(\d+)", sql_output)
-    if rows_match:
-        summary = f"Query executed successfully. Rows returned: {rows_match.group(1)}."
+def _format_sql_response_local(sql_query: str, sql_output: str, summary: str = "") -> str:
+    if not summary:
+        summary = "Query executed successfully."
+        rows_match = re.search(r"Rows returned:\s*(\d+)", sql_output)
+        if rows_match:
+            summary = f"Query executed successfully. Rows returned: {rows_match.group(1)}."
     return (
         "## Summary\n\n"
         f"{summary}\n\n"
@@ -110,48 +463,65 @@ def _format_sql_response_local(sql_query: str, sql_output: str) -> str:
     )
 
 
-def _call_grok(messages: List[dict], temperature: float = 0.2) -> str:
-    provider = LLM_PROVIDER
-    if provider == "auto":
-        if GROQ_API_KEY:
-            provider = "groq"
-        elif GROK_API_KEY:
-            provider = "grok"
-        else:
-            return ""
-
-    if provider == "groq":
-        api_key = GROQ_API_KEY
-        model = GROQ_MODEL
-        base_url = GROQ_BASE_URL
-    elif provider == "grok":
-        api_key = GROK_API_KEY
-        model = GROK_MODEL
-        base_url = GROK_BASE_URL
+def _configured_llm_providers() -> List[Provider]:
+    """Providers with a key, preferred one (LLM_PROVIDER) first."""
+    available = {}
+    if GROQ_API_KEY:
+        available["groq"] = Provider("groq", GROQ_API_KEY, GROQ_MODEL, GROQ_BASE_URL)
+    if GROK_API_KEY:
+        available["grok"] = Provider("grok", GROK_API_KEY, GROK_MODEL, GROK_BASE_URL)
+    if LLM_PROVIDER in ("groq", "grok"):
+        if LLM_PROVIDER not in available:
+            return []
+        order = [LLM_PROVIDER] + [name for name in available if name != LLM_PROVIDER]
+    elif LLM_PROVIDER == "auto":
+        order = list(available)
     else:
+        return []
+    if not LLM_FAILOVER_ENABLED:
+        order = order[:1]
+    return [available[name] for name in order]
+
+
+def _resolve_llm_provider():
+    providers = llm_providers.providers if llm_providers is not None else _configured_llm_providers()
+    if not providers:
+        return None
+    return providers[0].api_key, providers[0].model, providers[0].base_url
+
+
+async def _call_grok(messages: List[dict], temperature: float = 0.2, max_tokens: int = 0) -> str:
+    if llm_providers is None or not llm_providers.providers:
         return ""
+    _count_llm_call()
 
     payload = {
-        "model": model,
         "messages": messages,
         "temperature": temperature,
     }
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
 
-    response = requests.post(
-        base_url,
-        json=payload,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "User-Agent": "BlueQuery/1.0",
-        },
-        timeout=45,
-    )
-    response.raise_for_status()
-    data = response.json()
+    data = await llm_providers.complete(payload)
     return data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
 
 
+async def _stream_grok(messages: List[dict], temperature: float = 0.2, max_tokens: int = 0):
+    if llm_providers is None or not llm_providers.providers:
+        return
+    _count_llm_call()
+
+    payload = {
+        "messages": messages,
+        "temperature": temperature,
+    }
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+
+    async for delta in llm_providers.stream(payload):
+        yield delta
+
+
 def _strip_code_fences(text: str) -> str:
     cleaned = text.strip()
     if cleaned.startswith("```"):
@@ -164,29 +534,57 @@ def _strip_code_fences(text: str) -> str:
     return cleaned
 
 
+def _get_schema_snapshot(conn: sqlite3.Connection) -> CatalogSnapshot:
+    return schema_catalog.get(conn)
+
+
 def _get_db_schema(conn: sqlite3.Connection) -> str:
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;")
-    tables = [row[0] for row in cursor.fetchall() if not row[0].startswith("sqlite_")]
-    schema_lines: List[str] = []
-    for table in tables:
-        cursor.execute(f"PRAGMA table_info({table});")
-        cols = [row[1] for row in cursor.fetchall()]
-        schema_lines.append(f"{table}({', '.join(cols)})")
-    return "\n".join(schema_lines)
-
-
-def _nl_to_sql_with_grok(user_prompt: str, db_schema: str) -> str:
+    return _get_schema_snapshot(conn).schema_text()
+
+
+def _schema_hints(snapshot: CatalogSnapshot, tables: List[str] = None) -> str:
+    """Usage notes for the tables sent to the model (all of them when `tables` is None)."""
+    def present(name: str) -> bool:
+        return snapshot.table(name) is not None and (tables is None or name in tables)
+
+    hints = []
+    if present(PROFILE_SUMMARY_TABLE):
+        hints.append(
+            f"{PROFILE_SUMMARY_TABLE} has one row per profile (PLATFORM_NUMBER, CYCLE_NUMBER) with JULD, position, "
+            "N_LEVELS, min/max/mean of PRES, TEMP and PSAL, and SURFACE_*/BOTTOM_* values at the shallowest and "
+            f"deepest level. Prefer {PROFILE_SUMMARY_TABLE} over prof_rel whenever it can answer the question "
+            "(per-profile statistics, surface or bottom values, maximum depth, profile counts); "
+            "use prof_rel only for per-level data."
+        )
+    epoch_tables = [
+        name for name in ("traj_rel", "prof_rel")
+        if present(name) and snapshot.table(name).column("JULD_EPOCH")
+    ]
+    if epoch_tables:
+        hints.append(
+            f"{' and '.join(epoch_tables)} have JULD_EPOCH (REAL, seconds since 1970-01-01 UTC), indexed alone and "
+            "with PLATFORM_NUMBER. Filter dates and time windows on JULD_EPOCH, never on JULD text or a function "
+            "of a column, e.g. JULD_EPOCH >= CAST(strftime('%s', '2023-03-01') AS REAL) AND "
+            "JULD_EPOCH < CAST(strftime('%s', '2023-04-01') AS REAL). Use JULD or "
+            "datetime(JULD_EPOCH, 'unixepoch') only for display."
+        )
+    return "\n".join(hints)
+
+
+async def _nl_to_sql_with_grok(user_prompt: str, db_schema: str, schema_hints: str = "") -> str:
     if not (GROQ_API_KEY or GROK_API_KEY):
         return ""
+    system_prompt = (
+        "Convert the user request into a single SQLite SELECT query using only the provided schema. "
+        "Output only SQL, no explanation, no markdown, no backticks. "
+        "If impossible, output exactly: CANNOT_CONVERT"
+    )
+    if schema_hints:
+        system_prompt += "\n\nSchema notes:\n" + schema_hints
     messages = [
         {
             "role": "system",
-            "content": (
-                "Convert the user request into a single SQLite SELECT query using only the provided schema. "
-                "Output only SQL, no explanation, no markdown, no backticks. "
-                "If impossible, output exactly: CANNOT_CONVERT"
-            ),
+            "content": system_prompt,
         },
         {
             "role": "user",
@@ -194,15 +592,48 @@ def _nl_to_sql_with_grok(user_prompt: str, db_schema: str) -> str:
         },
     ]
     try:
-        sql = _strip_code_fences(_call_grok(messages, temperature=0.0))
+        sql = _strip_code_fences(await _call_grok(messages, temperature=0.0))
         if sql.upper() == "CANNOT_CONVERT":
             return ""
         return sql
-    except (requests.RequestException, urllib.error.URLError, urllib.error.HTTPError, TimeoutError, KeyError, json.JSONDecodeError):
+    except LLM_ERRORS:
         return ""
 
 
-def _answer_general_with_grok(user_prompt: str) -> str:
+_GENERAL_ANSWER_PREFIX = "ANSWER:"
+
+
+async def _route_with_grok(user_prompt: str, db_schema: str, schema_hints: str = ""):
+    """One call that either translates to SQL or answers directly; returns ("sql" | "general" | "", text)."""
+    if not (GROQ_API_KEY or GROK_API_KEY):
+        return "", ""
+    system_prompt = (
+        "You are an oceanographic assistant for ARGO projects with access to the SQLite schema below. "
+        "If the request asks for data from this schema, convert it into a single SQLite SELECT query using "
+        "only the provided schema and output only SQL, no explanation, no markdown, no backticks. "
+        f"If the request is a general or concept question that the data cannot answer, output {_GENERAL_ANSWER_PREFIX} "
+        "on the first line followed by a clear markdown answer with short sections. "
+        "If it asks for data the schema does not hold, output exactly: CANNOT_CONVERT"
+    )
+    if schema_hints:
+        system_prompt += "\n\nSchema notes:\n" + schema_hints
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Schema:\n{db_schema}\n\nRequest:\n{user_prompt}"},
+    ]
+    try:
+        text = (await _call_grok(messages, temperature=0.0)).strip()
+    except LLM_ERRORS:
+        return "", ""
+    if text.upper().startswith(_GENERAL_ANSWER_PREFIX):
+        return "general", text[len(_GENERAL_ANSWER_PREFIX):].strip()
+    sql = _strip_code_fences(text)
+    if not sql or sql.upper() == "CANNOT_CONVERT":
+        return "", ""
+    return "sql", sql
+
+
+async def _answer_general_with_grok(user_prompt: str) -> str:
     if not (GROQ_API_KEY or GROK_API_KEY):
         return ""
     messages = [
@@ -217,8 +648,8 @@ def _answer_general_with_grok(user_prompt: str) -> str:
         {"role": "user", "content": user_prompt},
     ]
     try:
-        return _call_grok(messages, temperature=0.3)
-    except (requests.RequestException, urllib.error.URLError, urllib.error.HTTPError, TimeoutError, KeyError, json.JSONDecodeError):
+        return await _call_grok(messages, temperature=0.3)
+    except LLM_ERRORS:
         return ""
 
 
@@ -289,20 +720,19 @@ def _find_column_name(columns: List[str], candidates: List[str]) -> str:
     return ""
 
 
-def _nearest_float_sql_from_prompt(conn: sqlite3.Connection, user_prompt: str) -> str:
+def _nearest_floats_from_prompt(conn: sqlite3.Connection, user_prompt: str) -> dict:
     p = user_prompt.lower()
     if "nearest" not in p or "float" not in p:
-        return ""
+        return {}
     coords = _extract_lat_lon(user_prompt)
     if not coords:
-        return ""
+        return {}
     lat, lon = coords
 
-    c = conn.cursor()
-    c.execute("PRAGMA table_info(traj_rel);")
-    traj_cols = [row[1] for row in c.fetchall()]
+    snapshot = _get_schema_snapshot(conn)
+    traj_cols = snapshot.column_names("traj_rel")
     if not traj_cols:
-        return ""
+        return {}
 
     lat_col = _find_column_name(traj_cols, ["latitude", "lat"])
     lon_col = _find_column_name(traj_cols, ["longitude", "lon", "long"])
@@ -310,32 +740,113 @@ def _nearest_float_sql_from_prompt(conn: sqlite3.Connection, user_prompt: str) -
     juld_col = _find_column_name(traj_cols, ["juld", "date", "timestamp", "time"])
 
     if not lat_col or not lon_col:
-        return ""
+        return {}
 
-    select_cols = []
-    if id_col:
-        select_cols.append(f"{id_col} AS platform_number")
-    select_cols.extend([f"{lat_col} AS latitude", f"{lon_col} AS longitude"])
-    if juld_col:
-        select_cols.append(f"{juld_col} AS juld")
-
-    select_cols_sql = ", ".join(select_cols)
-    dist_expr = (
-        f"(({lat_col} - ({lat:.8f})) * ({lat_col} - ({lat:.8f})) + "
-        f"({lon_col} - ({lon:.8f})) * ({lon_col} - ({lon:.8f})))"
-    )
-    return (
-        f"SELECT {select_cols_sql}, {dist_expr} AS distance_sq "
-        f"FROM traj_rel "
-        f"WHERE {lat_col} IS NOT NULL AND {lon_col} IS NOT NULL "
-        f"ORDER BY distance_sq ASC LIMIT 5;"
+    traj_version = read_versions(conn).get("traj_rel")
+    float_position_index.ensure(conn, (snapshot.version, traj_version), lat_col, lon_col, id_col, juld_col)
+    neighbours = float_position_index.nearest(lat, lon, k=NEAREST_FLOAT_COUNT)
+
+    columns = ["platform_number", "latitude", "longitude", "juld", "distance_km"]
+    rows = [
+        {
+            "platform_number": ident,
+            "latitude": round(p_lat, 5),
+            "longitude": round(p_lon, 5),
+            "juld": juld,
+            "distance_km": round(distance_km, 2),
+        }
+        for ident, p_lat, p_lon, juld, distance_km in neighbours
+    ]
+    description = (
+        f"-- spatial index: {NEAREST_FLOAT_COUNT} nearest floats (latest position per float) "
+        f"to ({lat:.4f}, {lon:.4f}) by great-circle distance over traj_rel"
     )
+    return {
+        "executed_sql": description,
+        "execution": {"columns": columns, "rows": rows, "affected": 0},
+    }
+
 
+def _nearest_floats_template(context: TemplateContext) -> dict:
+    return _nearest_floats_from_prompt(context.conn, context.prompt)
 
-def _refine_with_grok(sql_query: str, sql_output: str) -> str:
+
+nl_templates.register("nearest_floats", _nearest_floats_template, keywords=r"\bnearest\b", priority=100)
+
+
+def _format_number(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return f"{round(value, 4):.12g}"
+
+
+def _result_digest(columns: List[str], rows: List[sqlite3.Row]) -> str:
+    lines = [f"Rows returned: {len(rows)}" + (f" (capped at {MAX_ROWS})" if len(rows) == MAX_ROWS else "")]
+    lines.append("Columns:")
+    for col in columns:
+        values = [row[col] for row in rows]
+        non_null = [v for v in values if v is not None]
+        nulls = len(values) - len(non_null)
+        numeric = [v for v in non_null if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        if non_null and len(numeric) == len(non_null):
+            mean = sum(numeric) / len(numeric)
+            lines.append(
+                f"- {col} (numeric): count={len(numeric)}, nulls={nulls}, "
+                f"min={_format_number(min(numeric))}, max={_format_number(max(numeric))}, "
+                f"mean={_format_number(mean)}"
+            )
+            continue
+        counts = {}
+        for v in non_null:
+            counts[str(v)] = counts.get(str(v), 0) + 1
+        top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:3]
+        top_text = ", ".join(f"{_escape_markdown_cell(k)[:40]} ({n})" for k, n in top)
+        lines.append(f"- {col} (text): count={len(non_null)}, nulls={nulls}, distinct={len(counts)}, top: {top_text}")
+
+    sample = rows[:REFINE_SAMPLE_ROWS]
+    if sample:
+        lines.append("")
+        lines.append(f"Sample rows (first {len(sample)} of {len(rows)}):")
+        lines.append(_format_markdown_table(columns, sample))
+    return "\n".join(lines)
+
+
+def _digest_summary_messages(sql_query: str, columns: List[str], rows: List[sqlite3.Row]) -> List[dict]:
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You summarize SQL results for an ocean data assistant. "
+                "You receive the SQL, per-column statistics over all returned rows and a few sample rows. "
+                "Write a short plain markdown summary (2-5 sentences or bullets) of what the result shows. "
+                "Do not add headings, do not reproduce the table, and do not invent values. "
+                "Use only the numbers given."
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"SQL Query:\n{sql_query}\n\nResult digest:\n{_result_digest(columns, rows)}",
+        },
+    ]
+
+
+def _clean_summary(summary: str) -> str:
+    return re.sub(r"^#+\s*Summary\s*", "", (summary or "").strip(), flags=re.IGNORECASE).strip()
+
+
+async def _refine_with_grok(sql_query: str, sql_output: str, columns: List[str] = None, rows: List[sqlite3.Row] = None) -> str:
     if not (GROQ_API_KEY or GROK_API_KEY):
         return _format_sql_response_local(sql_query, sql_output)
 
+    if REFINE_MODE == "digest" and columns is not None and rows is not None:
+        # Only a digest goes to the model; the full table is spliced back in locally,
+        # so refine cost stays flat regardless of result size.
+        try:
+            summary = await _call_grok(_digest_summary_messages(sql_query, columns, rows), temperature=0.2, max_tokens=REFINE_MAX_TOKENS)
+        except LLM_ERRORS:
+            summary = ""
+        return _format_sql_response_local(sql_query, sql_output, summary=_clean_summary(summary))
+
     messages = [
             {
                 "role": "system",
@@ -354,107 +865,868 @@ def _refine_with_grok(sql_query: str, sql_output: str) -> str:
         ]
 
     try:
-        refined = _call_grok(messages, temperature=0.2)
+        refined = await _call_grok(messages, temperature=0.2)
         return _ensure_sectioned_markdown(refined, "SQL Result") if refined else _format_sql_response_local(sql_query, sql_output)
-    except (requests.RequestException, urllib.error.URLError, urllib.error.HTTPError, TimeoutError, KeyError, json.JSONDecodeError):
+    except LLM_ERRORS:
         return _format_sql_response_local(sql_query, sql_output)
 
 
-@app.post("/query")
-async def process_query(request: QueryRequest):
-    user_query = request.query.strip()
-    if not user_query:
-        raise HTTPException(status_code=400, detail="Empty query")
+def _load_nl_context(user_prompt: str) -> dict:
+    with _get_db_pool().connection() as conn:
+        snapshot = _get_schema_snapshot(conn)
+        if NL_TEMPLATES_ENABLED:
+            with _statement_budget().guard(conn):
+                matched = nl_templates.match(user_prompt, snapshot, conn)
+            if matched:
+                return matched
+        else:
+            nearest = _nearest_floats_from_prompt(conn, user_prompt)
+            if nearest:
+                return nearest
+        if not SCHEMA_PRUNING_ENABLED:
+            return {
+                "schema": snapshot.schema_text(),
+                "schema_hints": _schema_hints(snapshot),
+                "schema_hash": snapshot.schema_hash,
+            }
+        with _statement_budget().guard(conn):
+            selection = schema_selector.select(snapshot, user_prompt, conn)
+        return {
+            "schema": selection["schema"],
+            "schema_hints": _schema_hints(snapshot, selection["tables"]),
+            "schema_hash": snapshot.schema_hash,
+        }
 
-    if not os.path.exists(ARGO_DB_PATH):
-        raise HTTPException(
-            status_code=500,
-            detail=f"Database file not found at ARGO_DB_PATH={ARGO_DB_PATH}",
-        )
 
-    try:
-        with sqlite3.connect(ARGO_DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            sql_to_execute = user_query
-
-            if not _is_sql_query(user_query):
-                heuristic_sql = _nearest_float_sql_from_prompt(conn, user_query)
-                if heuristic_sql:
-                    sql_to_execute = heuristic_sql
-                else:
-                    schema = _get_db_schema(conn)
-                    converted_sql = _nl_to_sql_with_grok(user_query, schema)
-                    if not converted_sql:
-                        general_answer = _answer_general_with_grok(user_query)
-                        if general_answer:
-                            return {
-                                "query": user_query,
-                                "result": _ensure_sectioned_markdown(general_answer, "Answer"),
-                                "source": "grok_general",
-                            }
-                        return {
-                            "query": user_query,
-                            "result": _answer_general_local(user_query),
-                            "source": "local_general_fallback",
-                        }
-                    if not _is_sql_query(converted_sql):
-                        general_answer = _answer_general_with_grok(user_query)
-                        if general_answer:
-                            return {
-                                "query": user_query,
-                                "result": _ensure_sectioned_markdown(general_answer, "Answer"),
-                                "source": "grok_general",
-                            }
-                        return {
-                            "query": user_query,
-                            "result": _answer_general_local(user_query),
-                            "source": "local_general_fallback",
-                        }
-                    sql_to_execute = converted_sql
+def _execute_sql(sql_query: str) -> dict:
+    pool = _get_db_pool()
+    if not _is_read_only_sql(sql_query):
+        with pool.writer() as conn:
+            with _statement_budget().guard(conn):
+                cursor = conn.execute(sql_query)
+            affected = cursor.rowcount if cursor.rowcount is not None else 0
+            # Only databases built by ingest.py carry table versions; leave others untouched.
+            if read_versions(conn):
+                tables = referenced_tables(sql_query, _get_schema_snapshot(conn).tables)
+                bump_versions(conn, {table: max(affected, 0) for table in tables})
+        return {"columns": None, "rows": [], "affected": affected}
 
+    with pool.connection() as conn:
+        started = time.perf_counter()
+        with _statement_budget().guard(conn):
             cursor = conn.cursor()
-            cursor.execute(sql_to_execute)
-
-            if cursor.description:
-                columns = [col[0] for col in cursor.description]
-                rows = cursor.fetchmany(MAX_ROWS)
-                result = _format_markdown_table(columns, rows)
-                total_info = (
-                    f"\n\nRows returned: {len(rows)}"
-                    + (f" (capped at {MAX_ROWS})" if len(rows) == MAX_ROWS else "")
-                )
-                raw_result = result + total_info
-                final_result = _refine_with_grok(sql_to_execute, raw_result)
-                return {"query": user_query, "executed_sql": sql_to_execute, "result": final_result}
+            cursor.execute(sql_query)
+            if not cursor.description:
+                return {"columns": None, "rows": [], "affected": 0}
+            columns = [col[0] for col in cursor.description]
+            rows = cursor.fetchmany(MAX_ROWS)
+        if workload_log is not None:
+            workload_log.record(conn, sql_query, time.perf_counter() - started, len(rows))
+        return {"columns": columns, "rows": rows, "affected": 0}
 
-            conn.commit()
-            affected = cursor.rowcount if cursor.rowcount is not None else 0
+
+# Per-table versions are re-read only when SQLite reports that another connection committed.
+_table_versions_state = {"data_version": None, "versions": {}}
+
+
+def _table_versions() -> dict:
+    pool = _get_db_pool()
+    data_version = pool.data_version()
+    if _table_versions_state["data_version"] != data_version:
+        with pool.connection() as conn:
+            versions = read_versions(conn)
+        _table_versions_state.update(data_version=data_version, versions=versions)
+    return _table_versions_state["versions"]
+
+
+def _tables_cache_version(tables: List[str]) -> object:
+    versions = _table_versions()
+    data_version = _table_versions_state["data_version"]
+    if versions and tables:
+        return versions_for(versions, tables, fallback=("data_version", data_version))
+    return data_version
+
+
+def _cache_version(sql_query: str) -> object:
+    """Cache version for a statement: the versions of the tables it reads, else PRAGMA data_version."""
+    if not _table_versions():
+        return _table_versions_state["data_version"]
+    return _tables_cache_version(referenced_tables(sql_query, _load_schema_snapshot().tables))
+
+
+def _result_cache_key(sql_query: str) -> str:
+    return sql_query.strip().rstrip(";").strip()
+
+
+def _classify_sql(sql_query: str) -> dict:
+    with _get_db_pool().connection() as conn:
+        return cost_estimator.classify(conn, sql_query, _get_schema_snapshot(conn))
+
+
+@asynccontextmanager
+async def _admitted(sql_query: str):
+    """Hold a slot of the statement's cost class while it executes; yields the classification."""
+    if not ADMISSION_ENABLED:
+        yield None
+        return
+    classification = await _run_db(_classify_sql, sql_query)
+    async with admission.slot(classification["class"]):
+        yield classification
+
+
+async def _general_answer_response(user_query: str, general_answer: str = None) -> dict:
+    if general_answer is None:
+        general_answer = await _answer_general_with_grok(user_query)
+    if general_answer:
+        return {
+            "query": user_query,
+            "result": _ensure_sectioned_markdown(general_answer, "Answer"),
+            "source": "grok_general",
+        }
+    return {
+        "query": user_query,
+        "result": _answer_general_local(user_query),
+        "source": "local_general_fallback",
+    }
+
+
+async def _resolve_sql(user_query: str) -> dict:
+    """SQL for the prompt; {} for a general question, or {"answer": ...} when the router call answered it."""
+    if _is_sql_query(user_query):
+        intent_router.record("direct")
+        return {"sql": user_query, "sql_source": "direct", "execution": None}
+
+    context = await _run_db(_load_nl_context, user_query)
+    if context.get("execution"):
+        intent_router.record(f"template:{context.get('template', 'nearest_floats')}")
+        return {"sql": context["executed_sql"], "sql_source": "spatial_index", "execution": context["execution"]}
+    if context.get("template"):
+        intent_router.record(f"template:{context['template']}")
+        return {
+            "sql": context["sql"],
+            "sql_source": "template",
+            "template": context["template"],
+            "summary": context.get("summary", ""),
+            "execution": None,
+        }
+
+    if translation_cache is not None:
+        cached_sql = await _run_db(translation_cache.get, user_query, context["schema_hash"])
+        if cached_sql:
+            intent_router.record("translation_cache")
+            return {
+                "sql": cached_sql,
+                "sql_source": "translation_cache",
+                "schema_hash": context["schema_hash"],
+                "execution": None,
+            }
+
+    if semantic_cache is not None:
+        similar = await _run_db(semantic_cache.lookup, user_query, context["schema_hash"])
+        if similar:
+            intent_router.record("semantic_cache")
+            if random.random() < SEMANTIC_CACHE_AUDIT_RATE:
+                _schedule_semantic_audit(similar, user_query, context)
+            return {
+                "sql": similar["sql"],
+                "sql_source": "semantic_cache",
+                "schema_hash": context["schema_hash"],
+                "matched_prompt": similar["matched_prompt"],
+                "execution": None,
+            }
+
+    if ROUTER_MODE == "off":
+        converted_sql = await _nl_to_sql_with_grok(user_query, context["schema"], context["schema_hints"])
+    else:
+        intent, _ = intent_router.classify(user_query)
+        if intent == "general":
+            intent_router.record("local_general")
+            return {}
+        kind, text = await _route_with_grok(user_query, context["schema"], context["schema_hints"])
+        if kind == "general":
+            intent_router.record("llm_general")
+            return {"answer": text}
+        converted_sql = text if kind == "sql" else ""
+    if not converted_sql or not _is_sql_query(converted_sql):
+        intent_router.record("unconverted")
+        return {}
+    intent_router.record("llm_sql")
+    return {"sql": converted_sql, "sql_source": "llm", "schema_hash": context["schema_hash"], "execution": None}
+
+
+async def _remember_translation(user_query: str, resolved: dict) -> None:
+    """Caches a model translation, once it has executed successfully."""
+    if resolved["sql_source"] != "llm" or not _is_read_only_sql(resolved["sql"]):
+        return
+    if translation_cache is not None:
+        await _run_db(translation_cache.put, user_query, resolved["schema_hash"], resolved["sql"])
+    if semantic_cache is not None:
+        await _run_db(semantic_cache.add, user_query, resolved["schema_hash"], resolved["sql"])
+
+
+async def _forget_translation(user_query: str, resolved: dict) -> None:
+    """Drops the cached translation a failing statement came from, so the next request asks the model again."""
+    if resolved["sql_source"] == "translation_cache" and translation_cache is not None:
+        await _run_db(translation_cache.discard, user_query, resolved["schema_hash"])
+        if semantic_cache is not None:
+            await _run_db(semantic_cache.discard, user_query, resolved["schema_hash"])
+    elif resolved["sql_source"] == "semantic_cache" and semantic_cache is not None:
+        await _run_db(semantic_cache.discard, resolved["matched_prompt"], resolved["schema_hash"])
+
+
+def _same_result(first_sql: str, second_sql: str) -> bool:
+    first, second = _execute_sql(first_sql), _execute_sql(second_sql)
+    rows = lambda execution: [tuple(row) for row in execution["rows"]]
+    return first["columns"] == second["columns"] and rows(first) == rows(second)
+
+
+async def _audit_semantic_hit(similar: dict, user_query: str, context: dict) -> None:
+    """Translate the prompt afresh and compare results; a differing result marks the hit as false."""
+    # The task copied the request's context; it must not count against, or be cancelled with, that request.
+    _llm_calls.set(None)
+    _cancel_token.set(CancelToken())
+    try:
+        fresh_sql = await _nl_to_sql_with_grok(user_query, context["schema"], context["schema_hints"])
+        if not fresh_sql or not _is_read_only_sql(fresh_sql):
+            return
+        correct = await _run_db(_same_result, similar["sql"], fresh_sql)
+    except (sqlite3.Error, QueryTooExpensive, QueryCancelled, PoolTimeout, TimeoutError) + LLM_ERRORS:
+        return
+    semantic_cache.record_verdict(similar["audit_id"], correct)
+
+
+def _schedule_semantic_audit(similar: dict, user_query: str, context: dict) -> None:
+    if _resolve_llm_provider() is None:
+        return
+    task = asyncio.ensure_future(_audit_semantic_hit(similar, user_query, context))
+    _semantic_audits.add(task)
+    task.add_done_callback(_semantic_audits.discard)
+
+
+async def _run_query_pipeline(user_query: str, result_format: str = "markdown") -> dict:
+    calls = [0]
+    _llm_calls.set(calls)
+    response = await _answer_query(user_query, result_format)
+    intent_router.record_llm_usage(calls[0])
+    return response
+
+
+def _template_summary(resolved: dict) -> str:
+    """The template's own description of its result, when it is used in place of a model summary."""
+    return resolved.get("summary", "") if NL_TEMPLATES_LOCAL_SUMMARY else ""
+
+
+async def _answer_query(user_query: str, result_format: str) -> dict:
+    resolved = await _resolve_sql(user_query)
+    if not resolved or "answer" in resolved:
+        return await _general_answer_response(user_query, resolved.get("answer"))
+    sql_to_execute = resolved["sql"]
+    sql_source = resolved["sql_source"]
+    execution = resolved["execution"]
+
+    cache_version = None
+    if execution is None and _is_read_only_sql(sql_to_execute):
+        cache_version = await _run_db(_cache_version, sql_to_execute)
+        cached_payload = result_cache.get((_result_cache_key(sql_to_execute), result_format), cache_version)
+        if cached_payload is not None:
+            await _remember_translation(user_query, resolved)
             return {
                 "query": user_query,
                 "executed_sql": sql_to_execute,
-                "result": f"Statement executed successfully. Rows affected: {affected}.",
+                "sql_source": sql_source,
+                **cached_payload,
+                "cached": True,
             }
+
+    query_class = None
+    if execution is None:
+        try:
+            async with _admitted(sql_to_execute) as classification:
+                execution = await _run_db(_execute_sql, sql_to_execute)
+        except (sqlite3.Error, QueryTooExpensive):
+            await _forget_translation(user_query, resolved)
+            raise
+        await _remember_translation(user_query, resolved)
+        query_class = classification["class"] if classification else None
+    columns = execution["columns"]
+    if columns is None:
+        return {
+            "query": user_query,
+            "executed_sql": sql_to_execute,
+            "sql_source": sql_source,
+            "result": f"Statement executed successfully. Rows affected: {execution['affected']}.",
+        }
+
+    rows = execution["rows"]
+    payload = {}
+    if result_format in ("columnar", "both"):
+        payload["data"] = _format_columnar(columns, rows)
+    if result_format in ("markdown", "both"):
+        result = _format_markdown_table(columns, rows)
+        total_info = (
+            f"\n\nRows returned: {len(rows)}"
+            + (f" (capped at {MAX_ROWS})" if len(rows) == MAX_ROWS else "")
+        )
+        raw_result = result + total_info
+        summary = _template_summary(resolved)
+        if summary:
+            payload["result"] = _format_sql_response_local(sql_to_execute, raw_result, summary=summary)
+        else:
+            payload["result"] = await _refine_with_grok(sql_to_execute, raw_result, columns, rows)
+    if cache_version is not None:
+        result_cache.put((_result_cache_key(sql_to_execute), result_format), cache_version, payload)
+    return {
+        "query": user_query,
+        "executed_sql": sql_to_execute,
+        "sql_source": sql_source,
+        **payload,
+        "query_class": query_class,
+        "cached": False,
+    }
+
+
+def _single_flight_key(user_query: str, result_format: str):
+    collapsed = " ".join(user_query.split())
+    # SQL literals are case-sensitive; natural-language prompts are not.
+    return (collapsed if _is_sql_query(collapsed) else collapsed.lower(), result_format)
+
+
+async def _coalesced_pipeline(user_query: str, result_format: str) -> dict:
+    """Identical concurrent requests share one pipeline run: one LLM translation, one execution, one refinement."""
+    if not SINGLE_FLIGHT_ENABLED or (_is_sql_query(user_query) and not _is_read_only_sql(user_query)):
+        return await _run_query_pipeline(user_query, result_format)
+
+    async def run() -> dict:
+        # The shared run outlives whichever request started it, so it gets its own cancel token.
+        _cancel_token.set(CancelToken())
+        return await _run_query_pipeline(user_query, result_format)
+
+    response, shared = await query_flights.do(_single_flight_key(user_query, result_format), run)
+    if not shared:
+        return response
+    return {**response, "query": user_query, "coalesced": True}
+
+
+def _wants_msgpack(http_request: Request) -> bool:
+    return msgpack is not None and "application/msgpack" in http_request.headers.get("accept", "")
+
+
+async def _watch_disconnect(http_request: Request, token: CancelToken, pipeline: asyncio.Future) -> None:
+    while not pipeline.done():
+        if await http_request.is_disconnected():
+            token.cancel("client_disconnected")
+            pipeline.cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+@app.post("/query")
+async def process_query(request: QueryRequest, http_request: Request):
+    user_query = request.query.strip()
+    if not user_query:
+        raise HTTPException(status_code=400, detail="Empty query")
+    result_format = request.format.strip().lower()
+    if result_format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(RESULT_FORMATS)}")
+
+    await _run_db(_get_db_pool)
+
+    token = CancelToken()
+    _cancel_token.set(token)
+    pipeline = asyncio.ensure_future(
+        asyncio.wait_for(_coalesced_pipeline(user_query, result_format), timeout=REQUEST_TIMEOUT_SECONDS)
+    )
+    watcher = asyncio.ensure_future(_watch_disconnect(http_request, token, pipeline))
+    try:
+        response = await pipeline
+        if _wants_msgpack(http_request):
+            return Response(content=msgpack.packb(response, use_bin_type=True), media_type="application/msgpack")
+        return response
+    except asyncio.CancelledError:
+        if token.reason != "client_disconnected":
+            raise
+        # Nobody is listening; 499 is nginx's "client closed request".
+        return Response(status_code=499)
+    except QueryTooExpensive as exc:
+        raise HTTPException(status_code=422, detail={**_too_expensive_detail(exc), "query": user_query})
+    except QueryCancelled as exc:
+        raise HTTPException(status_code=504, detail=str(exc))
+    except AdmissionRejected as exc:
+        raise HTTPException(status_code=503, detail=exc.to_dict(), headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
+    except PoolTimeout as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Processing timed out after {REQUEST_TIMEOUT_SECONDS:g} seconds.")
     except sqlite3.Error as exc:
         return {"query": user_query, "result": f"SQL error: {exc}"}
     except Exception as exc:
         return {"query": user_query, "result": f"Backend error: {exc}"}
+    finally:
+        watcher.cancel()
+        if not pipeline.done():
+            pipeline.cancel()
+
+
+def _sse_event(event: str, data: object) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _stream_sql_rows(sql_query: str, emit) -> None:
+    with _get_db_pool().connection() as conn:
+        started = time.perf_counter()
+        with _statement_budget().guard(conn):
+            cursor = conn.cursor()
+            cursor.execute(sql_query)
+            if not cursor.description:
+                emit("end", {"columns": None, "rows": 0})
+                return
+            columns = [col[0] for col in cursor.description]
+            emit("columns", columns)
+            fetched = 0
+            while fetched < MAX_ROWS:
+                batch = cursor.fetchmany(min(STREAM_BATCH_ROWS, MAX_ROWS - fetched))
+                if not batch:
+                    break
+                fetched += len(batch)
+                emit("rows", batch)
+        if workload_log is not None:
+            workload_log.record(conn, sql_query, time.perf_counter() - started, fetched)
+        emit("end", {"columns": columns, "rows": fetched})
+
+
+def _put_from_worker(loop, queue: asyncio.Queue, item) -> None:
+    """Waits (in the worker thread) for room in the request's bounded queue, or until the request is cancelled."""
+    token = _cancel_token.get()
+    future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+    while True:
+        try:
+            future.result(timeout=0.25)
+            return
+        except FutureTimeout:
+            if token is not None and token.cancelled:
+                future.cancel()
+                raise QueryCancelled(token.reason)
+
+
+async def _query_event_stream(user_query: str):
+    yield _sse_event("stage", {"stage": "resolving"})
+    resolved = await _resolve_sql(user_query)
+    if not resolved or "answer" in resolved:
+        yield _sse_event("stage", {"stage": "answering"})
+        response = await _general_answer_response(user_query, resolved.get("answer"))
+        yield _sse_event("answer", response)
+        yield _sse_event("done", {"source": response.get("source")})
+        return
+
+    sql_query = resolved["sql"]
+    yield _sse_event("sql", {"sql": sql_query, "sql_source": resolved["sql_source"]})
+
+    if resolved["execution"] is not None or not _is_read_only_sql(sql_query):
+        execution = resolved["execution"] or await _run_db(_execute_sql, sql_query)
+        columns, rows = execution["columns"], execution["rows"]
+        if columns is None:
+            yield _sse_event("done", {"affected": execution["affected"]})
+            return
+        yield _sse_event("columns", {"columns": columns})
+        yield _sse_event("rows", {"rows": [[row[col] for col in columns] for row in rows]})
+    else:
+        yield _sse_event("stage", {"stage": "queued"})
+        loop = asyncio.get_running_loop()
+        # Bounded: a client reading slower than the cursor stalls the worker instead of buffering every row.
+        # The slot is held until the last batch is handed over, for at most SQL_TIMEOUT_SECONDS (_run_db's
+        # deadline then cancels the statement); the summary is produced after the slot is released.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_BATCHES)
+        columns, rows = None, []
+        try:
+            async with _admitted(sql_query) as classification:
+                yield _sse_event("stage", {
+                    "stage": "executing",
+                    "query_class": classification["class"] if classification else None,
+                })
+                producer = asyncio.ensure_future(_run_db(
+                    _stream_sql_rows, sql_query, lambda kind, payload: _put_from_worker(loop, queue, (kind, payload))
+                ))
+                try:
+                    while not (producer.done() and queue.empty()):
+                        if producer.done():
+                            kind, payload = queue.get_nowait()
+                        else:
+                            getter = asyncio.ensure_future(queue.get())
+                            await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+                            if not getter.done():
+                                getter.cancel()
+                                continue
+                            kind, payload = getter.result()
+                        if kind == "columns":
+                            columns = payload
+                            yield _sse_event("columns", {"columns": columns})
+                        elif kind == "rows":
+                            rows.extend(payload)
+                            yield _sse_event("rows", {"rows": [list(row) for row in payload]})
+                    await producer
+                finally:
+                    # The client went away mid-stream: _run_db cancels the statement and the worker stops waiting.
+                    producer.cancel()
+        except (sqlite3.Error, QueryTooExpensive):
+            await _forget_translation(user_query, resolved)
+            raise
+        await _remember_translation(user_query, resolved)
+        if columns is None:
+            yield _sse_event("done", {"affected": 0})
+            return
+
+    yield _sse_event("stage", {"stage": "summarizing", "rows": len(rows), "capped": len(rows) == MAX_ROWS})
+    if _template_summary(resolved):
+        yield _sse_event("summary", {"text": _template_summary(resolved)})
+    elif _resolve_llm_provider() is not None:
+        try:
+            async for token in _stream_grok(
+                _digest_summary_messages(sql_query, columns, rows),
+                temperature=0.2,
+                max_tokens=REFINE_MAX_TOKENS,
+            ):
+                yield _sse_event("summary", {"text": token})
+        except LLM_ERRORS:
+            yield _sse_event("summary", {"text": f"Query executed successfully. Rows returned: {len(rows)}."})
+    else:
+        yield _sse_event("summary", {"text": f"Query executed successfully. Rows returned: {len(rows)}."})
+    yield _sse_event("done", {"rows": len(rows), "sql_source": resolved["sql_source"]})
+
+
+def _too_expensive_detail(exc: QueryTooExpensive) -> dict:
+    return {
+        **exc.to_dict(),
+        "hint": "Narrow the query with filters (PLATFORM_NUMBER, CYCLE_NUMBER, JULD_EPOCH ranges) or aggregate "
+        "over a smaller window, then retry.",
+    }
+
+
+async def _guarded_event_stream(user_query: str):
+    token = CancelToken()
+    _cancel_token.set(token)
+    calls = [0]
+    _llm_calls.set(calls)
+    try:
+        async for event in _query_event_stream(user_query):
+            yield event
+        intent_router.record_llm_usage(calls[0])
+    except QueryTooExpensive as exc:
+        yield _sse_event("error", {"status": 422, **_too_expensive_detail(exc)})
+    except QueryCancelled as exc:
+        yield _sse_event("error", {"status": 504, "message": str(exc)})
+    except AdmissionRejected as exc:
+        yield _sse_event("error", {"status": 503, **exc.to_dict()})
+    except HTTPException as exc:
+        yield _sse_event("error", {"status": exc.status_code, "message": exc.detail})
+    except PoolTimeout as exc:
+        yield _sse_event("error", {"status": 503, "message": str(exc)})
+    except TimeoutError:
+        yield _sse_event("error", {"status": 504, "message": "Processing timed out."})
+    except sqlite3.Error as exc:
+        yield _sse_event("error", {"message": f"SQL error: {exc}"})
+    finally:
+        # Starlette closes the generator when the client disconnects; stop any statement still running.
+        token.cancel("client_disconnected")
+
+
+@app.post("/query/stream")
+async def process_query_stream(request: QueryRequest):
+    user_query = request.query.strip()
+    if not user_query:
+        raise HTTPException(status_code=400, detail="Empty query")
+
+    await _run_db(_get_db_pool)
+    return StreamingResponse(
+        _guarded_event_stream(user_query),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _derived_profiles(keys: List[tuple], include_levels: bool) -> List[dict]:
+    """Derived quantities per profile; cached profiles are reused and the rest load in one query."""
+    version = _tables_cache_version([PROFILE_TABLE])
+    results, missing = {}, []
+    for key in keys:
+        cached = result_cache.get(("profile_derived", key, include_levels), version)
+        if cached is None:
+            missing.append(key)
+        else:
+            results[key] = cached
+    if missing:
+        with _get_db_pool().connection() as conn:
+            with _statement_budget().guard(conn):
+                batch = load_profiles(conn, missing)
+        for key, derived in derive(batch, include_levels=include_levels).items():
+            result_cache.put(("profile_derived", key, include_levels), version, derived)
+            results[key] = derived
+    return [results[key] for key in keys if key in results]
+
+
+@app.get("/profiles/{platform_number}/{cycle_number}/derived")
+async def profile_derived(platform_number: int, cycle_number: int, include_levels: bool = True):
+    try:
+        found = await _run_db(_derived_profiles, [(platform_number, cycle_number)], include_levels)
+    except QueryTooExpensive as exc:
+        raise HTTPException(status_code=422, detail=_too_expensive_detail(exc))
+    if not found:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No profile for platform {platform_number}, cycle {cycle_number}.",
+        )
+    return found[0]
+
+
+@app.post("/profiles/derived")
+async def profiles_derived(request: ProfileBatchRequest):
+    keys = list(dict.fromkeys((p.platform_number, p.cycle_number) for p in request.profiles))
+    if len(keys) > PROFILE_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {PROFILE_BATCH_MAX} profiles per request (got {len(keys)}).",
+        )
+    started = time.perf_counter()
+    try:
+        found = await _run_db(_derived_profiles, keys, request.include_levels)
+    except QueryTooExpensive as exc:
+        raise HTTPException(status_code=422, detail=_too_expensive_detail(exc))
+    returned = {(p["platform_number"], p["cycle_number"]) for p in found}
+    return {
+        "profiles": found,
+        "missing": [{"platform_number": p, "cycle_number": c} for p, c in keys if (p, c) not in returned],
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+def _ensure_trajectory_index() -> None:
+    with _get_db_pool().connection() as conn:
+        snapshot = _get_schema_snapshot(conn)
+        traj_cols = snapshot.column_names("traj_rel")
+        lat_col = _find_column_name(traj_cols, ["latitude", "lat"])
+        lon_col = _find_column_name(traj_cols, ["longitude", "lon", "long"])
+        id_col = _find_column_name(traj_cols, ["platform_number", "platform", "float_id"])
+        if not lat_col or not lon_col or not id_col:
+            raise HTTPException(status_code=404, detail="traj_rel has no platform/latitude/longitude columns.")
+        time_col = _find_column_name(traj_cols, ["juld_epoch"])
+        traj_version = read_versions(conn).get("traj_rel")
+        trajectory_index.ensure(conn, (snapshot.version, traj_version), lat_col, lon_col, id_col, time_col)
+
+
+def _simplified_trajectory(platform_number: int, zoom: int, max_points: int) -> dict:
+    version = _tables_cache_version(["traj_rel"])
+    key = ("trajectory", platform_number, zoom, max_points)
+    cached = result_cache.get(key, version)
+    if cached is None:
+        _ensure_trajectory_index()
+        cached = trajectory_index.trajectory(platform_number, zoom, max_points)
+        if cached is not None:
+            result_cache.put(key, version, cached)
+    return cached
+
+
+def _trajectory_tile(z: int, x: int, y: int) -> dict:
+    version = _tables_cache_version(["traj_rel"])
+    key = ("trajectory_tile", z, x, y)
+    cached = result_cache.get(key, version)
+    if cached is None:
+        _ensure_trajectory_index()
+        cached = trajectory_index.tile(z, x, y, TRAJECTORY_TILE_MAX_POINTS)
+        result_cache.put(key, version, cached)
+    return cached
+
+
+@app.get("/trajectories/tiles/{z}/{x}/{y}")
+async def trajectory_tile(z: int, x: int, y: int):
+    if not 0 <= z <= 22 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail=f"No tile {z}/{x}/{y}.")
+    return await _run_db(_trajectory_tile, z, x, y)
+
+
+@app.get("/trajectories/{platform_number}")
+async def trajectory(platform_number: int, zoom: int = 3, max_points: int = TRAJECTORY_MAX_POINTS):
+    if not 0 <= zoom <= 22:
+        raise HTTPException(status_code=400, detail="zoom must be between 0 and 22.")
+    max_points = max(2, min(max_points, TRAJECTORY_MAX_POINTS))
+    found = await _run_db(_simplified_trajectory, platform_number, zoom, max_points)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"No trajectory for platform {platform_number}.")
+    return found
+
+
+def _grid_cells(params: dict) -> dict:
+    version = _tables_cache_version([PROFILE_GRID_TABLE])
+    key = ("grid",) + tuple(sorted(params.items()))
+    cached = result_cache.get(key, version)
+    if cached is None:
+        with _get_db_pool().connection() as conn:
+            if _get_schema_snapshot(conn).table(PROFILE_GRID_TABLE) is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"{PROFILE_GRID_TABLE} has not been built; run ingest.py or POST /admin/derived/refresh.",
+                )
+            try:
+                cached = query_profile_grid(conn, max_cells=GRID_MAX_CELLS, **params)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+        result_cache.put(key, version, cached)
+    return cached
+
+
+def _parse_bbox(bbox: str):
+    try:
+        west, south, east, north = (float(part) for part in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north in degrees.")
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise HTTPException(status_code=400, detail="bbox is outside -180..180 / -90..90.")
+    return (west, south, east, north)
+
+
+@app.get("/grid")
+async def grid(
+    variable: str = "temp",
+    stat: str = "mean",
+    depth_band: int = 0,
+    resolution: float = GRID_CELL_DEGREES,
+    time_bucket: str = "month",
+    start: str = None,
+    end: str = None,
+    bbox: str = None,
+):
+    started = time.perf_counter()
+    params = {
+        "variable": variable.strip().lower(),
+        "stat": stat.strip().lower(),
+        "depth_band": depth_band,
+        "resolution": resolution,
+        "time_bucket": time_bucket.strip().lower(),
+        "start": start,
+        "end": end,
+        "bbox": _parse_bbox(bbox) if bbox else None,
+    }
+    result = await _run_db(_grid_cells, params)
+    return {**result, "seconds": round(time.perf_counter() - started, 4)}
+
+
+@app.get("/grid/bands")
+async def grid_bands():
+    return {
+        "cell_degrees": GRID_CELL_DEGREES,
+        "depth_bands": [{"index": i, "min_pres": low, "max_pres": high} for i, (low, high) in enumerate(DEPTH_BANDS)],
+    }
+
+
+def _refresh_derived_tables() -> dict:
+    with _get_db_pool().writer() as conn:
+        profiles = refresh_profile_summary(conn)
+        cells = refresh_profile_grid(conn)
+        bump_versions(conn, {PROFILE_SUMMARY_TABLE: profiles, PROFILE_GRID_TABLE: cells})
+    return {PROFILE_SUMMARY_TABLE: profiles, PROFILE_GRID_TABLE: cells}
+
+
+@app.post("/admin/derived/refresh")
+async def refresh_derived_tables():
+    started = time.perf_counter()
+    refreshed = await _run_db(_refresh_derived_tables, timeout=None)
+    return {"refreshed": refreshed, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def _require_workload_log() -> WorkloadLog:
+    if workload_log is None:
+        raise HTTPException(status_code=404, detail="Index advisor is disabled (INDEX_ADVISOR_ENABLED=0).")
+    return workload_log
+
+
+@app.get("/admin/queries/slow")
+async def slow_queries(limit: int = 20, order_by: str = "total_seconds"):
+    return {"queries": _require_workload_log().top(limit=limit, order_by=order_by)}
+
+
+@app.get("/admin/indexes/recommendations")
+async def index_recommendations(limit: int = 10, min_total_seconds: float = 0.0):
+    log = _require_workload_log()
+    snapshot = await _run_db(_load_schema_snapshot)
+    return {"recommendations": log.recommend(snapshot, min_total_seconds=min_total_seconds, limit=limit)}
+
+
+def _apply_recommended_indexes(names: List[str], limit: int) -> List[str]:
+    log = _require_workload_log()
+    recommendations = log.recommend(_load_schema_snapshot(), limit=INDEX_ADVISOR_MAX_FINGERPRINTS)
+    if names:
+        recommendations = [r for r in recommendations if r["name"] in names]
+    else:
+        recommendations = recommendations[:limit]
+    with _get_db_pool().writer() as conn:
+        return apply_indexes(conn, recommendations)
+
+
+@app.post("/admin/indexes/apply")
+async def apply_index_recommendations(request: IndexApplyRequest):
+    started = time.perf_counter()
+    created = await _run_db(_apply_recommended_indexes, request.names, request.limit, timeout=None)
+    return {"created": created, "seconds": round(time.perf_counter() - started, 3)}
+
+
+@app.get("/admin/admission")
+async def admission_stats():
+    return {"enabled": ADMISSION_ENABLED, "classes": admission.stats(), "estimator": cost_estimator.stats()}
+
+
+def _require_semantic_cache() -> SemanticCache:
+    if semantic_cache is None:
+        raise HTTPException(status_code=404, detail="Semantic cache is disabled (SEMANTIC_CACHE_ENABLED=0).")
+    return semantic_cache
+
+
+@app.get("/admin/semantic-cache/audit")
+async def semantic_cache_audit(limit: int = 50, verdict: str = None):
+    cache = _require_semantic_cache()
+    return {"stats": cache.stats(), "hits": cache.audit_log(limit=limit, verdict=verdict)}
+
+
+@app.post("/admin/semantic-cache/audit/{audit_id}")
+async def semantic_cache_verdict(audit_id: int, request: SemanticVerdictRequest):
+    if not _require_semantic_cache().record_verdict(audit_id, request.correct):
+        raise HTTPException(status_code=404, detail=f"No unverified semantic cache hit with id {audit_id}.")
+    return semantic_cache.stats()
+
+
+@app.get("/schema")
+async def schema():
+    snapshot = await _run_db(_load_schema_snapshot)
+    return snapshot.describe()
 
 
 @app.get("/health")
 async def health():
-    active_provider = "none"
-    if LLM_PROVIDER == "auto":
-        if GROQ_API_KEY:
-            active_provider = "groq"
-        elif GROK_API_KEY:
-            active_provider = "grok"
-    elif LLM_PROVIDER in ("groq", "grok"):
-        active_provider = LLM_PROVIDER
+    providers = _configured_llm_providers()
+    active_provider = providers[0] if providers else None
 
     return {
         "status": "ok",
         "db_exists": os.path.exists(ARGO_DB_PATH),
+        "db_pool": db_pool.stats() if db_pool is not None else None,
+        "schema_catalog": {
+            "version": list(schema_catalog.snapshot.version) if schema_catalog.snapshot else None,
+            "rebuilds": schema_catalog.rebuilds,
+        },
+        "spatial_index": {"floats": float_position_index.size, "rebuilds": float_position_index.rebuilds},
+        "trajectory_index": trajectory_index.stats(),
+        "translation_cache": translation_cache.stats() if translation_cache is not None else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "schema_selector": {"enabled": SCHEMA_PRUNING_ENABLED, **schema_selector.stats()},
+        "result_cache": result_cache.stats(),
+        "table_versions": _table_versions_state["versions"],
+        "index_advisor": workload_log.stats() if workload_log is not None else None,
+        "admission": admission.stats() if ADMISSION_ENABLED else None,
+        "single_flight": query_flights.stats() if SINGLE_FLIGHT_ENABLED else None,
+        "intent_router": {"mode": ROUTER_MODE, **intent_router.stats()},
+        "nl_templates": {"enabled": NL_TEMPLATES_ENABLED, **nl_templates.stats()},
+        "msgpack_available": msgpack is not None,
         "llm_configured": bool(GROQ_API_KEY or GROK_API_KEY),
-        "llm_provider": active_provider,
-        "llm_model": GROQ_MODEL if active_provider == "groq" else GROK_MODEL,
+        "llm_provider": active_provider.name if active_provider else "none",
+        "llm_model": active_provider.model if active_provider else None,
+        "llm_providers": llm_providers.stats() if llm_providers is not None else None,
     }
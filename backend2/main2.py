@@ -1,6 +1,5 @@
 import os
 import asyncio
-from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor
 from typing import Dict
 
@@ -12,6 +11,8 @@ from crewai import LLM, Agent, Task, Crew, Process
 from crewai_tools import MCPServerAdapter
 from mcp import StdioServerParameters  # For stdio-based MCP servers
 
+from result_cache import ResultCache, file_version
+
 app = FastAPI(title="Oceanographic Data Assistant API (persistent MCP)")
 
 class QueryRequest(BaseModel):
@@ -33,17 +34,14 @@ MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", "4"))
 MCP_CONNECT_TIMEOUT = int(os.environ.get("MCP_CONNECT_TIMEOUT", "20"))
 REQUEST_TIMEOUT_SECONDS = int(os.environ.get("REQUEST_TIMEOUT_SECONDS", "180"))
 THREAD_POOL_WORKERS = int(os.environ.get("THREAD_POOL_WORKERS", "4"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", "600"))
 
 # Reusable LLM instance (keep)
 llm = LLM(model="gemini/gemini-2.5-flash", temperature=0.7)
 
-# Optional: simple in-memory LRU cache for identical queries (speeds repeated queries)
-# You can tune cache size depending on memory.
-@lru_cache(maxsize=256)
-def _cached_result_for_query(query_text: str):
-    # NOTE: This wrapper will not be used to call the crew directly (since kickoff is async)
-    # But we keep this so the request handler can use it to short-circuit repeated queries.
-    return None  # placeholder — we'll call crew normally, then set cache manually below.
+# Bounded result cache: byte budget + LRU + TTL, dropped whenever the DB file changes.
+result_cache = ResultCache(max_bytes=RESULT_CACHE_MAX_BYTES, ttl_seconds=RESULT_CACHE_TTL_SECONDS)
 
 @app.on_event("startup")
 async def startup_event():
@@ -184,14 +182,12 @@ async def process_query(request: QueryRequest):
     if not user_query:
         raise HTTPException(status_code=400, detail="Empty query")
 
-    # Optional: quick LRU cache check (simple exact-text cache)
-    # We keep a small manual cache mapping query -> result
-    # (You can replace this with cachetools.TTLCache if you want TTL)
+    # Exact-text cache check; entries are invalidated when the DB file (or its WAL) changes
     cache_key = f"q:{user_query}"
-    # if cached, return quickly (very simple - you may persist this)
-    # NOTE: _cached_store is a simple global dict stored in-memory
-    if hasattr(process_query, "_cached_store") and cache_key in process_query._cached_store:
-        return {"query": user_query, "result": process_query._cached_store[cache_key], "cached": True}
+    cache_version = file_version(ARGO_DB_PATH)
+    cached = result_cache.get(cache_key, cache_version)
+    if cached is not None:
+        return {"query": user_query, "result": cached, "cached": True}
 
     # Acquire semaphore to limit simultaneous use of MCP/Crew
     async with mcp_lock:
@@ -208,15 +204,17 @@ async def process_query(request: QueryRequest):
             except asyncio.TimeoutError:
                 raise HTTPException(status_code=504, detail=f"Processing timed out after {REQUEST_TIMEOUT_SECONDS} seconds.")
 
-            # Save in simple cache
-            if not hasattr(process_query, "_cached_store"):
-                process_query._cached_store = {}
-            # Keep small cache size
-            if len(process_query._cached_store) > 512:
-                # naive eviction: clear (replace with LRU cache impl if desired)
-                process_query._cached_store.clear()
-            process_query._cached_store[cache_key] = result
+            # Crew output objects are returned and cached as their text form, so hits and misses look the same
+            result_text = str(result)
+            result_cache.put(cache_key, cache_version, result_text)
 
-            return {"query": user_query, "result": result, "cached": False}
+            return {"query": user_query, "result": result_text, "cached": False}
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Processing failed: {e}")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
@@ -0,0 +1,431 @@
+import calendar
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+# (south, north, west, east) in degrees; longer names are matched first so "bay of bengal" beats "bengal".
+REGIONS: Dict[str, Tuple[float, float, float, float]] = {
+    "equatorial indian ocean": (-5.0, 5.0, 40.0, 100.0),
+    "southern indian ocean": (-60.0, -30.0, 20.0, 120.0),
+    "north indian ocean": (0.0, 30.0, 40.0, 100.0),
+    "indian ocean": (-60.0, 30.0, 20.0, 120.0),
+    "arabian sea": (0.0, 25.0, 50.0, 78.0),
+    "bay of bengal": (5.0, 23.0, 78.0, 100.0),
+    "andaman sea": (5.0, 20.0, 92.0, 100.0),
+    "laccadive sea": (5.0, 15.0, 70.0, 78.0),
+    "red sea": (12.0, 30.0, 32.0, 44.0),
+    "persian gulf": (23.0, 31.0, 47.0, 57.0),
+    "gulf of aden": (10.0, 16.0, 43.0, 52.0),
+    "mozambique channel": (-26.0, -10.0, 34.0, 45.0),
+    "southern ocean": (-90.0, -50.0, -180.0, 180.0),
+}
+
+VARIABLES = {"TEMP": "temperature", "PSAL": "salinity", "PRES": "pressure"}
+_VARIABLE_RE = [
+    ("TEMP", re.compile(r"\b(?:temp(?:erature)?s?|warm(?:est)?|cold(?:est)?)\b", re.IGNORECASE)),
+    ("PSAL", re.compile(r"\b(?:salinity|psal|salt(?:y|iness)?)\b", re.IGNORECASE)),
+    ("PRES", re.compile(r"\b(?:pres(?:sure)?|depths?|deepest)\b", re.IGNORECASE)),
+]
+_STAT_RE = [
+    ("AVG", re.compile(r"\b(?:average|avg|mean|typical)\b", re.IGNORECASE)),
+    ("MAX", re.compile(r"\b(?:max(?:imum)?|highest|warmest|saltiest|deepest|peak)\b", re.IGNORECASE)),
+    ("MIN", re.compile(r"\b(?:min(?:imum)?|lowest|coldest|freshest|shallowest)\b", re.IGNORECASE)),
+]
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+
+_FLOAT_RE = re.compile(r"\b(?:float|platform|wmo)\s*(?:id|number|no\.?|#)?\s*(\d{5,8})\b|\b(\d{7})\b", re.IGNORECASE)
+_CYCLE_RE = re.compile(r"\bcycle\s*(?:number|no\.?|#)?\s*(\d{1,4})\b", re.IGNORECASE)
+_ISO_DATE = r"(\d{4}-\d{2}(?:-\d{2})?)"
+_DATE_RANGE_RE = re.compile(rf"\b(?:between|from)\s+{_ISO_DATE}\s+(?:and|to|until)\s+{_ISO_DATE}", re.IGNORECASE)
+_SINCE_RE = re.compile(rf"\b(?:since|after)\s+{_ISO_DATE}", re.IGNORECASE)
+_MONTH_YEAR_RE = re.compile(r"\b([a-z]{3,9})\.?\s+(\d{4})\b", re.IGNORECASE)
+_YEAR_RE = re.compile(r"\b(?:in|during)\s+((?:19|20)\d{2})\b", re.IGNORECASE)
+_RELATIVE_RE = re.compile(r"\b(last|past|this)\s+(?:(\d+)\s+)?(day|week|month|year)s?\b", re.IGNORECASE)
+_UNIT = r"\s*(?:m|meters?|metres?|dbar|db|decibars?)\b"
+_DEPTH_BETWEEN_RE = re.compile(rf"\bbetween\s+(\d+(?:\.\d+)?)\s*(?:and|-)\s*(\d+(?:\.\d+)?){_UNIT}", re.IGNORECASE)
+_DEPTH_BELOW_RE = re.compile(rf"\b(?:below|deeper than|under)\s+(\d+(?:\.\d+)?){_UNIT}", re.IGNORECASE)
+_DEPTH_ABOVE_RE = re.compile(rf"\b(?:above|shallower than|upper|top|first)\s+(\d+(?:\.\d+)?){_UNIT}", re.IGNORECASE)
+_SURFACE_RE = re.compile(r"\b(?:surface|sea surface|sst|sss)\b", re.IGNORECASE)
+_COUNT_RE = re.compile(r"\bhow many\b|\bnumber of\b|\bcount\b", re.IGNORECASE)
+# Negation, grouping, ranking, comparison and threshold words no template models. A prompt that still
+# has one after the slots and the template's keywords are taken out goes to the model instead.
+_MODIFIER_RE = re.compile(
+    r"\b(?:not|except|excluding|without|outside|per|each|every|by|grouped|which|who|whose|"
+    r"compare[ds]?|comparing|comparison|versus|vs|than|above|below|over|under|greater|exceed(?:s|ing)?)\b"
+    r"|[<>]=?|!=",
+    re.IGNORECASE,
+)
+# Phrases the slot extractors consume, so "below 500 m" or "between 2023-01 and 2023-03" are not modifiers.
+_CONSUMED_RES = (_DATE_RANGE_RE, _SINCE_RE, _DEPTH_BETWEEN_RE, _DEPTH_BELOW_RE, _DEPTH_ABOVE_RE)
+
+# The shallowest band counted as "surface", in dbar.
+SURFACE_PRES = 10.0
+# "past N days/weeks/months/years" beyond this is left to the model.
+MAX_RELATIVE_COUNT = 1000
+
+
+def _parse_iso(text: str, end: bool = False) -> date:
+    parts = [int(p) for p in text.split("-")]
+    if len(parts) == 2:
+        first = date(parts[0], parts[1], 1)
+        return _add_months(first, 1) if end else first
+    day = date(*parts)
+    return day + timedelta(days=1) if end else day
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def extract_date_range(text: str, today: date) -> Optional[Tuple[date, date]]:
+    """[start, end) from explicit ISO ranges, "March 2023", "in 2022", "since ...", "last month", "past 30 days"."""
+    try:
+        return _date_range(text, today)
+    except (ValueError, OverflowError):
+        # "2023-02-30", "since 2023-13": no date slot, so the prompt falls through to the model.
+        return None
+
+
+def _date_range(text: str, today: date) -> Optional[Tuple[date, date]]:
+    match = _DATE_RANGE_RE.search(text)
+    if match:
+        return _parse_iso(match.group(1)), _parse_iso(match.group(2), end=True)
+    match = _SINCE_RE.search(text)
+    if match:
+        return _parse_iso(match.group(1)), today + timedelta(days=1)
+    for match in _MONTH_YEAR_RE.finditer(text):
+        month = _MONTHS.get(match.group(1).lower())
+        if month:
+            first = date(int(match.group(2)), month, 1)
+            return first, _add_months(first, 1)
+    match = _YEAR_RE.search(text)
+    if match:
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    match = _RELATIVE_RE.search(text)
+    if match:
+        which, count, unit = match.group(1).lower(), int(match.group(2) or 1), match.group(3).lower()
+        if count > MAX_RELATIVE_COUNT:
+            return None
+        tomorrow = today + timedelta(days=1)
+        if unit in ("day", "week"):
+            days = count * (7 if unit == "week" else 1)
+            return tomorrow - timedelta(days=days), tomorrow
+        if unit == "month":
+            this_month = date(today.year, today.month, 1)
+            if which == "this":
+                return this_month, tomorrow
+            if which == "last" and count == 1:
+                return _add_months(this_month, -1), this_month
+            return _add_months(this_month, -count), tomorrow
+        if which == "this":
+            return date(today.year, 1, 1), tomorrow
+        if which == "last" and count == 1:
+            return date(today.year - 1, 1, 1), date(today.year, 1, 1)
+        return date(today.year - count, today.month, 1), tomorrow
+    return None
+
+
+def extract_depth_range(text: str) -> Optional[Tuple[float, Optional[float]]]:
+    """(min, max) pressure in dbar (1 dbar ~ 1 m); max is None for "below X"."""
+    match = _DEPTH_BETWEEN_RE.search(text)
+    if match:
+        low, high = sorted((float(match.group(1)), float(match.group(2))))
+        return low, high
+    match = _DEPTH_BELOW_RE.search(text)
+    if match:
+        return float(match.group(1)), None
+    match = _DEPTH_ABOVE_RE.search(text)
+    if match:
+        return 0.0, float(match.group(1))
+    if _SURFACE_RE.search(text):
+        return 0.0, SURFACE_PRES
+    return None
+
+
+def extract_slots(text: str, today: Optional[date] = None) -> Dict[str, object]:
+    slots: Dict[str, object] = {}
+    match = _FLOAT_RE.search(text)
+    if match:
+        slots["float_id"] = int(match.group(1) or match.group(2))
+    match = _CYCLE_RE.search(text)
+    if match:
+        slots["cycle"] = int(match.group(1))
+    found = sorted((m.start(), code) for code, pattern in _VARIABLE_RE for m in [pattern.search(text)] if m)
+    if found:
+        slots["variables"] = list(dict.fromkeys(code for _, code in found))
+    for code, pattern in _STAT_RE:
+        if pattern.search(text):
+            slots["stat"] = code
+            break
+    lowered = text.lower()
+    for name in sorted(REGIONS, key=len, reverse=True):
+        if name in lowered:
+            slots["region"] = name
+            break
+    dates = extract_date_range(text, today or date.today())
+    if dates:
+        slots["date_range"] = dates
+    depths = extract_depth_range(text)
+    if depths:
+        slots["depth_range"] = depths
+    return slots
+
+
+def _unconsumed(text: str, keywords: Optional[re.Pattern] = None) -> str:
+    for pattern in _CONSUMED_RES + ((keywords,) if keywords is not None else ()):
+        text = pattern.sub(" ", text)
+    return text
+
+
+def _value(column: str) -> str:
+    # Delayed-mode adjusted values where the float has them, raw values otherwise.
+    return f"COALESCE({column}_ADJUSTED, {column})"
+
+
+@dataclass
+class TemplateContext:
+    """What a template may consult: the prompt, its slots, the schema snapshot and an open connection."""
+
+    prompt: str
+    slots: Dict[str, object]
+    snapshot: object
+    conn: object = None
+
+    def has_column(self, table: str, column: str) -> bool:
+        info = self.snapshot.table(table) if self.snapshot is not None else None
+        return bool(info and info.column(column))
+
+    def time_filter(self, table: str) -> List[str]:
+        if "date_range" not in self.slots:
+            return []
+        start, end = self.slots["date_range"]
+        if self.has_column(table, "JULD_EPOCH"):
+            return [
+                f"JULD_EPOCH >= CAST(strftime('%s', '{start.isoformat()}') AS REAL)",
+                f"JULD_EPOCH < CAST(strftime('%s', '{end.isoformat()}') AS REAL)",
+            ]
+        return [f"JULD >= '{start.isoformat()}'", f"JULD < '{end.isoformat()}'"]
+
+    def depth_filter(self) -> List[str]:
+        if "depth_range" not in self.slots:
+            return []
+        low, high = self.slots["depth_range"]
+        if high is None:
+            return [f"{_value('PRES')} >= {low:g}"]
+        return [f"{_value('PRES')} BETWEEN {low:g} AND {high:g}"]
+
+    def region_filter(self) -> List[str]:
+        if "region" not in self.slots:
+            return []
+        south, north, west, east = REGIONS[self.slots["region"]]
+        return [f"LATITUDE BETWEEN {south:g} AND {north:g}", f"LONGITUDE BETWEEN {west:g} AND {east:g}"]
+
+    def describe_scope(self) -> str:
+        parts = []
+        if "region" in self.slots:
+            name = " ".join(w if w == "of" else w.capitalize() for w in self.slots["region"].split())
+            parts.append(f"in the {name}")
+        if "date_range" in self.slots:
+            start, end = self.slots["date_range"]
+            parts.append(f"from {start.isoformat()} to {(end - timedelta(days=1)).isoformat()}")
+        if "depth_range" in self.slots:
+            low, high = self.slots["depth_range"]
+            parts.append(f"at {low:g}-{high:g} dbar" if high is not None else f"below {low:g} dbar")
+        return " ".join(parts)
+
+
+# A template returns {"sql": ..., "summary": ...} or a finished {"executed_sql": ..., "execution": ...}.
+TemplateResult = Optional[Dict[str, object]]
+
+
+@dataclass
+class Template:
+    name: str
+    keywords: Optional[re.Pattern]
+    required: Tuple[str, ...]
+    build: Callable[[TemplateContext], TemplateResult]
+    priority: int = 0
+    hits: int = field(default=0, compare=False)
+
+
+class TemplateRegistry:
+    """Parametric NL-to-SQL templates tried in priority order before any model is called."""
+
+    def __init__(self):
+        self._templates: List[Template] = []
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.matched = 0
+
+    def register(
+        self,
+        name: str,
+        build: Callable[[TemplateContext], TemplateResult],
+        keywords: str = "",
+        required: Tuple[str, ...] = (),
+        priority: int = 0,
+    ) -> Template:
+        template = Template(name, re.compile(keywords, re.IGNORECASE) if keywords else None, required, build, priority)
+        with self._lock:
+            self._templates = sorted(
+                [t for t in self._templates if t.name != name] + [template], key=lambda t: -t.priority
+            )
+        return template
+
+    def template(self, name: str, keywords: str = "", required: Tuple[str, ...] = (), priority: int = 0):
+        def decorator(build):
+            self.register(name, build, keywords, required, priority)
+            return build
+        return decorator
+
+    def match(self, prompt: str, snapshot, conn=None, today: Optional[date] = None) -> TemplateResult:
+        context = TemplateContext(prompt, extract_slots(prompt, today), snapshot, conn)
+        self.requests += 1
+        for template in self._templates:
+            if any(slot not in context.slots for slot in template.required):
+                continue
+            if template.keywords is not None and not template.keywords.search(prompt):
+                continue
+            if _MODIFIER_RE.search(_unconsumed(prompt, template.keywords)):
+                continue
+            result = template.build(context)
+            if result:
+                template.hits += 1
+                self.matched += 1
+                return {"template": template.name, "slots": _printable(context.slots), **result}
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "requests": self.requests,
+            "matched": self.matched,
+            "match_rate": round(self.matched / self.requests, 4) if self.requests else 0.0,
+            "templates": {t.name: t.hits for t in self._templates},
+        }
+
+
+def _printable(slots: Dict[str, object]) -> Dict[str, object]:
+    out = dict(slots)
+    if "date_range" in out:
+        out["date_range"] = [d.isoformat() for d in out["date_range"]]
+    return out
+
+
+def _where(conditions: List[str]) -> str:
+    return " AND ".join(conditions)
+
+
+def _profile_columns(slots: Dict[str, object]) -> str:
+    wanted = [v for v in slots.get("variables", []) if v != "PRES"] or ["TEMP", "PSAL"]
+    return ", ".join([f"{_value('PRES')} AS PRES"] + [f"{_value(v)} AS {v}" for v in wanted])
+
+
+def profile_of_cycle(ctx: TemplateContext) -> TemplateResult:
+    if _COUNT_RE.search(ctx.prompt) or "stat" in ctx.slots or "date_range" in ctx.slots:
+        return None
+    float_id, cycle = ctx.slots["float_id"], ctx.slots["cycle"]
+    conditions = [f"PLATFORM_NUMBER = {float_id}", f"CYCLE_NUMBER = {cycle}"] + ctx.depth_filter()
+    sql = (
+        f"SELECT PLATFORM_NUMBER, CYCLE_NUMBER, JULD, {_profile_columns(ctx.slots)} "
+        f"FROM prof_rel WHERE {_where(conditions)} ORDER BY PRES"
+    )
+    return {"sql": sql, "summary": f"Profile of float {float_id}, cycle {cycle} {ctx.describe_scope()}".strip() + "."}
+
+
+def latest_profile(ctx: TemplateContext) -> TemplateResult:
+    if _COUNT_RE.search(ctx.prompt) or "stat" in ctx.slots or "date_range" in ctx.slots:
+        return None
+    float_id = ctx.slots["float_id"]
+    conditions = [
+        f"PLATFORM_NUMBER = {float_id}",
+        f"CYCLE_NUMBER = (SELECT MAX(CYCLE_NUMBER) FROM prof_rel WHERE PLATFORM_NUMBER = {float_id})",
+    ] + ctx.depth_filter()
+    sql = (
+        f"SELECT PLATFORM_NUMBER, CYCLE_NUMBER, JULD, {_profile_columns(ctx.slots)} "
+        f"FROM prof_rel WHERE {_where(conditions)} ORDER BY PRES"
+    )
+    return {"sql": sql, "summary": f"Most recent profile of float {float_id}."}
+
+
+def trajectory(ctx: TemplateContext) -> TemplateResult:
+    float_id = ctx.slots["float_id"]
+    conditions = [f"PLATFORM_NUMBER = {float_id}"] + ctx.time_filter("traj_rel")
+    order = "JULD_EPOCH" if ctx.has_column("traj_rel", "JULD_EPOCH") else "JULD"
+    sql = (
+        f"SELECT PLATFORM_NUMBER, CYCLE_NUMBER, JULD, LATITUDE, LONGITUDE FROM traj_rel "
+        f"WHERE {_where(conditions)} AND LATITUDE IS NOT NULL ORDER BY {order}"
+    )
+    return {"sql": sql, "summary": f"Trajectory of float {float_id} {ctx.describe_scope()}".strip() + "."}
+
+
+def variable_statistic(ctx: TemplateContext) -> TemplateResult:
+    if "region" not in ctx.slots and "float_id" not in ctx.slots:
+        return None
+    variable = ctx.slots["variables"][0]
+    stat = ctx.slots.get("stat", "AVG")
+    conditions = []
+    if "float_id" in ctx.slots:
+        conditions.append(f"PLATFORM_NUMBER = {ctx.slots['float_id']}")
+    if "cycle" in ctx.slots:
+        conditions.append(f"CYCLE_NUMBER = {ctx.slots['cycle']}")
+    conditions += ctx.region_filter() + ctx.time_filter("prof_rel") + ctx.depth_filter()
+    conditions.append(f"{_value(variable)} IS NOT NULL")
+    label = {"AVG": "MEAN", "MAX": "MAX", "MIN": "MIN"}[stat]
+    sql = (
+        f"SELECT ROUND({stat}({_value(variable)}), 4) AS {label}_{variable}, COUNT(*) AS N_MEASUREMENTS, "
+        f"COUNT(DISTINCT PLATFORM_NUMBER) AS N_FLOATS FROM prof_rel WHERE {_where(conditions)}"
+    )
+    scope = f"for float {ctx.slots['float_id']} " if "float_id" in ctx.slots else ""
+    if "cycle" in ctx.slots:
+        scope += f"cycle {ctx.slots['cycle']} "
+    summary = f"{label.title()} {VARIABLES[variable]} {scope}{ctx.describe_scope()}".strip() + "."
+    return {"sql": sql, "summary": summary}
+
+
+def floats_in_region(ctx: TemplateContext) -> TemplateResult:
+    if "variables" in ctx.slots or "stat" in ctx.slots:
+        # "floats ... with temperature above 30", "float with the highest salinity": not a plain listing.
+        return None
+    conditions = ctx.region_filter() + ctx.time_filter("traj_rel")
+    if _COUNT_RE.search(ctx.prompt):
+        sql = f"SELECT COUNT(DISTINCT PLATFORM_NUMBER) AS N_FLOATS FROM traj_rel WHERE {_where(conditions)}"
+        return {"sql": sql, "summary": f"Number of floats {ctx.describe_scope()}."}
+    sql = (
+        "SELECT PLATFORM_NUMBER, COUNT(*) AS N_POSITIONS, MIN(JULD) AS FIRST_SEEN, MAX(JULD) AS LAST_SEEN, "
+        "ROUND(AVG(LATITUDE), 3) AS MEAN_LATITUDE, ROUND(AVG(LONGITUDE), 3) AS MEAN_LONGITUDE "
+        f"FROM traj_rel WHERE {_where(conditions)} GROUP BY PLATFORM_NUMBER ORDER BY LAST_SEEN DESC"
+    )
+    return {"sql": sql, "summary": f"Floats observed {ctx.describe_scope()}."}
+
+
+def default_registry() -> TemplateRegistry:
+    registry = TemplateRegistry()
+    registry.register(
+        "trajectory", trajectory,
+        keywords=r"\b(?:trajector(?:y|ies)|track|path|route|drift(?:ed)?|positions?|where (?:has|did|is))\b",
+        required=("float_id",), priority=40,
+    )
+    registry.register(
+        "profile_of_cycle", profile_of_cycle,
+        required=("float_id", "cycle"), priority=30,
+    )
+    registry.register(
+        "variable_statistic", variable_statistic,
+        required=("variables", "stat"), priority=20,
+    )
+    registry.register(
+        "latest_profile", latest_profile,
+        keywords=r"\b(?:latest|last|recent|newest|current)\b.*\bprofile\b|\bprofile\b",
+        required=("float_id",), priority=10,
+    )
+    registry.register(
+        "floats_in_region", floats_in_region,
+        keywords=r"\b(?:(?:which|what)\s+)?(?:floats?|platforms?)\b",
+        required=("region",), priority=0,
+    )
+    return registry
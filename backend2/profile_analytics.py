@@ -0,0 +1,263 @@
+import sqlite3
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import gsw
+except ImportError:  # optional: TEOS-10 densities when installed, EOS-80 otherwise
+    gsw = None
+
+PROFILE_TABLE = "prof_rel"
+
+# de Boyer Montégut et al. (2004): thresholds relative to the value at 10 dbar.
+MLD_REFERENCE_PRES = 10.0
+MLD_DENSITY_THRESHOLD = 0.03
+MLD_TEMPERATURE_THRESHOLD = 0.2
+# Profiles whose shallowest sample is deeper than this have no usable near-surface reference.
+MLD_MAX_REFERENCE_PRES = 20.0
+# Pressure steps thinner than this are mostly sensor noise and give spurious gradient spikes.
+MIN_GRADIENT_STEP_DBAR = 1.0
+
+ProfileKey = Tuple[int, int]
+
+_LOAD_COLUMNS = (
+    "PLATFORM_NUMBER, CYCLE_NUMBER, JULD, LATITUDE, LONGITUDE, DATA_MODE, "
+    "PRES, TEMP, PSAL, PRES_ADJUSTED, TEMP_ADJUSTED, PSAL_ADJUSTED"
+)
+
+
+def density_method() -> str:
+    return "teos10" if gsw is not None else "eos80"
+
+
+def potential_temperature(temp: np.ndarray, psal: np.ndarray, pres: np.ndarray) -> np.ndarray:
+    """Potential temperature referenced to the surface (Bryden 1973, EOS-80), pressure in dbar."""
+    s = psal - 35.0
+    p = pres / 10.0  # the polynomial is in bars
+    return (
+        temp
+        - p * (3.6504e-4 + 8.3198e-5 * temp - 5.4065e-7 * temp**2 + 4.0274e-9 * temp**3)
+        - p * s * (1.7439e-5 - 2.9778e-7 * temp)
+        - p**2 * (8.9309e-7 - 3.1628e-8 * temp + 2.1987e-10 * temp**2)
+        + 4.1057e-9 * s * p**2
+        - p**3 * (-1.6056e-10 + 5.0484e-12 * temp)
+    )
+
+
+def surface_density(temp: np.ndarray, psal: np.ndarray) -> np.ndarray:
+    """UNESCO 1981 (EOS-80) one-atmosphere density in kg/m^3."""
+    t = temp
+    water = (
+        999.842594 + 6.793952e-2 * t - 9.095290e-3 * t**2 + 1.001685e-4 * t**3
+        - 1.120083e-6 * t**4 + 6.536332e-9 * t**5
+    )
+    a = 0.824493 - 4.0899e-3 * t + 7.6438e-5 * t**2 - 8.2467e-7 * t**3 + 5.3875e-9 * t**4
+    b = -5.72466e-3 + 1.0227e-4 * t - 1.6546e-6 * t**2
+    with np.errstate(invalid="ignore"):
+        return water + a * psal + b * np.power(psal, 1.5) + 4.8314e-4 * psal**2
+
+
+def potential_density_anomaly(
+    temp: np.ndarray, psal: np.ndarray, pres: np.ndarray, lat: np.ndarray, lon: np.ndarray
+) -> np.ndarray:
+    """sigma0 (potential density minus 1000 kg/m^3) for (profiles x levels) arrays; lat/lon are per profile."""
+    if gsw is not None:
+        absolute_salinity = gsw.SA_from_SP(psal, pres, lon[:, None], lat[:, None])
+        conservative_temp = gsw.CT_from_t(absolute_salinity, temp, pres)
+        return gsw.sigma0(absolute_salinity, conservative_temp)
+    return surface_density(potential_temperature(temp, psal, pres), psal) - 1000.0
+
+
+@dataclass
+class ProfileBatch:
+    """Profiles padded into (profiles x levels) arrays, sorted by pressure, NaN past a profile's last level."""
+
+    keys: List[ProfileKey]
+    meta: List[dict]
+    levels: np.ndarray
+    pres: np.ndarray
+    temp: np.ndarray
+    psal: np.ndarray
+    adjusted: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+def _adjusted_or_raw(adjusted: np.ndarray, raw: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(adjusted), raw, adjusted)
+
+
+def load_profiles(conn: sqlite3.Connection, keys: Sequence[ProfileKey]) -> ProfileBatch:
+    """Read every requested profile with a single indexed query and pad the levels into arrays."""
+    wanted = list(dict.fromkeys((int(p), int(c)) for p, c in keys))
+    if not wanted:
+        empty = np.empty((0, 0))
+        return ProfileBatch([], [], np.zeros(0, dtype=np.int64), empty, empty, empty, empty.astype(bool))
+
+    values = ", ".join("(?, ?)" for _ in wanted)
+    params = [v for key in wanted for v in key]
+    # Joining from the key list drives one (PLATFORM_NUMBER, CYCLE_NUMBER) index search per profile;
+    # a row-value IN (VALUES ...) would scan the table instead.
+    rows = conn.execute(
+        f"WITH wanted(platform, cycle) AS (VALUES {values}) "
+        f"SELECT {_LOAD_COLUMNS} FROM wanted CROSS JOIN {PROFILE_TABLE} "
+        "ON PLATFORM_NUMBER = wanted.platform AND CYCLE_NUMBER = wanted.cycle "
+        "WHERE COALESCE(PRES_ADJUSTED, PRES) IS NOT NULL "
+        "ORDER BY PLATFORM_NUMBER, CYCLE_NUMBER, COALESCE(PRES_ADJUSTED, PRES);",
+        params,
+    ).fetchall()
+
+    found: Dict[ProfileKey, int] = {}
+    meta: List[dict] = []
+    profile_of_row = np.empty(len(rows), dtype=np.int64)
+    for i, row in enumerate(rows):
+        key = (int(row[0]), int(row[1]))
+        index = found.get(key)
+        if index is None:
+            index = found[key] = len(meta)
+            meta.append({
+                "juld": row[2],
+                "latitude": row[3],
+                "longitude": row[4],
+                "data_mode": row[5],
+            })
+        profile_of_row[i] = index
+
+    numeric = np.array([row[6:12] for row in rows], dtype=float).reshape(len(rows), 6)
+    pres = _adjusted_or_raw(numeric[:, 3], numeric[:, 0])
+    temp = _adjusted_or_raw(numeric[:, 4], numeric[:, 1])
+    psal = _adjusted_or_raw(numeric[:, 5], numeric[:, 2])
+    adjusted = ~np.isnan(numeric[:, 3:6]).all(axis=1)
+
+    counts = np.bincount(profile_of_row, minlength=len(meta))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(meta) else np.zeros(0, dtype=np.int64)
+    level_of_row = np.arange(len(rows)) - starts[profile_of_row]
+    shape = (len(meta), int(counts.max()) if len(meta) else 0)
+
+    def pad(column: np.ndarray, fill: object = np.nan) -> np.ndarray:
+        out = np.full(shape, fill, dtype=column.dtype)
+        out[profile_of_row, level_of_row] = column
+        return out
+
+    ordered = sorted(found, key=found.get)
+    return ProfileBatch(ordered, meta, counts, pad(pres), pad(temp), pad(psal), pad(adjusted, False))
+
+
+def _reference_values(pres: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Value at the level nearest MLD_REFERENCE_PRES per profile; NaN without a shallow enough sample."""
+    distance = np.where(np.isnan(values) | np.isnan(pres), np.inf, np.abs(pres - MLD_REFERENCE_PRES))
+    index = np.argmin(distance, axis=1)
+    rows = np.arange(len(pres))
+    reference = values[rows, index]
+    usable = np.isfinite(distance[rows, index]) & (pres[rows, index] <= MLD_MAX_REFERENCE_PRES)
+    return np.where(usable, reference, np.nan), pres[rows, index]
+
+
+def threshold_depth(pres: np.ndarray, values: np.ndarray, threshold: float) -> np.ndarray:
+    """First pressure below the reference level where |value - reference| exceeds `threshold`, interpolated."""
+    reference, reference_pres = _reference_values(pres, values)
+    with np.errstate(invalid="ignore"):
+        excess = np.abs(values - reference[:, None])
+        crossed = (excess > threshold) & (pres > reference_pres[:, None])
+    has_crossing = crossed.any(axis=1)
+    rows = np.arange(len(pres))
+    k = np.argmax(crossed, axis=1)
+    above = np.maximum(k - 1, 0)
+
+    p1, p2 = pres[rows, above], pres[rows, k]
+    e1, e2 = excess[rows, above], excess[rows, k]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fraction = np.where(e2 > e1, (threshold - e1) / (e2 - e1), 1.0)
+    depth = p1 + np.clip(np.nan_to_num(fraction, nan=1.0), 0.0, 1.0) * (p2 - p1)
+    return np.where(has_crossing & (k > 0), depth, np.nan)
+
+
+def thermocline(pres: np.ndarray, temp: np.ndarray, below: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pressure and strength (degC/dbar) of the steepest temperature decrease below `below` per profile."""
+    if pres.shape[1] < 2:
+        empty = np.full(len(pres), np.nan)
+        return empty, empty
+    dp = np.diff(pres, axis=1)
+    mid = (pres[:, 1:] + pres[:, :-1]) / 2.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gradient = -np.diff(temp, axis=1) / dp
+        valid = (dp >= MIN_GRADIENT_STEP_DBAR) & np.isfinite(gradient)
+        valid &= ~(mid < np.nan_to_num(below, nan=0.0)[:, None])
+    scored = np.where(valid, gradient, -np.inf)
+    k = np.argmax(scored, axis=1)
+    rows = np.arange(len(pres))
+    found = np.isfinite(scored[rows, k])
+    return np.where(found, mid[rows, k], np.nan), np.where(found, gradient[rows, k], np.nan)
+
+
+def _number(value: object, digits: int) -> Optional[float]:
+    # JSON has no NaN; missing values become null.
+    if value is None:
+        return None
+    value = float(value)
+    return round(value, digits) if np.isfinite(value) else None
+
+
+def _series(values: np.ndarray, digits: int) -> List[Optional[float]]:
+    return [_number(v, digits) for v in values]
+
+
+def derive(batch: ProfileBatch, include_levels: bool = True) -> Dict[ProfileKey, dict]:
+    """Mixed-layer depth, thermocline and T-S/density series for every profile in the batch at once."""
+    if not len(batch):
+        return {}
+    lat = np.array([m["latitude"] if m["latitude"] is not None else np.nan for m in batch.meta], dtype=float)
+    lon = np.array([m["longitude"] if m["longitude"] is not None else np.nan for m in batch.meta], dtype=float)
+    sigma0 = potential_density_anomaly(batch.temp, batch.psal, batch.pres, lat, lon)
+
+    mld_density = threshold_depth(batch.pres, sigma0, MLD_DENSITY_THRESHOLD)
+    mld_temperature = threshold_depth(batch.pres, batch.temp, MLD_TEMPERATURE_THRESHOLD)
+    thermocline_pres, thermocline_gradient = thermocline(batch.pres, batch.temp, mld_density)
+
+    levels = batch.levels
+    adjusted_share = batch.adjusted.sum(axis=1) / np.maximum(levels, 1)
+    rows = np.arange(len(batch))
+    max_pres = batch.pres[rows, levels - 1]
+
+    results = {}
+    for i, key in enumerate(batch.keys):
+        meta = batch.meta[i]
+        result = {
+            "platform_number": key[0],
+            "cycle_number": key[1],
+            "juld": meta["juld"],
+            "latitude": meta["latitude"],
+            "longitude": meta["longitude"],
+            "data_mode": meta["data_mode"],
+            "levels": int(levels[i]),
+            "adjusted_fraction": round(float(adjusted_share[i]), 4),
+            "max_pres_dbar": _number(max_pres[i], 2),
+            "density_method": density_method(),
+            "mixed_layer_depth_dbar": {
+                "density": _number(mld_density[i], 2),
+                "temperature": _number(mld_temperature[i], 2),
+            },
+            "thermocline": {
+                "pres_dbar": _number(thermocline_pres[i], 2),
+                "temp_gradient_c_per_dbar": _number(thermocline_gradient[i], 5),
+            },
+            "surface": {
+                "pres_dbar": _number(batch.pres[i, 0], 2),
+                "temp_c": _number(batch.temp[i, 0], 4),
+                "psal_psu": _number(batch.psal[i, 0], 4),
+                "sigma0": _number(sigma0[i, 0], 4),
+            },
+        }
+        if include_levels:
+            n = int(levels[i])
+            result["ts"] = {
+                "pres": _series(batch.pres[i, :n], 2),
+                "temp": _series(batch.temp[i, :n], 4),
+                "psal": _series(batch.psal[i, :n], 4),
+                "sigma0": _series(sigma0[i, :n], 4),
+            }
+        results[key] = result
+    return results
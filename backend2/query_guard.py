@@ -0,0 +1,109 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class QueryTooExpensive(Exception):
+    """A statement was aborted because it exceeded its wall-clock or VM-step budget."""
+
+    def __init__(self, reason: str, limit: float, elapsed_seconds: float, vm_steps: int):
+        self.reason = reason
+        self.limit = limit
+        self.elapsed_seconds = elapsed_seconds
+        self.vm_steps = vm_steps
+        budget = f"{limit:g} seconds" if reason == "time" else f"{int(limit):,} VM steps"
+        super().__init__(f"Query exceeded its budget of {budget} and was aborted.")
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "error": "query_too_expensive",
+            "reason": self.reason,
+            "message": str(self),
+            "limit": self.limit,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "vm_steps": self.vm_steps,
+        }
+
+
+class QueryCancelled(Exception):
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(f"Query cancelled: {reason}.")
+
+
+class CancelToken:
+    """Thread-safe flag shared between a request and the worker thread running its SQL."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = ""
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class StatementBudget:
+    """Aborts a running statement through SQLite's progress handler.
+
+    The handler runs every `interval` virtual-machine instructions, so cancellation and
+    deadlines take effect mid-statement instead of after the result has been produced.
+    """
+
+    def __init__(
+        self,
+        max_seconds: float = 0.0,
+        max_steps: int = 0,
+        token: Optional[CancelToken] = None,
+        interval: int = 10000,
+    ):
+        self.max_seconds = max_seconds
+        self.max_steps = max_steps
+        self.token = token
+        self.interval = max(1, interval)
+        self.steps = 0
+        self.started = 0.0
+        self.tripped = ""
+
+    def _progress(self) -> int:
+        self.steps += self.interval
+        if self.token is not None and self.token.cancelled:
+            self.tripped = "cancelled"
+        elif self.max_steps and self.steps > self.max_steps:
+            self.tripped = "steps"
+        elif self.max_seconds and time.perf_counter() - self.started > self.max_seconds:
+            self.tripped = "time"
+        return 1 if self.tripped else 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @contextmanager
+    def guard(self, conn: sqlite3.Connection):
+        """Covers execute() and every fetch inside the block; restores the connection afterwards."""
+        if self.token is not None and self.token.cancelled:
+            raise QueryCancelled(self.token.reason)
+        self.steps = 0
+        self.tripped = ""
+        self.started = time.perf_counter()
+        conn.set_progress_handler(self._progress, self.interval)
+        try:
+            yield self
+        except sqlite3.OperationalError as exc:
+            if self.tripped == "cancelled":
+                raise QueryCancelled(self.token.reason) from exc
+            if self.tripped == "steps":
+                raise QueryTooExpensive("steps", self.max_steps, self.elapsed, self.steps) from exc
+            if self.tripped == "time":
+                raise QueryTooExpensive("time", self.max_seconds, self.elapsed, self.steps) from exc
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
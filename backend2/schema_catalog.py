@@ -0,0 +1,217 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NUMERIC_TYPES = ("INT", "REAL", "FLOA", "DOUB", "NUMERIC", "DECIMAL")
+
+
+@dataclass
+class ColumnInfo:
+    name: str
+    type: str
+    min_value: object = None
+    max_value: object = None
+
+    @property
+    def is_numeric(self) -> bool:
+        upper = self.type.upper()
+        return any(token in upper for token in NUMERIC_TYPES)
+
+
+@dataclass
+class TableInfo:
+    name: str
+    columns: List[ColumnInfo]
+    indexes: Dict[str, List[str]] = field(default_factory=dict)
+    row_count: Optional[int] = 0
+
+    @property
+    def column_names(self) -> List[str]:
+        return [col.name for col in self.columns]
+
+    def column(self, name: str) -> Optional[ColumnInfo]:
+        lowered = name.lower()
+        for col in self.columns:
+            if col.name.lower() == lowered:
+                return col
+        return None
+
+
+@dataclass
+class CatalogSnapshot:
+    version: Tuple[int, int]
+    tables: Dict[str, TableInfo]
+    built_at: float
+    build_seconds: float
+
+    def table(self, name: str) -> Optional[TableInfo]:
+        return self.tables.get(name)
+
+    def column_names(self, table: str) -> List[str]:
+        info = self.tables.get(table)
+        return info.column_names if info else []
+
+    def schema_text(self) -> str:
+        lines = []
+        for info in self.tables.values():
+            cols = ", ".join(f"{col.name} {col.type}".strip() for col in info.columns)
+            lines.append(f"{info.name}({cols})")
+        return "\n".join(lines)
+
+    @cached_property
+    def schema_hash(self) -> str:
+        return hashlib.sha256(self.schema_text().encode("utf-8")).hexdigest()[:16]
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            "version": list(self.version),
+            "built_at": self.built_at,
+            "build_seconds": round(self.build_seconds, 4),
+            "schema_hash": self.schema_hash,
+            "tables": {
+                info.name: {
+                    "row_count": info.row_count,
+                    "indexes": info.indexes,
+                    "columns": {
+                        col.name: {"type": col.type, "min": col.min_value, "max": col.max_value}
+                        for col in info.columns
+                    },
+                }
+                for info in self.tables.values()
+            },
+        }
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class SchemaCatalog:
+    """Process-wide cache of table/column/index metadata, rebuilt only when the database changes.
+
+    A rebuild never scans a table: row counts come from sqlite_stat1 (or MAX(rowid) for tables ANALYZE has
+    not seen) and value ranges are read only for columns that lead an index.
+    """
+
+    def __init__(self, db_path: str, collect_stats: bool = True, exclude_tables: Iterable[str] = ()):
+        self.db_path = db_path
+        self.collect_stats = collect_stats
+        self.exclude_tables = {name.lower() for name in exclude_tables}
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        self._probe: Optional[sqlite3.Connection] = None
+        self._probe_lock = threading.Lock()
+        self.rebuilds = 0
+
+    def _data_version(self) -> int:
+        # PRAGMA data_version is per connection, so it is always read from the same one; it changes when any
+        # other connection commits, which a file mtime also does on every WAL checkpoint.
+        with self._probe_lock:
+            if self._probe is None:
+                self._probe = sqlite3.connect(self.db_path, check_same_thread=False)
+            return int(self._probe.execute("PRAGMA data_version;").fetchone()[0])
+
+    def _version(self, conn: sqlite3.Connection) -> Tuple[int, int]:
+        schema_version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+        return (int(schema_version), self._data_version())
+
+    def close(self) -> None:
+        with self._probe_lock:
+            if self._probe is not None:
+                self._probe.close()
+                self._probe = None
+
+    def get(self, conn: sqlite3.Connection) -> CatalogSnapshot:
+        version = self._version(conn)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            self._snapshot = self._build(conn, version)
+            self.rebuilds += 1
+            return self._snapshot
+
+    @property
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        return self._snapshot
+
+    def _build(self, conn: sqlite3.Connection, version: Tuple[int, int]) -> CatalogSnapshot:
+        started = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;")
+        table_names = [
+            row[0]
+            for row in cursor.fetchall()
+            if not row[0].startswith("sqlite_") and row[0].lower() not in self.exclude_tables
+        ]
+
+        table_rows = _analyzed_rows(cursor) if self.collect_stats else {}
+        tables: Dict[str, TableInfo] = {}
+        for table in table_names:
+            cursor.execute(f"PRAGMA table_info({_quote(table)});")
+            columns = [ColumnInfo(name=row[1], type=row[2] or "") for row in cursor.fetchall()]
+            if not columns:
+                # Virtual tables whose module is unavailable report no columns.
+                continue
+            info = TableInfo(name=table, columns=columns)
+
+            cursor.execute(f"PRAGMA index_list({_quote(table)});")
+            for index_row in cursor.fetchall():
+                index_name = index_row[1]
+                cursor.execute(f"PRAGMA index_info({_quote(index_name)});")
+                info.indexes[index_name] = [row[2] for row in cursor.fetchall()]
+
+            if self.collect_stats:
+                self._collect_stats(cursor, info, table_rows.get(table))
+            tables[table] = info
+
+        return CatalogSnapshot(
+            version=version,
+            tables=tables,
+            built_at=time.time(),
+            build_seconds=time.perf_counter() - started,
+        )
+
+    def _collect_stats(self, cursor: sqlite3.Cursor, info: TableInfo, analyzed_rows: Optional[int]) -> None:
+        info.row_count = analyzed_rows
+        if info.row_count is None:
+            try:
+                # The largest rowid is one B-tree seek and matches the row count of append-only tables.
+                cursor.execute(f"SELECT MAX(rowid) FROM {_quote(info.name)};")
+                info.row_count = int(cursor.fetchone()[0] or 0)
+            except sqlite3.Error:
+                pass
+        leading = {columns[0].lower() for columns in info.indexes.values() if columns and columns[0]}
+        for col in info.columns:
+            if not col.is_numeric or col.name.lower() not in leading:
+                continue
+            # Separate MIN and MAX statements: SQLite answers each from one end of the index, but not both at once.
+            try:
+                cursor.execute(f"SELECT MIN({_quote(col.name)}) FROM {_quote(info.name)};")
+                col.min_value = cursor.fetchone()[0]
+                cursor.execute(f"SELECT MAX({_quote(col.name)}) FROM {_quote(info.name)};")
+                col.max_value = cursor.fetchone()[0]
+            except sqlite3.Error:
+                continue
+
+
+def _analyzed_rows(cursor: sqlite3.Cursor) -> Dict[str, int]:
+    """Table row counts recorded by the last ANALYZE (the first number of every sqlite_stat1 row)."""
+    try:
+        cursor.execute("SELECT tbl, stat FROM sqlite_stat1;")
+        rows = cursor.fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    counts: Dict[str, int] = {}
+    for table, stat in rows:
+        first = str(stat).split()[0] if stat else ""
+        if first.isdigit():
+            counts[table] = int(first)
+    return counts
@@ -0,0 +1,255 @@
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from schema_catalog import CatalogSnapshot, TableInfo
+
+TABLE_DESCRIPTIONS = {
+    "meta_rel": "float metadata: deployment launch, maker, model, sensors, project, principal investigator",
+    "traj_rel": "float trajectory: surface positions and fix time per cycle, positioning system",
+    "prof_rel": "profile measurements per depth level: pressure, temperature, salinity with quality flags",
+    "tech_rel": "technical engineering parameters reported per cycle: battery, pump, voltage",
+    "prof_summary": "one row per profile: level count, min max mean, surface and bottom values",
+    "prof_grid": "gridded climatology cube by depth band, month and lat/lon bin: counts, sums, min max",
+}
+
+COLUMN_DESCRIPTIONS = {
+    "PLATFORM_NUMBER": "float wmo id identifier",
+    "CYCLE_NUMBER": "profile cycle dive number",
+    "JULD": "date time timestamp when",
+    "JULD_EPOCH": "date time seconds epoch when",
+    "LATITUDE": "position location latitude north south where region",
+    "LONGITUDE": "position location longitude east west where region",
+    "PRES": "pressure depth dbar metres",
+    "TEMP": "temperature degrees celsius warm cold heat",
+    "PSAL": "practical salinity psu salt",
+    "DATA_MODE": "real time adjusted delayed mode quality",
+    "DATA_CENTRE": "data center agency",
+    "PROJECT_NAME": "project program",
+    "PI_NAME": "principal investigator scientist owner",
+    "PLATFORM_TYPE": "model type",
+    "PLATFORM_MAKER": "manufacturer maker",
+    "PLATFORM_FAMILY": "family",
+    "LAUNCH_DATE": "deployment launch date deployed",
+    "LAUNCH_LATITUDE": "deployment launch position latitude deployed",
+    "LAUNCH_LONGITUDE": "deployment launch position longitude deployed",
+    "DEPLOYMENT_PLATFORM": "deployment ship vessel cruise",
+    "SENSOR": "sensor instrument",
+    "PARAMETER": "measured parameter variable",
+    "POSITIONING_SYSTEM": "gps argos iridium positioning",
+    "POSITION_QC": "position quality flag",
+    "POSITION_ACCURACY": "position accuracy error",
+    "TECHNICAL_PARAMETER_NAME": "technical engineering parameter battery voltage pump",
+    "TECHNICAL_PARAMETER_VALUE": "technical engineering value battery voltage pump",
+    "N_LEVELS": "number levels count measurements",
+    "DEPTH_BAND": "depth band layer",
+    "MONTH": "month time",
+    "LAT_BIN": "latitude bin grid cell",
+    "LON_BIN": "longitude bin grid cell",
+    "N_PROFILES": "number profiles count",
+}
+
+# Words a prompt may use for a column-name token.
+SYNONYMS = {
+    "temperature": "temp", "temperatures": "temp", "warm": "temp", "warmest": "temp", "cold": "temp",
+    "coldest": "temp", "sst": "temp", "heat": "temp",
+    "salinity": "psal", "salt": "psal", "salty": "psal", "saltiest": "psal", "psu": "psal", "sss": "psal",
+    "pressure": "pres", "depth": "pres", "depths": "pres", "deep": "pres", "deepest": "pres",
+    "shallow": "pres", "dbar": "pres", "metres": "pres", "meters": "pres",
+    "profiles": "profile", "cycles": "cycle", "dives": "cycle",
+    "measure": "measurement", "measured": "measurement", "measures": "measurement", "measuring": "measurement",
+    "observed": "measurement", "observations": "measurement", "readings": "measurement", "values": "measurement",
+    "date": "juld", "dates": "juld", "time": "juld", "when": "juld", "day": "juld", "month": "juld",
+    "year": "juld", "recent": "juld", "latest": "juld", "since": "juld", "between": "juld",
+    "location": "latitude", "position": "latitude", "positions": "latitude", "where": "latitude",
+    "near": "latitude", "nearest": "latitude", "region": "latitude", "sea": "latitude", "ocean": "latitude",
+    "track": "latitude", "trajectory": "latitude", "path": "latitude", "drift": "latitude",
+    "quality": "qc", "flag": "qc", "flags": "qc", "bad": "qc", "good": "qc",
+    "adjusted": "adjusted", "corrected": "adjusted", "delayed": "adjusted", "calibrated": "adjusted",
+    "center": "centre", "centers": "centre", "centres": "centre",
+    "deployed": "launch", "deployment": "launch", "launched": "launch",
+    "manufacturer": "maker", "model": "type",
+    "battery": "technical", "voltage": "technical", "engineering": "technical",
+    "grid": "bin", "gridded": "bin", "climatology": "bin", "map": "bin",
+}
+
+_STOP_WORDS = frozenset(
+    "a an the of for in on at to from by with and or is are was were be do does did have has had what which "
+    "who how me my we you please can could show list give get find tell all any some that this those these it "
+    "its as per each every many much number".split()
+)
+_WORD_RE = re.compile(r"[a-z]+")
+# Parts of column names too common to say anything about the question ("float", "number", ...).
+_GENERIC_NAME_WORDS = frozenset("float platform number no name id rel file".split())
+
+# Derived cubes are only offered when the prompt names them; otherwise their aggregate columns crowd in.
+OPT_IN_TABLES = {"prof_grid": frozenset({"bin", "cube"})}
+# A chosen summary table brings the table it summarises, for questions it cannot answer alone.
+COMPANION_TABLES = {"prof_summary": "prof_rel"}
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+
+# Columns shared by tables that can be joined on them.
+KEY_COLUMNS = ("PLATFORM_NUMBER", "CYCLE_NUMBER")
+# Text columns whose distinct values are worth showing, and only on tables small enough to read them cheaply.
+SAMPLE_MAX_DISTINCT = 6
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _format_bound(value) -> str:
+    if isinstance(value, int) or float(value).is_integer() or abs(value) >= 1e5:
+        return str(int(round(value)))
+    return f"{value:.6g}"
+
+
+def _tokens(text: str) -> List[str]:
+    words = _WORD_RE.findall(text.lower())
+    return [SYNONYMS.get(word, word) for word in words if word not in _STOP_WORDS]
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+class SchemaSelector:
+    """Keyword/synonym index over tables, columns and their descriptions, rebuilt per catalog snapshot.
+
+    `select` keeps the tables a prompt refers to, with every one of their columns (the SQL for "profiles
+    of float X" needs PRES/TEMP/PSAL even though the prompt never names them), value ranges for numeric
+    columns, a few distinct values of small text columns and join hints. Only whole tables are pruned.
+    A prompt that matches nothing gets the full schema.
+    """
+
+    def __init__(self, sample_values: bool = True, sample_max_rows: int = 200_000):
+        self.sample_values = sample_values
+        self.sample_max_rows = sample_max_rows
+        self._lock = threading.Lock()
+        self._version = None
+        self._index: Dict[str, Set[Tuple[str, str]]] = {}
+        self._table_words: Dict[str, Set[str]] = {}
+        self._samples: Dict[Tuple[str, str], List[str]] = {}
+        self.selections = 0
+        self.full_schema_fallbacks = 0
+        self.full_chars = 0
+        self.selected_chars = 0
+
+    def _ensure(self, snapshot: CatalogSnapshot) -> None:
+        if self._version == snapshot.version:
+            return
+        with self._lock:
+            if self._version == snapshot.version:
+                return
+            index: Dict[str, Set[Tuple[str, str]]] = {}
+            table_words: Dict[str, Set[str]] = {}
+            for info in snapshot.tables.values():
+                words = {_stem(w) for w in _tokens(info.name.replace("_", " ") + " " + TABLE_DESCRIPTIONS.get(info.name, ""))}
+                table_words[info.name] = words - _GENERIC_NAME_WORDS
+                for col in info.columns:
+                    text = col.name.replace("_", " ") + " " + COLUMN_DESCRIPTIONS.get(col.name.upper(), "")
+                    for word in set(_tokens(text)) - _GENERIC_NAME_WORDS:
+                        index.setdefault(_stem(word), set()).add((info.name, col.name))
+            self._index, self._table_words, self._samples = index, table_words, {}
+            self._version = snapshot.version
+
+    def _scores(self, prompt: str) -> Dict[str, float]:
+        words = {_stem(w) for w in _tokens(prompt)}
+        if _YEAR_RE.search(prompt):
+            words.add("juld")
+        table_scores: Dict[str, float] = {}
+        for word in words:
+            matches = self._index.get(word, ())
+            tables = {table for table, _ in matches}
+            # Rare words say more about which table is meant than words every table shares.
+            weight = 1.0 / max(1, len(tables))
+            for table in tables:
+                table_scores[table] = table_scores.get(table, 0.0) + weight
+        for table, table_words in self._table_words.items():
+            if table in OPT_IN_TABLES and not words & OPT_IN_TABLES[table]:
+                table_scores.pop(table, None)
+                continue
+            shared = len(words & table_words)
+            if shared:
+                table_scores[table] = table_scores.get(table, 0.0) + 2.0 * shared
+        return table_scores
+
+    def select(self, snapshot: CatalogSnapshot, prompt: str, conn: Optional[sqlite3.Connection] = None) -> Dict[str, object]:
+        """{"schema": text, "tables": [...], "join_hints": [...], "pruned": bool} for one prompt."""
+        self._ensure(snapshot)
+        table_scores = self._scores(prompt)
+        full_text = snapshot.schema_text()
+        if not table_scores:
+            self._count(full_text, full_text, fallback=True)
+            return {"schema": full_text, "tables": list(snapshot.tables), "join_hints": [], "pruned": False}
+
+        best = max(table_scores.values())
+        # Keep clearly relevant tables; weak matches only ride along with strong ones.
+        wanted = {name for name, score in table_scores.items() if score >= best / 2}
+        wanted |= {COMPANION_TABLES[name] for name in wanted if COMPANION_TABLES.get(name) in snapshot.tables}
+        tables = [name for name in snapshot.tables if name in wanted]
+        lines = []
+        for name in tables:
+            info = snapshot.table(name)
+            lines.append(f"{name}({', '.join(self._describe(conn, info, col) for col in info.columns)})")
+        joins = self._join_hints(snapshot, tables)
+        schema = "\n".join(lines)
+        if joins:
+            schema += "\nJoins: " + "; ".join(joins)
+        self._count(full_text, schema, fallback=False)
+        return {"schema": schema, "tables": tables, "join_hints": joins, "pruned": True}
+
+    def _describe(self, conn: Optional[sqlite3.Connection], info: TableInfo, col) -> str:
+        text = f"{col.name} {col.type}".strip()
+        if col.is_numeric and isinstance(col.min_value, (int, float)) and col.name.upper() not in KEY_COLUMNS:
+            return f"{text} [{_format_bound(col.min_value)}..{_format_bound(col.max_value)}]"
+        if self.sample_values and conn is not None and not col.is_numeric and "JULD" not in col.name.upper():
+            values = self._sample(conn, info, col.name)
+            if values:
+                return f"{text} e.g. {', '.join(repr(v) for v in values)}"
+        return text
+
+    def _sample(self, conn: sqlite3.Connection, info: TableInfo, column: str) -> List[str]:
+        key = (info.name, column)
+        if key not in self._samples:
+            values: List[str] = []
+            if 0 < info.row_count <= self.sample_max_rows and column.lower() != "file_name":
+                rows = conn.execute(
+                    f"SELECT DISTINCT {_quote(column)} FROM {_quote(info.name)} "
+                    f"WHERE {_quote(column)} IS NOT NULL LIMIT {SAMPLE_MAX_DISTINCT + 1};"
+                ).fetchall()
+                # Columns with many distinct values (names, dates) are not categorical; samples would mislead.
+                if len(rows) <= SAMPLE_MAX_DISTINCT:
+                    values = [str(row[0])[:40] for row in rows]
+            self._samples[key] = values
+        return self._samples[key]
+
+    @staticmethod
+    def _join_hints(snapshot: CatalogSnapshot, tables: List[str]) -> List[str]:
+        hints = []
+        for i, left in enumerate(tables):
+            for right in tables[i + 1:]:
+                left_cols = {c.upper() for c in snapshot.column_names(left)}
+                right_cols = {c.upper() for c in snapshot.column_names(right)}
+                keys = [k for k in KEY_COLUMNS if k in left_cols and k in right_cols]
+                if keys:
+                    hints.append(f"{left} JOIN {right} USING ({', '.join(keys)})")
+        return hints
+
+    def _count(self, full_text: str, selected: str, fallback: bool) -> None:
+        with self._lock:
+            self.selections += 1
+            self.full_schema_fallbacks += int(fallback)
+            self.full_chars += len(full_text)
+            self.selected_chars += len(selected)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "selections": self.selections,
+                "full_schema_fallbacks": self.full_schema_fallbacks,
+                "mean_full_chars": round(self.full_chars / self.selections) if self.selections else 0,
+                "mean_selected_chars": round(self.selected_chars / self.selections) if self.selections else 0,
+                "reduction": round(1 - self.selected_chars / self.full_chars, 4) if self.full_chars else 0.0,
+            }
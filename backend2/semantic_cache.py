@@ -0,0 +1,271 @@
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from nl_templates import extract_slots
+from translation_cache import normalize_prompt
+
+# normalize_prompt splits "2023-01-15" into "2023 -01 -15"; join it back so dates stay one literal.
+_SPLIT_DATE_RE = re.compile(r"\b(\d{4}) -(\d{2})\b(?: -(\d{2})\b)?")
+_LITERAL_RE = re.compile(r"\d{4}-\d{2}(?:-\d{2})?|-?\d+(?:\.\d+)?")
+_DATE_LITERAL_RE = re.compile(r"\d{4}-\d{2}(?:-\d{2})?$")
+
+STOP_WORDS = frozenset(
+    "a an the of for in on at to from by with and or is are was were be been do does did have has had "
+    "what which who whom whose how me my i we you please can could would will shall show list give get "
+    "find fetch display tell return all any some there that this those these it its as".split()
+)
+# Spelling variants folded together before comparing prompts.
+SYNONYMS = {
+    "maximum": "max", "highest": "max", "largest": "max", "biggest": "max",
+    "minimum": "min", "lowest": "min", "smallest": "min",
+    "average": "mean", "avg": "mean",
+    "temp": "temperature", "temperatures": "temperature", "temps": "temperature",
+    "sal": "salinity", "psal": "salinity", "salinities": "salinity",
+    "pres": "pressure", "depths": "depth", "deepest": "max depth",
+    "floats": "float", "platform": "float", "platforms": "float", "wmo": "float",
+    "profiles": "profile", "cycles": "cycle", "readings": "measurement", "reading": "measurement",
+    "measurements": "measurement", "observations": "measurement", "values": "value",
+    "each": "per", "every": "per",
+    "centre": "center", "centres": "center", "centers": "center",
+}
+
+# Words that flip the meaning of an otherwise similar prompt; prompts only match when these agree.
+GUARD_WORDS = frozenset(
+    "not no without except exclude below above under over deeper shallower before after since until "
+    "more less greater fewer higher lower north south east west ascending descending top bottom first last "
+    "latest oldest earliest newest recent per each every many count distinct unique total sum "
+    "january february march april may june july august september october november december "
+    "day days week weeks month months year years < > <= >= = != ≤ ≥ ≠".split()
+)
+
+
+def canonical_prompt(prompt: str) -> str:
+    text = _SPLIT_DATE_RE.sub(lambda m: "-".join(g for g in m.groups() if g), normalize_prompt(prompt))
+    return " ".join(SYNONYMS.get(word, word) for word in text.split())
+
+
+def _content_words(text: str) -> List[str]:
+    return [word for word in text.split() if word not in STOP_WORDS]
+
+
+def _literals(text: str) -> List[str]:
+    return _LITERAL_RE.findall(text)
+
+
+def _literal_kind(literal: str) -> str:
+    return "date" if _DATE_LITERAL_RE.match(literal) else "number"
+
+
+def _signature(text: str) -> Tuple[object, ...]:
+    slots = extract_slots(text)
+    words = frozenset(w for w in text.split() if w in GUARD_WORDS)
+    return (
+        tuple(slots.get("variables", ())),
+        slots.get("stat"),
+        slots.get("region"),
+        words,
+        tuple(_literal_kind(v) for v in _literals(text)),
+    )
+
+
+def _literal_pattern(literal: str) -> re.Pattern:
+    # Standalone occurrences only: "2023" inside '2023-01-01' or "3" inside "3.5" are not the literal.
+    return re.compile(r"(?<![\w.-])" + re.escape(literal) + r"(?![\w.]|-\d)")
+
+
+def rebind(sql: str, old_prompt: str, new_prompt: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """Swap the old prompt's literals for the new prompt's in `sql`; None when that is not unambiguous."""
+    old, new = _literals(old_prompt), _literals(new_prompt)
+    if len(old) != len(new):
+        return None
+    bindings: Dict[str, str] = {}
+    for before, after in zip(old, new):
+        if bindings.get(before, after) != after:
+            return None
+        bindings[before] = after
+    changed = {before: after for before, after in bindings.items() if before != after}
+    patterns = {before: _literal_pattern(before) for before in changed}
+    for before, pattern in patterns.items():
+        # Every occurrence in the SQL must come from the prompt, or "3" in "LIMIT 3" would be rewritten too.
+        if len(pattern.findall(sql)) != old.count(before):
+            return None
+    # Two-step substitution so that swapping values (a->b, b->a) does not collide.
+    placeholders = {before: f"\0{i}\0" for i, before in enumerate(changed)}
+    for before, pattern in patterns.items():
+        sql = pattern.sub(placeholders[before], sql)
+    for before, placeholder in placeholders.items():
+        sql = sql.replace(placeholder, changed[before])
+    return sql, changed
+
+
+class HashedTfidf:
+    """Character n-gram and word features hashed into a fixed number of buckets, weighted by TF-IDF."""
+
+    def __init__(self, dims: int = 2048, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dims = dims
+        self.ngram_range = ngram_range
+        self.document_frequency = np.zeros(dims, dtype=np.float32)
+        self.documents = 0
+
+    def term_frequencies(self, text: str) -> np.ndarray:
+        words = _content_words(_LITERAL_RE.sub("#", text))
+        features = ["w:" + word for word in words]
+        for word in words:
+            padded = f" {word} "
+            features += [padded[i:i + n] for n in range(self.ngram_range[0], self.ngram_range[1] + 1) for i in range(len(padded) - n + 1)]
+        counts = np.zeros(self.dims, dtype=np.float32)
+        np.add.at(counts, [zlib.crc32(f.encode("utf-8")) % self.dims for f in features], 1.0)
+        nonzero = counts > 0
+        counts[nonzero] = 1.0 + np.log(counts[nonzero])
+        return counts
+
+    def fit_one(self, tf: np.ndarray) -> None:
+        self.document_frequency += tf > 0
+        self.documents += 1
+
+    def unfit_one(self, tf: np.ndarray) -> None:
+        self.document_frequency -= tf > 0
+        self.documents -= 1
+
+    def idf(self) -> np.ndarray:
+        return np.log((1.0 + self.documents) / (1.0 + self.document_frequency)) + 1.0
+
+
+class SemanticCache:
+    """Reuses the SQL of a previously translated prompt for paraphrases of it, with literals re-bound.
+
+    Candidates must share the schema, the guard-word/variable/region signature and the literal shape of
+    the prompt; among them the most similar above `threshold` wins. Every hit is kept in a bounded audit
+    log so false hits can be verified or flagged.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 5000, dims: int = 2048, audit_size: int = 200):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.vectorizer = HashedTfidf(dims=dims)
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Dict[str, object]] = {}
+        self._by_signature: Dict[Tuple[str, Tuple[object, ...]], List[Tuple[str, str]]] = {}
+        self._audit: "deque[Dict[str, object]]" = deque(maxlen=audit_size)
+        self._next_audit_id = 1
+        self.lookups = 0
+        self.hits = 0
+        self.unbindable = 0
+        self.verified = 0
+        self.false_hits = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def load(self, items: Iterable[Tuple[str, str, str]]) -> None:
+        for prompt, schema_hash, sql in items:
+            self.add(prompt, schema_hash, sql)
+
+    def add(self, prompt: str, schema_hash: str, sql: str) -> None:
+        text = canonical_prompt(prompt)
+        key = (schema_hash, text)
+        tf = self.vectorizer.term_frequencies(text)
+        signature = (schema_hash, _signature(text))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = {"prompt": text, "sql": sql, "tf": tf, "signature": signature, "created_at": time.time()}
+            self._by_signature.setdefault(signature, []).append(key)
+            self.vectorizer.fit_one(tf)
+
+    def discard(self, prompt: str, schema_hash: str) -> None:
+        key = (schema_hash, canonical_prompt(prompt))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key)
+        bucket = self._by_signature.get(entry["signature"], [])
+        if key in bucket:
+            bucket.remove(key)
+        if not bucket:
+            self._by_signature.pop(entry["signature"], None)
+        self.vectorizer.unfit_one(entry["tf"])
+
+    def lookup(self, prompt: str, schema_hash: str) -> Optional[Dict[str, object]]:
+        text = canonical_prompt(prompt)
+        tf = self.vectorizer.term_frequencies(text)
+        signature = (schema_hash, _signature(text))
+        with self._lock:
+            self.lookups += 1
+            keys = list(self._by_signature.get(signature, ()))
+            if not keys:
+                return None
+            idf = self.vectorizer.idf()
+            query = tf * idf
+            matrix = np.stack([self._entries[k]["tf"] for k in keys]) * idf
+            norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+            scores = matrix @ query / np.where(norms > 0, norms, 1.0)
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.threshold:
+                return None
+            entry = self._entries[keys[best]]
+            rebound = rebind(entry["sql"], entry["prompt"], text)
+            if rebound is None:
+                self.unbindable += 1
+                return None
+            sql, bindings = rebound
+            self.hits += 1
+            audit = {
+                "id": self._next_audit_id,
+                "at": time.time(),
+                "prompt": prompt,
+                "matched_prompt": entry["prompt"],
+                "similarity": round(similarity, 4),
+                "bindings": bindings,
+                "sql": sql,
+                "verdict": None,
+            }
+            self._next_audit_id += 1
+            self._audit.append(audit)
+            return {"sql": sql, "similarity": audit["similarity"], "matched_prompt": entry["prompt"], "audit_id": audit["id"]}
+
+    def record_verdict(self, audit_id: int, correct: bool) -> bool:
+        """Marks an audited hit as verified correct or as a false hit; a false hit drops the reused entry."""
+        with self._lock:
+            audit = next((a for a in self._audit if a["id"] == audit_id), None)
+            if audit is None or audit["verdict"] is not None:
+                return False
+            audit["verdict"] = "correct" if correct else "false_hit"
+            self.verified += 1
+            if not correct:
+                self.false_hits += 1
+                for key, entry in list(self._entries.items()):
+                    if entry["prompt"] == audit["matched_prompt"]:
+                        self._remove(key)
+            return True
+
+    def audit_log(self, limit: int = 50, verdict: Optional[str] = None) -> List[Dict[str, object]]:
+        with self._lock:
+            entries = [dict(a) for a in reversed(self._audit) if verdict is None or a["verdict"] == verdict]
+        return entries[:limit]
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "unbindable": self.unbindable,
+                "verified": self.verified,
+                "false_hits": self.false_hits,
+                "false_hit_rate": round(self.false_hits / self.verified, 4) if self.verified else 0.0,
+            }
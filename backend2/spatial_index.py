@@ -0,0 +1,142 @@
+import heapq
+import math
+import sqlite3
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    phi, lmb = math.radians(lat), math.radians(lon)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lmb), cos_phi * math.sin(lmb), math.sin(phi))
+
+
+class _KDTree:
+    """Static 3-d tree over points on the unit sphere.
+
+    Chord length is monotonic in great-circle distance, so Euclidean k-NN in 3-d
+    gives correct great-circle neighbours, including near the poles and across
+    the dateline.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float, float]]):
+        self.points = list(points)
+        self.nodes: List[Tuple[int, int, int, int]] = []  # (point_index, axis, left, right)
+        order = list(range(len(self.points)))
+        self.root = self._build(order, 0)
+
+    def _build(self, order: List[int], depth: int) -> int:
+        if not order:
+            return -1
+        axis = depth % 3
+        order.sort(key=lambda i: self.points[i][axis])
+        mid = len(order) // 2
+        node_id = len(self.nodes)
+        self.nodes.append((order[mid], axis, -1, -1))
+        left = self._build(order[:mid], depth + 1)
+        right = self._build(order[mid + 1:], depth + 1)
+        self.nodes[node_id] = (order[mid], axis, left, right)
+        return node_id
+
+    def query(self, target: Tuple[float, float, float], k: int) -> List[Tuple[float, int]]:
+        heap: List[Tuple[float, int]] = []  # max-heap via negated squared distance
+        stack = [self.root]
+        while stack:
+            node_id = stack.pop()
+            if node_id < 0:
+                continue
+            point_index, axis, left, right = self.nodes[node_id]
+            point = self.points[point_index]
+            dist_sq = (
+                (point[0] - target[0]) ** 2
+                + (point[1] - target[1]) ** 2
+                + (point[2] - target[2]) ** 2
+            )
+            if len(heap) < k:
+                heapq.heappush(heap, (-dist_sq, point_index))
+            elif dist_sq < -heap[0][0]:
+                heapq.heapreplace(heap, (-dist_sq, point_index))
+
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                stack.append(far)
+            stack.append(near)
+        return sorted((-d, i) for d, i in heap)
+
+
+class FloatPositionIndex:
+    """k-nearest lookup over the latest known position of every float."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # (entries, tree) published as one reference so readers never pair one build's entries with another's tree.
+        self._state: Tuple[List[Tuple[object, float, float, object]], Optional[_KDTree]] = ([], None)
+        self.rebuilds = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._state[0])
+
+    def ensure(
+        self,
+        conn: sqlite3.Connection,
+        version: object,
+        lat_col: str,
+        lon_col: str,
+        id_col: str = "",
+        juld_col: str = "",
+        table: str = "traj_rel",
+    ) -> None:
+        key = (version, table, lat_col, lon_col, id_col, juld_col)
+        if self._version == key:
+            return
+        with self._lock:
+            if self._version == key:
+                return
+            entries = self._load(conn, table, lat_col, lon_col, id_col, juld_col)
+            tree = _KDTree([_to_unit_vector(lat, lon) for _, lat, lon, _ in entries])
+            self._state = (entries, tree)
+            self._version = key
+            self.rebuilds += 1
+
+    def _load(self, conn, table, lat_col, lon_col, id_col, juld_col):
+        where = (
+            f"{lat_col} IS NOT NULL AND {lon_col} IS NOT NULL "
+            f"AND {lat_col} BETWEEN -90 AND 90 AND {lon_col} BETWEEN -180 AND 360"
+        )
+        if id_col:
+            # SQLite returns the bare columns from the row holding MAX(), i.e. the latest fix per float.
+            latest = f"MAX({juld_col})" if juld_col else "MAX(rowid)"
+            juld_expr = juld_col if juld_col else "NULL"
+            sql = (
+                f"SELECT {id_col}, {lat_col}, {lon_col}, {juld_expr}, {latest} FROM {table} "
+                f"WHERE {where} GROUP BY {id_col};"
+            )
+        else:
+            juld_expr = juld_col if juld_col else "NULL"
+            sql = f"SELECT rowid, {lat_col}, {lon_col}, {juld_expr} FROM {table} WHERE {where};"
+        rows = conn.execute(sql).fetchall()
+        return [(row[0], float(row[1]), float(row[2]), row[3]) for row in rows]
+
+    def nearest(self, lat: float, lon: float, k: int = 5) -> List[Tuple[object, float, float, object, float]]:
+        entries, tree = self._state
+        if tree is None or not entries:
+            return []
+        hits = tree.query(_to_unit_vector(lat, lon), max(1, k))
+        results = []
+        for _, index in hits:
+            ident, p_lat, p_lon, juld = entries[index]
+            results.append((ident, p_lat, p_lon, juld, haversine_km(lat, lon, p_lat, p_lon)))
+        return results
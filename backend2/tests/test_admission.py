@@ -0,0 +1,72 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, CostEstimator
+from schema_catalog import SchemaCatalog
+
+
+@pytest.fixture
+def classify(tmp_path):
+    path = str(tmp_path / "argo.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE prof_rel (PLATFORM_NUMBER INTEGER, CYCLE_NUMBER REAL, PRES REAL)")
+    conn.execute("CREATE INDEX idx_prof_platform ON prof_rel (PLATFORM_NUMBER)")
+    conn.executemany("INSERT INTO prof_rel VALUES (?, ?, ?)", [(i % 50, i // 50, float(i)) for i in range(5000)])
+    conn.execute("ANALYZE")
+    conn.commit()
+    snapshot = SchemaCatalog(path).get(conn)
+    estimator = CostEstimator(cheap_max_rows=500, heavy_min_rows=4000)
+    yield lambda sql: estimator.classify(conn, sql, snapshot)
+    conn.close()
+
+
+def test_plans_are_classed_by_rows_visited(classify):
+    assert classify("SELECT PRES FROM prof_rel WHERE PLATFORM_NUMBER = 7")["class"] == "cheap"
+    assert classify("SELECT AVG(PRES) FROM prof_rel")["class"] == "heavy"
+    self_join = "SELECT COUNT(*) FROM prof_rel a JOIN prof_rel b ON a.PLATFORM_NUMBER = b.PLATFORM_NUMBER"
+    assert classify(self_join)["estimated_rows"] > 5000
+
+
+def test_over_cost_plan_is_rejected_when_its_class_is_full(classify):
+    controller = AdmissionController({"cheap": 4, "medium": 1, "heavy": 1}, max_queue=1, queue_timeout=5)
+    heavy = classify("SELECT AVG(PRES) FROM prof_rel")["class"]
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.slot(heavy):
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(hold())
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.slot(heavy):
+                pass
+        # Cheap queries are not held up by the full heavy class.
+        async with controller.slot("cheap"):
+            pass
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.query_class == "heavy" and rejected.reason == "queue full"
+    stats = controller.stats()
+    assert stats["heavy"]["rejected"] == 1 and stats["heavy"]["admitted"] == 2 and stats["cheap"]["admitted"] == 1
+
+
+def test_queue_timeout_rejects(classify):
+    controller = AdmissionController({"heavy": 1}, max_queue=4, queue_timeout=0.05)
+
+    async def scenario():
+        async with controller.slot("heavy"):
+            with pytest.raises(AdmissionRejected, match="waited"):
+                async with controller.slot("heavy"):
+                    pass
+
+    asyncio.run(scenario())
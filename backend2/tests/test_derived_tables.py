@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+from derived_tables import refresh_profile_grid, refresh_profile_summary
+from ingest import create_tables
+
+# One delayed-mode profile (adjusted values differ from raw) and one real-time profile, both in the
+# 0-10 dbar band of the same month and grid cell.
+LEVELS = [
+    (2902115, 1.0, 2.0, 25.0, 35.1, 2.5, 24.6, 35.2, "D"),
+    (2902115, 1.0, 8.0, 24.0, 35.2, 8.5, 23.7, 35.3, "D"),
+    (2902116, 1.0, 3.0, 26.0, 35.0, None, None, None, "R"),
+]
+
+
+@pytest.fixture
+def conn():
+    connection = sqlite3.connect(":memory:", isolation_level=None)
+    create_tables(connection)
+    connection.executemany(
+        "INSERT INTO prof_rel (PLATFORM_NUMBER, CYCLE_NUMBER, JULD, LATITUDE, LONGITUDE, PRES, TEMP, PSAL, "
+        "PRES_ADJUSTED, TEMP_ADJUSTED, PSAL_ADJUSTED, DATA_MODE) VALUES (?, ?, '2023-03-04', 12.1, 68.2, ?, ?, ?, ?, ?, ?, ?)",
+        LEVELS,
+    )
+    refresh_profile_summary(connection)
+    refresh_profile_grid(connection)
+    yield connection
+    connection.close()
+
+
+def test_summary_uses_adjusted_values(conn):
+    row = conn.execute(
+        "SELECT SURFACE_PRES, SURFACE_TEMP, BOTTOM_PSAL, TEMP_MAX FROM prof_summary WHERE PLATFORM_NUMBER = 2902115"
+    ).fetchone()
+    assert row == (2.5, 24.6, 35.3, 24.6)
+
+
+def test_summary_and_grid_agree(conn):
+    summary = conn.execute(
+        "SELECT SUM(N_LEVELS), SUM(TEMP_MEAN * N_LEVELS), MIN(TEMP_MIN), MAX(TEMP_MAX), MIN(PSAL_MIN), MAX(PSAL_MAX) "
+        "FROM prof_summary"
+    ).fetchone()
+    grid = conn.execute(
+        "SELECT SUM(TEMP_N), SUM(TEMP_SUM), MIN(TEMP_MIN), MAX(TEMP_MAX), MIN(PSAL_MIN), MAX(PSAL_MAX) FROM prof_grid"
+    ).fetchone()
+    assert summary == pytest.approx(grid)
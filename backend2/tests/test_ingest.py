@@ -0,0 +1,83 @@
+import io
+import os
+import sqlite3
+
+import pytest
+
+import ingest
+from ingest import TABLE_COLUMNS, BulkLoader, create_tables
+
+
+def rows(count, fail_after=None):
+    width = len(TABLE_COLUMNS["prof_rel"])
+    for index in range(count):
+        if fail_after is not None and index == fail_after:
+            raise ValueError("truncated file")
+        yield (index,) * width
+
+
+@pytest.fixture
+def conn():
+    connection = sqlite3.connect(":memory:", isolation_level=None)
+    create_tables(connection)
+    yield connection
+    connection.close()
+
+
+def count(conn):
+    return conn.execute("SELECT COUNT(*) FROM prof_rel;").fetchone()[0]
+
+
+def test_failed_file_is_rolled_back_even_past_commit_rows(conn):
+    loader = BulkLoader(conn, batch_rows=2, commit_rows=3, out=io.StringIO())
+    with loader.file_transaction():
+        loader.load("prof_rel", rows(4))
+    with pytest.raises(ValueError):
+        with loader.file_transaction():
+            loader.load("prof_rel", rows(10, fail_after=7))
+    loader.commit()
+    assert count(conn) == 4
+    assert loader.rows_by_table["prof_rel"] == 4
+
+
+def test_commits_happen_between_files(conn):
+    loader = BulkLoader(conn, batch_rows=1, commit_rows=2, out=io.StringIO())
+    with loader.file_transaction():
+        loader.load("prof_rel", rows(5))
+        assert conn.in_transaction
+    assert loader._uncommitted == 0
+    loader.commit()
+    assert count(conn) == 5
+
+
+def test_publish_closes_both_connections_before_removing_the_build(tmp_path, monkeypatch):
+    build_path, db_path = str(tmp_path / "build.db"), str(tmp_path / "argo.db")
+    for path, value in ((build_path, "new"), (db_path, "old")):
+        with sqlite3.connect(path) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS t (v TEXT)")
+            connection.execute("INSERT INTO t VALUES (?)", (value,))
+        connection.close()
+
+    opened = []
+    connect = sqlite3.connect
+
+    def tracking_connect(*args, **kwargs):
+        opened.append(connect(*args, **kwargs))
+        return opened[-1]
+
+    def checked_remove(path):
+        # What Windows enforces: an open database file cannot be deleted.
+        for connection in opened:
+            with pytest.raises(sqlite3.ProgrammingError):
+                connection.execute("SELECT 1")
+        os.unlink(path)
+
+    monkeypatch.setattr(ingest.sqlite3, "connect", tracking_connect)
+    monkeypatch.setattr(ingest.os, "remove", checked_remove)
+    ingest._publish(build_path, db_path)
+    monkeypatch.undo()
+
+    assert len(opened) == 2 and not os.path.exists(build_path)
+    with sqlite3.connect(db_path) as connection:
+        assert connection.execute("SELECT v FROM t").fetchall() == [("new",)]
+    connection.close()
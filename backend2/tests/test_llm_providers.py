@@ -0,0 +1,248 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from llm_providers import Provider, ProviderManager, ProviderUnavailable
+
+PRIMARY = Provider("primary", "k1", "model-a", "http://primary.test/v1/chat/completions")
+BACKUP = Provider("backup", "k2", "model-b", "http://backup.test/v1/chat/completions")
+BODY = {"messages": [{"role": "user", "content": "hi"}]}
+
+
+class StubProvider:
+    """OpenAI-compatible chat completions endpoint; `behaviour` is "ok", a status code or a delay in seconds."""
+
+    def __init__(self):
+        self.behaviour = {"primary.test": "ok", "backup.test": "ok"}
+        self.calls = {"primary.test": 0, "backup.test": 0}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.calls[host] += 1
+        body = json.loads(request.content)
+        behaviour = self.behaviour[host]
+        if isinstance(behaviour, float):
+            await asyncio.sleep(behaviour)
+        elif isinstance(behaviour, int):
+            return httpx.Response(behaviour, json={"error": "stub"})
+        content = f"answer from {body['model']}"
+        if body.get("stream"):
+            chunks = [json.dumps({"choices": [{"delta": {"content": word + " "}}]}) for word in content.split()]
+            text = "".join(f"data: {chunk}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+            return httpx.Response(200, text=text, headers={"Content-Type": "text/event-stream"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def run(stub, test, providers=(PRIMARY, BACKUP), **options):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(stub)) as client:
+            settings = {"retry_base": 0.001, "retry_max": 0.001, "hedge_max_delay": 5.0, **options}
+            return await test(ProviderManager(client, list(providers), **settings))
+
+    return asyncio.run(main())
+
+
+def answer(data):
+    return data["choices"][0]["message"]["content"]
+
+
+def test_first_provider_answers_without_hedge():
+    stub = StubProvider()
+
+    async def test(manager):
+        assert answer(await manager.complete(BODY)) == "answer from model-a"
+        return manager.stats()["providers"]
+
+    stats = run(stub, test)
+    assert stub.calls == {"primary.test": 1, "backup.test": 0}
+    assert stats["primary"]["hedges"] == stats["backup"]["hedges"] == 0
+
+
+def test_slow_primary_is_hedged_and_backup_wins():
+    stub = StubProvider()
+    stub.behaviour["primary.test"] = 2.0
+
+    async def test(manager):
+        started = asyncio.get_running_loop().time()
+        data = await manager.complete(BODY)
+        return data, asyncio.get_running_loop().time() - started, manager.stats()["providers"]["backup"]
+
+    data, elapsed, backup = run(stub, test, hedge_max_delay=0.05)
+    assert answer(data) == "answer from model-b"
+    assert elapsed < 1.0
+    assert backup["hedges"] == 1 and backup["hedge_wins"] == 1
+
+
+def test_hedge_delay_follows_observed_latency():
+    stub = StubProvider()
+
+    async def test(manager):
+        for _ in range(5):
+            await manager.complete(BODY)
+        return manager.stats()["providers"]["primary"]["hedge_delay_seconds"]
+
+    assert run(stub, test, min_samples=5, hedge_min_delay=0.2, hedge_max_delay=3.0) == 0.2
+
+
+def test_single_provider_hedges_to_itself():
+    stub = StubProvider()
+    stub.behaviour["primary.test"] = 0.3
+
+    async def test(manager):
+        await manager.complete(BODY)
+        return manager.stats()["providers"]["primary"]
+
+    stats = run(stub, test, providers=(PRIMARY,), hedge_max_delay=0.05)
+    assert stub.calls["primary.test"] == 2
+    assert stats["hedges"] == 1
+
+
+def test_failing_primary_fails_over_within_the_round():
+    stub = StubProvider()
+    stub.behaviour["primary.test"] = 503
+
+    async def test(manager):
+        data = await manager.complete(BODY)
+        return data, manager.stats()
+
+    data, stats = run(stub, test)
+    assert answer(data) == "answer from model-b"
+    assert stats["retries"] == 0
+    assert stats["providers"]["backup"]["failovers"] == 1
+
+
+def test_breaker_opens_skips_provider_and_recovers_after_cooldown():
+    stub = StubProvider()
+    stub.behaviour["primary.test"] = 500
+
+    async def test(manager):
+        for _ in range(3):
+            await manager.complete(BODY)
+        opened = manager.stats()["providers"]["primary"]["breaker"]
+        calls_when_open = stub.calls["primary.test"]
+        await manager.complete(BODY)
+        skipped = stub.calls["primary.test"] == calls_when_open
+        stub.behaviour["primary.test"] = "ok"
+        await asyncio.sleep(0.06)
+        data = await manager.complete(BODY)
+        return opened, skipped, answer(data), manager.stats()["providers"]["primary"]["breaker"]
+
+    opened, skipped, recovered_answer, state = run(stub, test, breaker_failures=2, breaker_cooldown=0.05)
+    assert opened == "open"
+    assert skipped
+    assert recovered_answer == "answer from model-a"
+    assert state == "closed"
+
+
+def test_failed_half_open_trial_reopens_breaker():
+    stub = StubProvider()
+    stub.behaviour["primary.test"] = 500
+
+    async def test(manager):
+        await manager.complete(BODY)
+        await asyncio.sleep(0.06)
+        await manager.complete(BODY)
+        return manager.stats()["providers"]["primary"]
+
+    stats = run(stub, test, breaker_failures=1, breaker_cooldown=0.05)
+    assert stats["breaker"] == "open"
+    assert stats["breaker_trips"] == 2
+
+
+def test_client_errors_do_not_open_the_breaker():
+    stub = StubProvider()
+    stub.behaviour["primary.test"] = 400
+
+    async def test(manager):
+        for _ in range(3):
+            await manager.complete(BODY)
+        return manager.stats()["providers"]["primary"]
+
+    stats = run(stub, test, breaker_failures=1)
+    assert stats["breaker"] == "closed"
+    assert stats["failures"] == 3
+
+
+def test_non_retryable_status_is_not_retried():
+    stub = StubProvider()
+    stub.behaviour = {"primary.test": 401, "backup.test": 401}
+
+    async def test(manager):
+        with pytest.raises(ProviderUnavailable):
+            await manager.complete(BODY)
+        return manager.stats()
+
+    stats = run(stub, test, max_retries=3)
+    assert stats["retries"] == 0
+    assert stub.calls == {"primary.test": 1, "backup.test": 1}
+
+
+def test_retries_are_bounded_when_every_provider_fails():
+    stub = StubProvider()
+    stub.behaviour = {"primary.test": 503, "backup.test": 503}
+
+    async def test(manager):
+        with pytest.raises(ProviderUnavailable):
+            await manager.complete(BODY)
+        return manager.stats()
+
+    stats = run(stub, test, max_retries=2, breaker_failures=100)
+    assert stats["retries"] == 2
+    assert stats["exhausted"] == 1
+    assert stub.calls == {"primary.test": 3, "backup.test": 3}
+
+
+def test_deadline_bounds_tail_latency():
+    stub = StubProvider()
+    stub.behaviour = {"primary.test": 5.0, "backup.test": 5.0}
+
+    async def test(manager):
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(ProviderUnavailable):
+            await manager.complete(BODY)
+        return asyncio.get_running_loop().time() - started
+
+    assert run(stub, test, hedge_max_delay=0.05, deadline=0.3) < 1.0
+
+
+def test_stream_fails_over_before_first_token():
+    stub = StubProvider()
+    stub.behaviour["primary.test"] = 502
+
+    async def test(manager):
+        text = "".join([delta async for delta in manager.stream(BODY)])
+        return text, manager.stats()["providers"]["backup"]
+
+    text, backup = run(stub, test)
+    assert text.strip() == "answer from model-b"
+    assert backup["failovers"] == 1
+
+
+def test_stream_closed_mid_answer_releases_half_open_trial():
+    stub = StubProvider()
+
+    async def test(manager):
+        breaker = manager._states[0].breaker
+        breaker.failure()
+        await asyncio.sleep(0.06)
+        assert breaker.state == "half_open"
+        chunks = manager.stream(BODY)
+        await chunks.__anext__()
+        await chunks.aclose()
+        return breaker.state, breaker.available()
+
+    assert run(stub, test, providers=(PRIMARY,), breaker_failures=1, breaker_cooldown=0.05) == ("half_open", True)
+
+
+def test_stream_with_empty_choices_yields_nothing():
+    async def empty_choices(request):
+        return httpx.Response(200, text='data: {"choices": []}\n\ndata: [DONE]\n\n')
+
+    async def test(manager):
+        assert [delta async for delta in manager.stream(BODY)] == []
+        return manager.stats()["providers"]["primary"]
+
+    stats = run(empty_choices, test, providers=(PRIMARY,))
+    assert stats["successes"] == 1
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+from nl_templates import default_registry, extract_date_range, extract_slots
+
+TODAY = date(2024, 5, 20)
+
+
+@pytest.mark.parametrize(
+    "prompt, expected",
+    [
+        ("temperature between 2023-01-15 and 2023-02-10", (date(2023, 1, 15), date(2023, 2, 11))),
+        ("salinity since 2024-03", (date(2024, 3, 1), date(2024, 5, 21))),
+        ("profiles in March 2023", (date(2023, 3, 1), date(2023, 4, 1))),
+        ("floats in 2022", (date(2022, 1, 1), date(2023, 1, 1))),
+        ("data from the last month", (date(2024, 4, 1), date(2024, 5, 1))),
+        ("past 30 days", (date(2024, 4, 21), date(2024, 5, 21))),
+    ],
+)
+def test_date_ranges(prompt, expected):
+    assert extract_date_range(prompt, TODAY) == expected
+
+
+@pytest.mark.parametrize(
+    "prompt",
+    [
+        "average temperature between 2023-01-15 and 2023-02-30",
+        "mean temp since 2023-13",
+        "salinity in the arabian sea past 5000 years",
+        "temperature past 99999999999 days",
+    ],
+)
+def test_unparseable_dates_drop_the_slot(prompt):
+    assert extract_date_range(prompt, TODAY) is None
+    assert "date_range" not in extract_slots(prompt, today=TODAY)
+
+
+@pytest.mark.parametrize(
+    "prompt",
+    [
+        "temperature profile of float 2902115 between 2023-01-01 and 2023-02-01",
+        "average salinity in the arabian sea per month in 2023",
+        "max temperature of float 2902115 for each cycle",
+        "average temperature not in the arabian sea",
+        "list floats in the arabian sea with temperature above 30",
+        "which float has the highest temperature in the arabian sea",
+        "average temperature in the arabian sea in 2023 compared with 2022",
+    ],
+)
+def test_unmodelled_wording_falls_through(prompt):
+    assert default_registry().match(prompt, None, today=TODAY) is None
+
+
+def test_statistic_of_one_cycle_is_not_a_profile():
+    result = default_registry().match("average temperature of float 2902115 cycle 3", None, today=TODAY)
+    assert result["template"] == "variable_statistic"
+    assert "AVG(" in result["sql"] and "CYCLE_NUMBER = 3" in result["sql"]
+
+
+@pytest.mark.parametrize(
+    "prompt, template",
+    [
+        ("salinity profile of float 2902115 cycle 3 between 0 and 100 m", "profile_of_cycle"),
+        ("maximum temperature in the bay of bengal below 500 m", "variable_statistic"),
+        ("which floats are in the bay of bengal during June 2023", "floats_in_region"),
+        ("latest profile for float 2902101", "latest_profile"),
+    ],
+)
+def test_slot_phrases_are_not_modifiers(prompt, template):
+    assert default_registry().match(prompt, None, today=TODAY)["template"] == template
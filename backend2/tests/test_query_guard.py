@@ -0,0 +1,50 @@
+import sqlite3
+import threading
+
+import pytest
+
+from query_guard import CancelToken, QueryCancelled, QueryTooExpensive, StatementBudget
+
+RUNAWAY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+
+
+@pytest.fixture
+def conn():
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    yield connection
+    connection.close()
+
+
+def test_step_budget_aborts_runaway_statement(conn):
+    budget = StatementBudget(max_steps=200_000, interval=1000)
+    with pytest.raises(QueryTooExpensive) as aborted:
+        with budget.guard(conn):
+            conn.execute(RUNAWAY).fetchall()
+    assert aborted.value.reason == "steps" and aborted.value.vm_steps > 200_000
+    # The handler is removed again, so the pooled connection keeps working.
+    assert conn.execute("SELECT 1").fetchone() == (1,)
+
+
+def test_time_budget_aborts_runaway_statement(conn):
+    with pytest.raises(QueryTooExpensive) as aborted:
+        with StatementBudget(max_seconds=0.2).guard(conn):
+            conn.execute(RUNAWAY).fetchall()
+    assert aborted.value.reason == "time" and aborted.value.elapsed_seconds < 5
+
+
+def test_cancel_token_stops_statement_from_another_thread(conn):
+    token = CancelToken()
+    timer = threading.Timer(0.1, token.cancel, args=("client_disconnected",))
+    timer.start()
+    with pytest.raises(QueryCancelled, match="client_disconnected"):
+        with StatementBudget(max_seconds=10, token=token).guard(conn):
+            conn.execute(RUNAWAY).fetchall()
+    timer.join()
+    with pytest.raises(QueryCancelled):
+        with StatementBudget(token=token).guard(conn):
+            pass
+
+
+def test_statement_within_budget_runs(conn):
+    with StatementBudget(max_seconds=5, max_steps=10_000_000).guard(conn):
+        assert conn.execute("SELECT COUNT(*) FROM (SELECT 1 UNION ALL SELECT 2)").fetchone() == (2,)
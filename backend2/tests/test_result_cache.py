@@ -0,0 +1,28 @@
+import sqlite3
+
+from data_versions import bump_versions, read_versions, versions_for
+from result_cache import ResultCache
+
+
+def test_entry_is_invalidated_by_a_version_bump_of_its_tables():
+    conn = sqlite3.connect(":memory:")
+    bump_versions(conn, {"prof_rel": 10, "traj_rel": 10})
+    cache = ResultCache()
+    version = lambda: versions_for(read_versions(conn), ["prof_rel"])
+    cache.put("avg temp", version(), {"rows": [[12.5]]})
+    assert cache.get("avg temp", version()) == {"rows": [[12.5]]}
+
+    bump_versions(conn, {"traj_rel": 3})
+    assert cache.get("avg temp", version()) == {"rows": [[12.5]]}
+
+    bump_versions(conn, {"prof_rel": 3})
+    assert cache.get("avg temp", version()) is None
+    assert cache.invalidations == 1 and cache.stats()["entries"] == 0
+    conn.close()
+
+
+def test_expired_and_oversized_entries_are_not_served():
+    cache = ResultCache(max_bytes=1000, max_entry_bytes=100)
+    assert not cache.put("big", 1, "x" * 200)
+    cache.put("short", 1, "value", ttl_seconds=-1)
+    assert cache.get("short", 1) is None and cache.expirations == 1
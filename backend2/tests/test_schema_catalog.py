@@ -0,0 +1,33 @@
+import sqlite3
+
+from schema_catalog import SchemaCatalog
+
+
+def test_snapshot_follows_commits_and_reads_only_indexed_ranges(tmp_path):
+    path = str(tmp_path / "argo.db")
+    writer = sqlite3.connect(path)
+    writer.execute("CREATE TABLE prof_rel (PLATFORM_NUMBER INTEGER, PRES REAL, TEMP REAL)")
+    writer.execute("CREATE INDEX idx_prof_platform ON prof_rel (PLATFORM_NUMBER)")
+    writer.executemany("INSERT INTO prof_rel VALUES (?, ?, ?)", [(2902100 + i, 5.0 * i, 20.0 - i) for i in range(10)])
+    writer.commit()
+
+    catalog = SchemaCatalog(path)
+    reader = sqlite3.connect(path)
+    first = catalog.get(reader)
+    info = first.table("prof_rel")
+    assert info.row_count == 10
+    assert (info.column("PLATFORM_NUMBER").min_value, info.column("PLATFORM_NUMBER").max_value) == (2902100, 2902109)
+    assert info.column("TEMP").min_value is None
+    assert catalog.get(reader) is first
+
+    writer.execute("INSERT INTO prof_rel VALUES (2902200, 1.0, 1.0)")
+    writer.commit()
+    second = catalog.get(reader)
+    assert second is not first and second.table("prof_rel").column("PLATFORM_NUMBER").max_value == 2902200
+
+    writer.execute("ANALYZE")
+    writer.commit()
+    assert catalog.get(reader).table("prof_rel").row_count == 11
+    catalog.close()
+    reader.close()
+    writer.close()
@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from schema_catalog import SchemaCatalog
+from schema_selector import SchemaSelector
+
+TABLES = {
+    "prof_rel": "PLATFORM_NUMBER INTEGER, CYCLE_NUMBER REAL, JULD TEXT, JULD_EPOCH REAL, LATITUDE REAL, "
+    "LONGITUDE REAL, PRES REAL, TEMP REAL, PSAL REAL, PRES_ADJUSTED REAL, TEMP_ADJUSTED REAL, "
+    "PSAL_ADJUSTED REAL, DATA_MODE TEXT",
+    "traj_rel": "PLATFORM_NUMBER INTEGER, CYCLE_NUMBER REAL, JULD TEXT, LATITUDE REAL, LONGITUDE REAL, "
+    "POSITIONING_SYSTEM TEXT",
+    "tech_rel": "PLATFORM_NUMBER INTEGER, CYCLE_NUMBER REAL, TECHNICAL_PARAMETER_NAME TEXT, "
+    "TECHNICAL_PARAMETER_VALUE TEXT",
+    "meta_rel": "PLATFORM_NUMBER INTEGER, LAUNCH_DATE TEXT, DATA_CENTRE TEXT, PROJECT_NAME TEXT, PI_NAME TEXT",
+}
+MEASUREMENTS = {"PRES", "TEMP", "PSAL", "PRES_ADJUSTED", "TEMP_ADJUSTED", "PSAL_ADJUSTED", "LATITUDE", "LONGITUDE", "JULD"}
+
+
+@pytest.fixture
+def selected(tmp_path):
+    path = str(tmp_path / "argo.db")
+    conn = sqlite3.connect(path)
+    for name, columns in TABLES.items():
+        conn.execute(f"CREATE TABLE {name} ({columns})")
+    conn.execute("INSERT INTO meta_rel VALUES (2902115, '2022-01-05', 'IN', 'INCOIS Argo', 'M Ravichandran')")
+    conn.commit()
+    snapshot = SchemaCatalog(path).get(conn)
+    selector = SchemaSelector()
+    yield lambda prompt: selector.select(snapshot, prompt, conn)
+    conn.close()
+
+
+def _columns(selection, table):
+    line = next(line for line in selection["schema"].splitlines() if line.startswith(table + "("))
+    return {part.strip().split()[0] for part in line[len(table) + 1:-1].split(",")}
+
+
+def test_profiles_keep_measurement_columns(selected):
+    selection = selected("show profiles of float 2902115 in 2023")
+    assert "prof_rel" in selection["tables"]
+    assert MEASUREMENTS <= _columns(selection, "prof_rel")
+
+
+def test_measurement_question_keeps_profile_table(selected):
+    selection = selected("what did float 2902115 measure in its last cycle")
+    assert "prof_rel" in selection["tables"]
+    assert MEASUREMENTS <= _columns(selection, "prof_rel")
+
+
+def test_metadata_question_keeps_every_metadata_column(selected):
+    selection = selected("which floats were deployed by INCOIS")
+    assert selection["tables"] == ["meta_rel"]
+    assert {"DATA_CENTRE", "PROJECT_NAME", "PI_NAME", "LAUNCH_DATE"} <= _columns(selection, "meta_rel")
+    assert selection["pruned"]
@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+from db_pool import SQLitePool
+from semantic_cache import SemanticCache
+
+SQL = "SELECT AVG(TEMP) FROM prof_rel WHERE PLATFORM_NUMBER = 2902115"
+
+
+def test_paraphrase_reuses_sql_with_literals_rebound():
+    cache = SemanticCache(threshold=0.5)
+    cache.add("average temperature of float 2902115", "h", SQL)
+    hit = cache.lookup("mean temperature for float 2902116", "h")
+    assert hit is not None and "2902116" in hit["sql"]
+
+
+def test_different_signature_is_never_reused():
+    cache = SemanticCache(threshold=0.1)
+    cache.add("average temperature of float 2902115", "h", SQL)
+    assert cache.lookup("average salinity of float 2902115", "h") is None
+    assert cache.lookup("average temperature of float 2902115 below 20", "h") is None
+    assert cache.lookup("average temperature of float 2902115", "other schema") is None
+
+
+def test_audit_from_stream_survives_the_stream_closing(tmp_path, monkeypatch):
+    path = str(tmp_path / "argo.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE prof_rel (PLATFORM_NUMBER INTEGER, TEMP REAL)")
+        conn.execute("INSERT INTO prof_rel VALUES (2902115, 12.5)")
+    cache = SemanticCache()
+    cache.add("average temperature of float 2902115", "h", SQL)
+    similar = cache.lookup("average temperature of float 2902115", "h")
+
+    async def translate(prompt, schema, hints=""):
+        await asyncio.sleep(0.05)
+        return SQL
+
+    async def event_stream(user_query):
+        main._schedule_semantic_audit(similar, user_query, {"schema": "", "schema_hints": ""})
+        yield "event: done\n\n"
+
+    async def scenario():
+        async for _ in main._guarded_event_stream("average temperature of float 2902115"):
+            pass
+        await asyncio.gather(*main._semantic_audits)
+
+    pool = SQLitePool(path, max_size=2)
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(main, "db_pool", pool)
+    monkeypatch.setattr(main, "db_executor", executor)
+    monkeypatch.setattr(main, "semantic_cache", cache)
+    monkeypatch.setattr(main, "_resolve_llm_provider", lambda: "stub")
+    monkeypatch.setattr(main, "_nl_to_sql_with_grok", translate)
+    monkeypatch.setattr(main, "_query_event_stream", event_stream)
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+        pool.close()
+    assert cache.audit_log()[0]["verdict"] == "correct"
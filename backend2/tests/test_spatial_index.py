@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+from spatial_index import FloatPositionIndex
+
+
+@pytest.fixture
+def conn():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE traj_rel (PLATFORM_NUMBER INTEGER, LATITUDE REAL, LONGITUDE REAL, JULD REAL);")
+    connection.executemany(
+        "INSERT INTO traj_rel VALUES (?, ?, ?, ?);",
+        [(1, 0.0, 0.0, 1), (1, 10.0, 80.0, 2), (2, 13.0, 80.3, 1), (3, -30.0, 150.0, 1), (3, -31.0, 151.0, 2)],
+    )
+    yield connection
+    connection.close()
+
+
+def test_nearest_uses_latest_position_per_float(conn):
+    index = FloatPositionIndex()
+    index.ensure(conn, 1, "LATITUDE", "LONGITUDE", "PLATFORM_NUMBER", "JULD")
+    assert index.size == 3
+    hits = index.nearest(13.08, 80.27, k=2)
+    assert [hit[0] for hit in hits] == [2, 1]
+    assert hits[0][4] < 10
+
+
+def test_rebuild_publishes_entries_and_tree_together(conn):
+    index = FloatPositionIndex()
+    index.ensure(conn, 1, "LATITUDE", "LONGITUDE", "PLATFORM_NUMBER", "JULD")
+    before = index._state
+    conn.execute("INSERT INTO traj_rel VALUES (4, 13.1, 80.2, 1);")
+    index.ensure(conn, 2, "LATITUDE", "LONGITUDE", "PLATFORM_NUMBER", "JULD")
+    assert index._state is not before and index.rebuilds == 2
+    assert index.size == 4
+    assert index.nearest(13.1, 80.2, k=1)[0][0] == 4
+
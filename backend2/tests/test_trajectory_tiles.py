@@ -0,0 +1,93 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from trajectory_tiles import TrajectoryIndex, _segment_distance, douglas_peucker_significance, mercator, zoom_tolerance
+
+COLUMNS = ("LATITUDE", "LONGITUDE", "PLATFORM_NUMBER", "JULD")
+
+
+@pytest.fixture
+def conn():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE traj_rel (PLATFORM_NUMBER INTEGER, LATITUDE REAL, LONGITUDE REAL, JULD REAL);")
+    connection.executemany(
+        "INSERT INTO traj_rel VALUES (?, ?, ?, ?);",
+        [(1, 0.0, 0.0, 1), (1, 10.0, 80.0, 2), (2, 13.0, 80.3, 1), (3, -30.0, 150.0, 1), (3, -31.0, 151.0, 2)],
+    )
+    yield connection
+    connection.close()
+
+
+def _douglas_peucker(x, y, tolerance):
+    kept = {0, len(x) - 1}
+
+    def split(first, last):
+        if last - first < 2:
+            return
+        interior = np.arange(first + 1, last)
+        distance = _segment_distance(x[interior], y[interior], x[first], y[first], x[last], y[last])
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            kept.add(int(interior[farthest]))
+            split(first, int(interior[farthest]))
+            split(int(interior[farthest]), last)
+
+    split(0, len(x) - 1)
+    return sorted(kept)
+
+
+def test_significance_reproduces_douglas_peucker_at_every_tolerance():
+    rng = np.random.default_rng(7)
+    lat = np.cumsum(rng.normal(0, 0.3, 200))
+    lon = 60 + np.cumsum(rng.normal(0.05, 0.3, 200))
+    x, y = mercator(lat, lon)
+    significance = douglas_peucker_significance(x, y, np.array([0]))
+    for zoom in (0, 3, 6, 9, 12):
+        tolerance = zoom_tolerance(zoom, 1.0)
+        assert list(np.flatnonzero(significance > tolerance)) == _douglas_peucker(x, y, tolerance)
+
+
+def test_trajectory_keeps_more_points_at_higher_zoom(conn):
+    rng = np.random.default_rng(3)
+    lat = np.cumsum(rng.normal(0, 0.2, 300))
+    lon = 70 + np.cumsum(rng.normal(0, 0.2, 300))
+    conn.executemany("INSERT INTO traj_rel VALUES (9, ?, ?, ?);", [(a, o, t) for t, (a, o) in enumerate(zip(lat, lon))])
+    index = TrajectoryIndex()
+    index.ensure(conn, 1, *COLUMNS)
+    counts = [len(index.trajectory(9, zoom=zoom, max_points=1000)["points"]) for zoom in (0, 4, 8, 12, 16)]
+    assert counts == sorted(counts) and counts[0] < counts[-1] == 300
+    coarse = index.trajectory(9, zoom=0, max_points=1000)["points"]
+    assert coarse[0][2] == 0 and coarse[-1][2] == 299
+
+
+def test_tile_clips_to_its_bounds_and_keeps_one_neighbour(conn):
+    conn.executemany(
+        "INSERT INTO traj_rel VALUES (5, ?, ?, ?);",
+        [(20.0, 10.0, 1), (40.0, 100.0, 2), (5.0, 170.0, 3), (50.0, -100.0, 4), (30.0, -150.0, 5), (25.0, 40.0, 6)],
+    )
+    index = TrajectoryIndex()
+    index.ensure(conn, 1, *COLUMNS)
+    # Zoom 2, tile (2, 1) covers 0..90E, 0..66.5N.
+    tile = index.tile(2, 2, 1, max_points=100)
+    lines = {entry["platform_number"]: entry["lines"] for entry in tile["floats"]}
+    assert set(lines) == {1, 2, 5}
+    assert lines[2] == [[[13.0, 80.3]]]
+    # Fixes outside the tile are dropped except the neighbours that carry a line across its edge.
+    assert lines[5] == [[[20.0, 10.0], [40.0, 100.0]], [[30.0, -150.0], [25.0, 40.0]]]
+    # Float 1's first fix is on the tile's corner; the next one is inside, so the line is drawn whole.
+    assert lines[1] == [[[0.0, 0.0], [10.0, 80.0]]]
+    assert index.tile(2, 3, 2, max_points=100)["floats"][0]["platform_number"] == 3
+
+
+def test_trajectory_index_rebuild_swaps_whole_build(conn):
+    index = TrajectoryIndex()
+    index.ensure(conn, 1, *COLUMNS)
+    first = index._tracks
+    assert index.trajectory(3, zoom=16, max_points=100)["total_points"] == 2
+    conn.execute("INSERT INTO traj_rel VALUES (3, -32.0, 152.0, 3);")
+    index.ensure(conn, 2, *COLUMNS)
+    assert index._tracks is not first
+    assert index.trajectory(3, zoom=16, max_points=100)["total_points"] == 3
+    assert index.stats()["points"] == 6
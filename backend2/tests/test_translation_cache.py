@@ -0,0 +1,26 @@
+from translation_cache import TranslationCache, cache_key, normalize_prompt
+
+
+def test_normalize_folds_case_and_punctuation():
+    assert normalize_prompt("  Show   floats, near  Chennai? ") == "show floats near chennai"
+    assert normalize_prompt("temp -1.5") == "temp -1.5"
+
+
+def test_comparison_operators_stay_in_the_key():
+    assert normalize_prompt("temp > 20") != normalize_prompt("temp < 20")
+    assert normalize_prompt("psal>=35") == "psal >= 35"
+    assert cache_key("temp > 20", "h") != cache_key("temp < 20", "h")
+
+
+def test_entries_survive_reopen_and_discard(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = TranslationCache(path)
+    cache.put("Max depth per float", "h", "SELECT 1")
+    cache.close()
+
+    cache = TranslationCache(path)
+    assert cache.get("max depth per float!", "h") == "SELECT 1"
+    assert cache.get("max depth per float", "other") == ""
+    cache.discard("max depth per float", "h")
+    cache.close()
+    assert TranslationCache(path).get("max depth per float", "h") == ""
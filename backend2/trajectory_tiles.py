@@ -0,0 +1,277 @@
+import math
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+TILE_SIZE_PX = 256
+MAX_MERCATOR_LAT = 85.05112878
+
+# Points within this fraction of a tile outside its edges are still drawn, so lines meet across tiles.
+TILE_BUFFER = 1.0 / 16
+
+
+def mercator(lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Web-mercator coordinates normalised to [0, 1) (x east from -180, y south from the top)."""
+    phi = np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(phi) + 1.0 / np.cos(phi)) / math.pi) / 2.0
+    return x, y
+
+
+def zoom_tolerance(zoom: int, tolerance_px: float) -> float:
+    """Simplification tolerance for a zoom level, in normalised mercator units."""
+    return tolerance_px / (TILE_SIZE_PX * 2.0 ** zoom)
+
+
+def coordinate_digits(zoom: int) -> int:
+    # About one decimal finer than a pixel at this zoom; more only bloats the payload.
+    return int(min(6, max(2, 1 + math.ceil(math.log10(TILE_SIZE_PX * 2.0 ** zoom / 360.0)))))
+
+
+def _segment_distance(px, py, ax, ay, bx, by) -> np.ndarray:
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(length2 > 0, ((px - ax) * dx + (py - ay) * dy) / length2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def douglas_peucker_significance(x: np.ndarray, y: np.ndarray, starts: np.ndarray, floor: float = 0.0) -> np.ndarray:
+    """Douglas–Peucker run once for every tolerance: point i survives tolerance t iff significance[i] > t.
+
+    `starts` are the offsets of the individual lines in x/y. All lines are split level by level with
+    vectorized distance computations, and segments whose deviation is below `floor` are not split
+    further (their interior points get 0), which bounds the depth on long, nearly straight drifts.
+    """
+    n = len(x)
+    significance = np.zeros(n)
+    if n == 0:
+        return significance
+    ends = np.append(starts[1:], n) - 1
+    significance[starts] = np.inf
+    significance[ends] = np.inf
+
+    seg_start, seg_end = starts, ends
+    seg_parent = np.full(len(starts), np.inf)
+    while len(seg_start):
+        keep = seg_end - seg_start >= 2
+        seg_start, seg_end, seg_parent = seg_start[keep], seg_end[keep], seg_parent[keep]
+        if not len(seg_start):
+            break
+        sizes = seg_end - seg_start - 1
+        owner = np.repeat(np.arange(len(seg_start)), sizes)
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        interior = np.arange(len(owner)) - offsets[owner] + seg_start[owner] + 1
+
+        a, b = seg_start[owner], seg_end[owner]
+        distance = _segment_distance(x[interior], y[interior], x[a], y[a], x[b], y[b])
+        farthest = np.maximum.reduceat(distance, offsets)
+        candidates = np.flatnonzero(distance == farthest[owner])
+        _, first = np.unique(owner[candidates], return_index=True)
+        split = interior[candidates[first]]
+
+        # A point never outranks its parent, so thresholding reproduces Douglas–Peucker at that tolerance.
+        rank = np.minimum(farthest, seg_parent)
+        deep = rank > floor
+        significance[split[deep]] = rank[deep]
+        split, rank = split[deep], rank[deep]
+        seg_start, seg_end, seg_parent = (
+            np.concatenate((seg_start[deep], split)),
+            np.concatenate((split, seg_end[deep])),
+            np.concatenate((rank, rank)),
+        )
+    return significance
+
+
+@dataclass
+class _Tracks:
+    """One build of the index; replaced as a whole so readers always see matching arrays."""
+
+    platforms: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    lat: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+    lon: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+    time: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    significance: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+    offsets: Dict[int, Tuple[int, int]] = field(default_factory=dict)
+    kept: Dict[int, np.ndarray] = field(default_factory=dict)
+
+
+class TrajectoryIndex:
+    """Every float's track with per-point Douglas–Peucker significance, so any zoom is a threshold."""
+
+    def __init__(self, tolerance_px: float = 1.0, max_zoom: int = 14):
+        self.tolerance_px = tolerance_px
+        self.max_zoom = max_zoom
+        self._lock = threading.Lock()
+        self._version = None
+        self._tracks = _Tracks()
+        self.rebuilds = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._tracks.lat)
+
+    def ensure(
+        self,
+        conn: sqlite3.Connection,
+        version: object,
+        lat_col: str,
+        lon_col: str,
+        id_col: str,
+        time_col: str = "",
+        table: str = "traj_rel",
+    ) -> None:
+        key = (version, table, lat_col, lon_col, id_col, time_col)
+        if self._version == key:
+            return
+        with self._lock:
+            if self._version == key:
+                return
+            self._tracks = self._build(conn, table, lat_col, lon_col, id_col, time_col)
+            self._version = key
+            self.rebuilds += 1
+
+    def _build(self, conn, table, lat_col, lon_col, id_col, time_col) -> _Tracks:
+        time_expr = time_col or "NULL"
+        order = f"{id_col}, {time_col}, rowid" if time_col else f"{id_col}, rowid"
+        rows = conn.execute(
+            f"SELECT {id_col}, {lat_col}, {lon_col}, {time_expr} FROM {table} "
+            f"WHERE {id_col} IS NOT NULL AND {lat_col} BETWEEN -90 AND 90 AND {lon_col} BETWEEN -180 AND 360 "
+            f"ORDER BY {order};"
+        ).fetchall()
+        data = np.array(rows, dtype=float).reshape(len(rows), 4)
+        platforms = data[:, 0].astype(np.int64)
+        lat, lon = data[:, 1], np.where(data[:, 2] > 180.0, data[:, 2] - 360.0, data[:, 2])
+
+        starts = np.flatnonzero(np.r_[True, platforms[1:] != platforms[:-1]]) if len(rows) else np.zeros(0, np.int64)
+        x, y = mercator(lat, self._unwrap(lon, starts))
+        significance = douglas_peucker_significance(
+            x, y, starts, floor=zoom_tolerance(self.max_zoom, self.tolerance_px)
+        )
+
+        ends = np.append(starts[1:], len(rows))
+        return _Tracks(
+            platforms=platforms,
+            lat=lat.astype(np.float32),
+            lon=lon.astype(np.float32),
+            time=data[:, 3],
+            significance=significance.astype(np.float32),
+            offsets={int(platforms[s]): (int(s), int(e)) for s, e in zip(starts, ends)},
+        )
+
+    @staticmethod
+    def _unwrap(lon: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        # Simplify across the antimeridian as one continuous line instead of a jump around the globe.
+        if len(lon) < 2:
+            return lon
+        step = np.diff(lon)
+        shift = np.where(step > 180.0, -360.0, np.where(step < -180.0, 360.0, 0.0))
+        shift[starts[1:] - 1] = 0.0
+        total = np.concatenate(([0.0], np.cumsum(shift)))
+        return lon + total - np.repeat(total[starts], np.diff(np.append(starts, len(lon))))
+
+    def _kept_indices(self, tracks: _Tracks, zoom: int) -> np.ndarray:
+        kept = tracks.kept.get(zoom)
+        if kept is None:
+            tolerance = zoom_tolerance(zoom, self.tolerance_px)
+            kept = np.flatnonzero(tracks.significance > tolerance)
+            tracks.kept[zoom] = kept
+        return kept
+
+    @staticmethod
+    def _point(tracks: _Tracks, index: int, digits: int) -> List[object]:
+        moment = tracks.time[index]
+        return [
+            round(float(tracks.lat[index]), digits),
+            round(float(tracks.lon[index]), digits),
+            int(moment) if np.isfinite(moment) else None,
+        ]
+
+    def trajectory(self, platform: int, zoom: int, max_points: int) -> Optional[Dict[str, object]]:
+        tracks = self._tracks
+        span = tracks.offsets.get(int(platform))
+        if span is None:
+            return None
+        start, end = span
+        significance = tracks.significance[start:end]
+        if zoom > self.max_zoom:
+            indices = np.arange(start, end)
+        else:
+            tolerance = zoom_tolerance(zoom, self.tolerance_px)
+            indices = start + np.flatnonzero(significance > tolerance)
+        truncated = len(indices) > max_points
+        if truncated:
+            indices = np.sort(indices[np.argsort(-tracks.significance[indices], kind="stable")[:max_points]])
+        digits = coordinate_digits(zoom)
+        return {
+            "platform_number": int(platform),
+            "zoom": zoom,
+            "columns": ["latitude", "longitude", "juld_epoch"],
+            "points": [self._point(tracks, i, digits) for i in indices],
+            "total_points": end - start,
+            "truncated": truncated,
+        }
+
+    def tile(self, zoom: int, x: int, y: int, max_points: int) -> Dict[str, object]:
+        tracks = self._tracks
+        n = 2 ** zoom
+        kept = self._kept_indices(tracks, zoom) if zoom <= self.max_zoom else np.arange(len(tracks.lat))
+        px, py = mercator(tracks.lat[kept].astype(float), tracks.lon[kept].astype(float))
+        pad = TILE_BUFFER / n
+        inside = (px >= x / n - pad) & (px <= (x + 1) / n + pad) & (py >= y / n - pad) & (py <= (y + 1) / n + pad)
+
+        same_next = np.zeros(len(kept), dtype=bool)
+        if len(kept) > 1:
+            same_next[:-1] = tracks.platforms[kept[1:]] == tracks.platforms[kept[:-1]]
+        include = inside.copy()
+        include[1:] |= inside[:-1] & same_next[:-1]
+        include[:-1] |= inside[1:] & same_next[:-1]
+
+        positions = np.flatnonzero(include)
+        # A new line starts where the float changes or the run of included points leaves the tile.
+        breaks = np.r_[True, (np.diff(positions) != 1) | ~same_next[positions[:-1]]] if len(positions) else []
+        line_ids = np.cumsum(breaks)
+        truncated = len(positions) > max_points
+        if truncated:
+            # Too dense for one tile: drop the least significant points; the lines themselves stay connected.
+            ranks = tracks.significance[kept[positions]]
+            cutoff = np.partition(ranks, len(ranks) - max_points)[len(ranks) - max_points]
+            keep = ranks >= cutoff
+            positions, line_ids = positions[keep], line_ids[keep]
+        new_lines = np.r_[True, np.diff(line_ids) != 0] if len(positions) else []
+
+        digits = coordinate_digits(zoom)
+        floats: Dict[int, List[List[List[float]]]] = {}
+        line: List[List[float]] = []
+        for position, new_line in zip(positions, new_lines):
+            index = kept[position]
+            if new_line:
+                line = []
+                floats.setdefault(int(tracks.platforms[index]), []).append(line)
+            line.append([round(float(tracks.lat[index]), digits), round(float(tracks.lon[index]), digits)])
+
+        west, east = x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+        north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+        south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+        return {
+            "z": zoom,
+            "x": x,
+            "y": y,
+            "bbox": [round(west, 6), round(south, 6), round(east, 6), round(north, 6)],
+            "floats": [{"platform_number": p, "lines": lines} for p, lines in floats.items()],
+            "points": int(len(positions)),
+            "truncated": truncated,
+        }
+
+    def stats(self) -> Dict[str, object]:
+        tracks = self._tracks
+        return {
+            "floats": len(tracks.offsets),
+            "points": len(tracks.lat),
+            "rebuilds": self.rebuilds,
+            "cached_zooms": sorted(tracks.kept),
+        }
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"-?\d+(?:\.\d+)?|[^\W_]+|[<>!=]=|[<>=≤≥≠]", re.UNICODE)
+
+
+def normalize_prompt(text: str) -> str:
+    # Fold case, whitespace and punctuation while keeping signed/decimal numbers and comparison operators intact.
+    return " ".join(_TOKEN_RE.findall((text or "").lower()))
+
+
+def cache_key(prompt: str, schema_hash: str) -> str:
+    return hashlib.sha256(f"{normalize_prompt(prompt)}\0{schema_hash}".encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """LRU + TTL cache of NL-to-SQL translations, written through to a SQLite file."""
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._open()
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "key TEXT PRIMARY KEY, normalized_prompt TEXT NOT NULL, schema_hash TEXT NOT NULL, "
+            "sql TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        cutoff = time.time() - self.ttl_seconds
+        self._conn.execute("DELETE FROM translations WHERE created_at < ?;", (cutoff,))
+        rows = self._conn.execute(
+            "SELECT key, normalized_prompt, schema_hash, sql, created_at, last_used, hits "
+            "FROM translations ORDER BY last_used DESC LIMIT ?;",
+            (self.max_entries,),
+        ).fetchall()
+        self._conn.execute(
+            "DELETE FROM translations WHERE key NOT IN "
+            "(SELECT key FROM translations ORDER BY last_used DESC LIMIT ?);",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+        for key, prompt, schema_hash, sql, created_at, last_used, hits in reversed(rows):
+            self._entries[key] = {
+                "normalized_prompt": prompt,
+                "schema_hash": schema_hash,
+                "sql": sql,
+                "created_at": created_at,
+                "last_used": last_used,
+                "hits": hits,
+            }
+
+    def get(self, prompt: str, schema_hash: str) -> str:
+        key = cache_key(prompt, schema_hash)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return ""
+            if time.time() - entry["created_at"] > self.ttl_seconds:
+                self._remove(key)
+                self._conn.commit()
+                self.expirations += 1
+                self.misses += 1
+                return ""
+            self._entries.move_to_end(key)
+            entry["last_used"] = time.time()
+            entry["hits"] += 1
+            self.hits += 1
+            return entry["sql"]
+
+    def put(self, prompt: str, schema_hash: str, sql: str) -> None:
+        key = cache_key(prompt, schema_hash)
+        now = time.time()
+        with self._lock:
+            self._entries[key] = {
+                "normalized_prompt": normalize_prompt(prompt),
+                "schema_hash": schema_hash,
+                "sql": sql,
+                "created_at": now,
+                "last_used": now,
+                "hits": 0,
+            }
+            self._entries.move_to_end(key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations "
+                "(key, normalized_prompt, schema_hash, sql, created_at, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0);",
+                (key, normalize_prompt(prompt), schema_hash, sql, now, now),
+            )
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            self._conn.commit()
+
+    def discard(self, prompt: str, schema_hash: str) -> None:
+        key = cache_key(prompt, schema_hash)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._conn.commit()
+
+    def items(self) -> List[Tuple[str, str, str]]:
+        """(normalized prompt, schema hash, sql) for every live entry, oldest first."""
+        with self._lock:
+            return [(e["normalized_prompt"], e["schema_hash"], e["sql"]) for e in self._entries.values()]
+
+    def flush(self) -> None:
+        # Hit counters and recency are only persisted here to keep get() free of disk writes.
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE translations SET last_used = ?, hits = ? WHERE key = ?;",
+                [(entry["last_used"], entry["hits"], key) for key, entry in self._entries.items()],
+            )
+            self._conn.commit()
+
+    def _remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._conn.execute("DELETE FROM translations WHERE key = ?;", (key,))
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }